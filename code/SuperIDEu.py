@@ -14,7 +14,7 @@
     The IDE consists of several interconnected components, each serving a specific function:
 
     1. **Code Editor**:
-    - A central text editing area powered by PyQt5's `QTextEdit` or a custom widget, where users write GCBASIC code.
+    - A central text editing area powered by PyQt5's `QPlainTextEdit` or a custom widget, where users write GCBASIC code.
     - Supports standard editing features like cut, copy, paste, undo/redo, and find/replace.
     - Integrates the custom syntax highlighter to colorize GCBASIC syntax elements.
 
@@ -67,7 +67,7 @@
     - **Lightweight**: Optimized for low resource usage, suitable for hobbyist systems.
 
     #### Technical Details
-    - **Framework**: Built with PyQt5, using `QMainWindow` for the main interface, `QTextEdit` for the editor, and `QSyntaxHighlighter` for highlighting.
+    - **Framework**: Built with PyQt5, using `QMainWindow` for the main interface, `QPlainTextEdit` for the editor, and `QSyntaxHighlighter` for highlighting.
     - **Grammar File**: `GCB.tmLanguage.json` defines TextMate-compatible patterns, parsed by `QRegularExpression` for real-time highlighting.
     - **Tokenization**: Processes code into tokens (e.g., keywords, operators) for highlighting, with challenges in handling `<` and `>` in `#include`.
     - **Dependencies**: Requires Python 3.x, PyQt5, and the GCBASIC compiler.
@@ -109,22 +109,40 @@ import tempfile
 import time
 import webbrowser
 import glob
+import fnmatch
+import itertools
 import shutil
+import codecs
+import mmap
+import bisect
+import difflib
+import sqlite3
+import threading
+import zlib
+import multiprocessing
 
 
-from PyQt5.QtWidgets import (QApplication, QMainWindow, QTabWidget, QTextEdit, QVBoxLayout, QWidget,
+from PyQt5.QtWidgets import (QApplication, QMainWindow, QTabWidget, QTextEdit, QPlainTextEdit, QPlainTextDocumentLayout, QVBoxLayout, QWidget,
                              QMenuBar, QAction, QFileDialog, QDockWidget, QListWidget, QMessageBox,
                              QInputDialog, QMenu, QFrame, QDialog, QDialogButtonBox, QTextBrowser, QComboBox,
-                             QPushButton, QHBoxLayout, QLabel, QFontDialog)
+                             QPushButton, QHBoxLayout, QLabel, QFontDialog, QAbstractScrollArea, QTreeWidget, QTreeWidgetItem, QToolTip,
+                             QLineEdit, QCheckBox, QListWidgetItem)
 from PyQt5.QtPrintSupport import QPrintDialog, QPrinter
-from PyQt5.QtGui import QTextOption, QTextDocument, QFont, QPainter, QFontMetrics, QTextCursor, QIcon, QTextCharFormat, QColor, QImage, QPen
-from PyQt5.QtCore import Qt, QUrl, QPoint, QTimer, QRect, QByteArray, QSize, QEvent, QObject
+from PyQt5.QtGui import QTextOption, QTextDocument, QFont, QPainter, QFontMetrics, QTextCursor, QIcon, QTextCharFormat, QColor, QImage, QPen, QTextLayout, QStaticText
+from PyQt5.QtCore import Qt, QUrl, QPoint, QTimer, QRect, QByteArray, QSize, QEvent, QObject, QRunnable, QThreadPool, QFileSystemWatcher, pyqtSignal
 from PyQt5.QtGui import QDesktopServices, QTextBlockUserData, QFontDatabase
-from collections import deque
+from collections import deque, OrderedDict
+from array import array
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait as wait_futures
 import uuid
+try:
+    from re import _parser as sre_parse, _constants as sre_constants  # Python 3.11+
+except ImportError:
+    import sre_parse
+    import sre_constants
 
 #build number
-BUILD_NUMBER = "06.15.2025"
+BUILD_NUMBER = "10.17.2026"
 
 #Controlled in the JSON setting file.  These initialise only.
 show_hl_info = False  
@@ -146,7 +164,16 @@ def resource_path(relative_path):
     resolved_path = os.path.join(base_path, relative_path)
     return resolved_path
 
+def plain_text_document(text=""):
+    """Create an editor document with the plain text layout CustomTextEdit needs (one layout per line, no rich text)."""
+    document = QTextDocument()
+    document.setDocumentLayout(QPlainTextDocumentLayout(document))
+    document.setPlainText(text)
+    return document
+
 class LineNumberArea(QFrame):
+    NUMBER_CACHE_SIZE = 4096
+
     def __init__(self, editor):
         super().__init__(editor)
         self.editor = editor
@@ -154,6 +181,52 @@ class LineNumberArea(QFrame):
         self.timer = QTimer(self)
         self.timer.timeout.connect(self.clear_marker)
         self.original_number = None
+        # Font, metrics, colours and laid out numbers, rebuilt only when the editor font or theme changes
+        self.style_key = None
+        self.number_font = None
+        self.metrics = None
+        self.number_texts = {}  # line number string -> (QStaticText, width)
+        # paintEvent fills its whole rect, so Qt can scroll the gutter by moving pixels instead of repainting it
+        self.setAttribute(Qt.WA_OpaquePaintEvent)
+
+    def changeEvent(self, event):
+        super().changeEvent(event)
+        if event.type() == QEvent.StyleChange:
+            # The editor's transparent background style sheet clears the flag when it is applied
+            self.setAttribute(Qt.WA_OpaquePaintEvent)
+
+    def ensure_style(self):
+        """Return the gutter font metrics, rebuilding the cached style if the font or theme changed."""
+        settings = self.editor.ide.settings
+        style_key = (settings.get("editor_font", "Consolas"), settings["editor_font_size"], settings["theme"])
+        if style_key != self.style_key:
+            self.style_key = style_key
+            self.number_font = QFont(style_key[0], style_key[1])
+            self.metrics = QFontMetrics(self.number_font)
+            light = style_key[2] == "light"
+            self.background_color = QColor(Qt.lightGray if light else Qt.darkGray)
+            self.number_color = QColor(Qt.black if light else Qt.white)
+            self.marker_color = QColor(Qt.red if light else Qt.yellow)
+            self.number_texts.clear()
+        return self.metrics
+
+    def number_text(self, number):
+        cached = self.number_texts.get(number)
+        if cached is None:
+            if len(self.number_texts) >= self.NUMBER_CACHE_SIZE:
+                self.number_texts.clear()
+            static_text = QStaticText(number)
+            static_text.setTextFormat(Qt.PlainText)
+            static_text.prepare(font=self.number_font)
+            cached = self.number_texts[number] = (static_text, self.metrics.width(number))
+        return cached
+
+    def update_line(self, block_number):
+        """Repaint the gutter row of one line, if it is on screen."""
+        block = self.editor.document().findBlockByNumber(block_number)
+        if block.isValid():
+            rect = self.editor.blockBoundingGeometry(block).translated(self.editor.contentOffset()).toAlignedRect()
+            self.update(0, rect.top(), self.width(), rect.height())
 
     def set_marker(self, line_number):
         if self.marked_line != -1:
@@ -161,62 +234,812 @@ class LineNumberArea(QFrame):
         self.marked_line = line_number
         self.original_number = str(line_number + 1) 
         self.timer.start(self.editor.ide.settings["goto_marker_duration"] * 1000)
-        self.update()
+        self.update_line(line_number)
 
     def clear_marker(self):
+        marked_line = self.marked_line
         self.marked_line = -1
         self.original_number = None
         self.timer.stop()
-        self.update()
+        if marked_line != -1:
+            self.update_line(marked_line)
 
     def paintEvent(self, event):
+        fm = self.ensure_style()
         painter = QPainter(self)
-        painter.fillRect(event.rect(), Qt.lightGray if self.editor.ide.settings["theme"] == "light" else Qt.darkGray)
-        doc = self.editor.document()
-        cursor = self.editor.cursorForPosition(self.editor.viewport().pos())
-        first_visible_block = doc.findBlock(cursor.position())
-        block_number = first_visible_block.blockNumber()
-        font = QFont(self.editor.ide.settings.get("editor_font", "Consolas"), self.editor.ide.settings["editor_font_size"])
-        painter.setFont(font)
-        fm = QFontMetrics(font)
-        ascent = fm.ascent()
-        block = first_visible_block
-        viewport_top = self.editor.viewport().rect().top()
-        while block.isValid() and block.layout().position().y() <= event.rect().bottom() + self.editor.verticalScrollBar().value():
-            if block.isValid() and block.isVisible():
-                number = str(block_number + 1)
-                y_pos = block.layout().position().y() - self.editor.verticalScrollBar().value() + ascent
-                if y_pos >= viewport_top:
-                    if block_number == self.marked_line and self.marked_line != -1:
-                        triangle_points = [
-                            QPoint(self.width() - 10, int(y_pos - ascent + fm.height() / 2)),
-                            QPoint(self.width() - 20, int(y_pos - ascent + fm.height() / 4)),
-                            QPoint(self.width() - 20, int(y_pos - ascent + fm.height() * 3 / 4))
-                        ]
-                        painter.setBrush(Qt.red if self.editor.ide.settings["theme"] == "light" else Qt.yellow)
-                        painter.setPen(Qt.black)
-                        painter.drawPolygon(triangle_points)
-                    else:
-                        painter.setPen(Qt.black if self.editor.ide.settings["theme"] == "light" else Qt.white)
-                        painter.drawText(0, int(y_pos - ascent), self.width() - 5, fm.height(), Qt.AlignRight, number)
+        painter.fillRect(event.rect(), self.background_color)
+        painter.setFont(self.number_font)
+        painter.setPen(self.number_color)
+        line_height = fm.height()
+        right = self.width() - 5
+        block = self.editor.firstVisibleBlock()
+        block_number = block.blockNumber()
+        offset = self.editor.contentOffset()
+        top = self.editor.blockBoundingGeometry(block).translated(offset).top()
+        bottom = top + self.editor.blockBoundingRect(block).height()
+        paint_top = event.rect().top()
+        paint_bottom = event.rect().bottom()
+        while block.isValid() and top <= paint_bottom:
+            if bottom >= paint_top and block.isVisible():
+                y_top = int(top)
+                if block_number == self.marked_line:
+                    triangle_points = [
+                        QPoint(self.width() - 10, int(y_top + line_height / 2)),
+                        QPoint(self.width() - 20, int(y_top + line_height / 4)),
+                        QPoint(self.width() - 20, int(y_top + line_height * 3 / 4))
+                    ]
+                    painter.setBrush(self.marker_color)
+                    painter.setPen(Qt.black)
+                    painter.drawPolygon(triangle_points)
+                    painter.setPen(self.number_color)
+                else:
+                    static_text, width = self.number_text(str(block_number + 1))
+                    painter.drawStaticText(right - width, y_top, static_text)
             block = block.next()
+            top = bottom
+            bottom = top + self.editor.blockBoundingRect(block).height()
             block_number += 1
 
 class TextBlockData(QTextBlockUserData):
-    def __init__(self, text, in_block_comment=False):
+    def __init__(self, text, in_block_comment=False, format_key=None, entry_in_block_comment=False):
         super().__init__()
         self.text = text
         self.in_block_comment = in_block_comment
+        self.format_key = format_key
+        self.entry_in_block_comment = entry_in_block_comment
 
     def get_in_block_comment(self):
         return self.in_block_comment
 
+class RuleTokenizer:
+    """Single-pass scanner compiled from the language file patterns.
+
+    The patterns are folded into one alternation in file order, so the first rule that matches at the
+    leftmost position wins and a line produces non-overlapping (start, end, rule_index) tokens.
+    Keyword lists of the form \\b(word|word|...)\\b are moved into one shared trie plus a dictionary
+    lookup, which keeps the alternation small enough to scan a line once.
+    Pure Python, no Qt objects, so it can also run away from the GUI thread.
+    """
+    KEYWORD_RULE = re.compile(r'^\\b\((?!\?)(.*)\)\\b(.*)$', re.DOTALL)
+    LEADING_FLAGS = re.compile(r'^\(\?([aiLmsux]+)\)')
+    UNSAFE_TO_COMBINE = re.compile(r'\(\?P[<=]|\\[1-9]')
+    WORD_GROUP = "w"
+
+    def __init__(self, rules, block_comment_start=None, block_comment_end=None, block_comment_rule=0):
+        """rules is a list of (pattern, case_insensitive) in the language file order."""
+        self.rules = list(rules)
+        self.block_comment_start = block_comment_start
+        self.block_comment_end = block_comment_end
+        self.block_comment_rule = block_comment_rule
+        self.compiled_rules = [re.compile(pattern, re.IGNORECASE if case_insensitive else 0)
+                               for pattern, case_insensitive in self.rules]
+        self.combined = False
+        try:
+            self._build_scanner()
+            self.combined = True
+        except (re.error, ValueError):
+            # Fall back to a merged per-rule search, which keeps the same first-rule-wins semantics
+            self.combined = False
+
+    @staticmethod
+    def split_alternatives(body):
+        """Split a regex body on its top-level | characters; raises ValueError if unbalanced."""
+        parts = []
+        depth = 0
+        current = []
+        in_class = False
+        i = 0
+        while i < len(body):
+            char = body[i]
+            if char == "\\":
+                current.append(body[i:i + 2])
+                i += 2
+                continue
+            if in_class:
+                if char == "]":
+                    in_class = False
+            elif char == "[":
+                in_class = True
+            elif char == "(":
+                depth += 1
+            elif char == ")":
+                depth -= 1
+                if depth < 0:
+                    raise ValueError("unbalanced group")
+            elif char == "|" and depth == 0:
+                parts.append("".join(current))
+                current = []
+                i += 1
+                continue
+            current.append(char)
+            i += 1
+        if depth != 0 or in_class:
+            raise ValueError("unbalanced group")
+        parts.append("".join(current))
+        return parts
+
+    @staticmethod
+    def trie_pattern(words):
+        """Build a prefix-factored alternation that matches exactly the given words."""
+        trie = {}
+        for word in words:
+            node = trie
+            for char in word:
+                node = node.setdefault(char, {})
+            node[""] = {}
+
+        def emit(node):
+            branches = [re.escape(char) + emit(child) for char, child in sorted(node.items()) if char]
+            if not branches:
+                return ""
+            if "" in node:
+                return "(?:" + "|".join(branches) + ")?"
+            if len(branches) == 1:
+                return branches[0]
+            return "(?:" + "|".join(branches) + ")"
+
+        return emit(trie)
+
+    @staticmethod
+    def has_cased_literal(pattern):
+        stripped = re.sub(r'\\.', '', pattern)
+        return any(char.lower() != char.upper() for char in stripped)
+
+    def _build_scanner(self):
+        keyword_specs = {}
+        regex_parts = {}
+        for index, (pattern, case_insensitive) in enumerate(self.rules):
+            if self.UNSAFE_TO_COMBINE.search(pattern):
+                raise ValueError(f"pattern {index} uses named groups or backreferences")
+            flags = ""
+            flag_match = self.LEADING_FLAGS.match(pattern)
+            if flag_match:
+                flags = flag_match.group(1)
+                pattern = pattern[flag_match.end():]
+            if case_insensitive and "i" not in flags:
+                flags += "i"
+            keyword_match = self.KEYWORD_RULE.match(pattern)
+            words = []
+            residual = []
+            tail = ""
+            if keyword_match:
+                try:
+                    alternatives = self.split_alternatives(keyword_match.group(1))
+                    tail = keyword_match.group(2)
+                    self.split_alternatives(tail)
+                except ValueError:
+                    alternatives = []
+                for alternative in alternatives:
+                    if re.fullmatch(r'\w+', alternative):
+                        words.append(alternative)
+                    else:
+                        residual.append(alternative)
+            if words:
+                keyword_specs[index] = (words, tail, flags)
+                if residual:
+                    regex_parts[index] = (r'\b(?:' + "|".join(residual) + r')\b' + tail, flags)
+            else:
+                regex_parts[index] = (pattern, flags)
+
+        # Scanning a lower-cased copy is only equivalent when no case-sensitive rule depends on letter case
+        self.fold_case = all("i" in flags or not self.has_cased_literal(pattern)
+                             for pattern, flags in regex_parts.values())
+        self.fold_case = self.fold_case and all("i" in flags for _, _, flags in keyword_specs.values())
+        self.first_keyword_rule = min(keyword_specs) if keyword_specs else None
+        self.keyword_lookup = {}
+        self.keyword_lookup_exact = {}
+        for index in sorted(keyword_specs):
+            words, tail, flags = keyword_specs[index]
+            tail_regex = re.compile(tail, re.IGNORECASE if "i" in flags else 0) if tail else None
+            for word in words:
+                if "i" in flags:
+                    self.keyword_lookup.setdefault(word.lower(), []).append((index, tail_regex))
+                else:
+                    self.keyword_lookup_exact.setdefault(word, []).append((index, tail_regex))
+
+        def group(index, pattern, flags):
+            scoped = f"(?{flags}:" if flags else "(?:"
+            return f"(?P<r{index}>{scoped}{pattern}))"
+
+        folded_words = sorted(self.keyword_lookup)
+        exact_words = sorted(self.keyword_lookup_exact)
+        word_alternatives = []
+        if folded_words:
+            word_alternatives.append("(?i:" + self.trie_pattern(folded_words) + ")")
+        if exact_words:
+            word_alternatives.append(self.trie_pattern(exact_words))
+        word_group = rf'(?P<{self.WORD_GROUP}>\b(?:' + "|".join(word_alternatives) + r')\b)'
+        folded_word_group = rf'(?P<{self.WORD_GROUP}>\b(?:' + self.trie_pattern(folded_words) + r')\b)'
+
+        master_parts = []
+        folded_parts = []
+        after_parts = []
+        for index in range(len(self.rules)):
+            if index == self.first_keyword_rule:
+                master_parts.append(word_group)
+                folded_parts.append(folded_word_group)
+            if index in regex_parts:
+                pattern, flags = regex_parts[index]
+                master_parts.append(group(index, pattern, flags))
+                folded_parts.append(group(index, pattern, flags))
+                if self.first_keyword_rule is not None and index >= self.first_keyword_rule:
+                    after_parts.append(group(index, pattern, flags))
+        self.group_rules = {f"r{index}": index for index in range(len(self.rules))}
+        self.master = re.compile("|".join(master_parts)) if master_parts else None
+        self.folded_master = re.compile("|".join(folded_parts)) if self.fold_case and folded_parts else None
+        self.after = re.compile("|".join(after_parts)) if after_parts else None
+
+    def tokenize(self, text, start=0, end=None):
+        """Return non-overlapping (start, end, rule_index) tokens for text[start:end]."""
+        if end is None:
+            end = len(text)
+        if not self.combined:
+            return self._scan_rules(text, start, end)
+        if self.master is None:
+            return []
+        scan_text = text
+        master = self.master
+        folded = False
+        if self.folded_master is not None and text.isascii():
+            scan_text = text.lower()
+            master = self.folded_master
+            folded = True
+        search = master.search
+        group_rules = self.group_rules
+        tokens = []
+        pos = start
+        while pos < end:
+            match = search(scan_text, pos, end)
+            if match is None:
+                break
+            match_start, match_end = match.span()
+            kind = match.lastgroup
+            if kind == self.WORD_GROUP:
+                rule, match_end = self._dispatch_word(scan_text, match_start, match_end, end, folded)
+                if rule is None:
+                    pos = match_start + 1
+                    continue
+            else:
+                rule = group_rules[kind]
+            if match_end > match_start:
+                tokens.append((match_start, match_end, rule))
+                pos = match_end
+            else:
+                pos = match_end + 1
+        return tokens
+
+    def _dispatch_word(self, text, word_start, word_end, end, folded):
+        """Pick the first rule (in file order) that matches at a keyword-list word."""
+        word = text[word_start:word_end]
+        best_rule = None
+        best_end = word_end
+        candidates = self.keyword_lookup.get(word if folded else word.lower(), [])
+        if not folded and word in self.keyword_lookup_exact:
+            candidates = sorted(candidates + self.keyword_lookup_exact[word], key=lambda item: item[0])
+        for index, tail_regex in candidates:
+            if tail_regex is None or tail_regex.match(text, word_end, end):
+                best_rule = index
+                break
+        if self.after is not None:
+            after_match = self.after.match(text, word_start, end)
+            if after_match:
+                index = self.group_rules[after_match.lastgroup]
+                if best_rule is None or index < best_rule:
+                    best_rule = index
+                    best_end = after_match.end()
+        return best_rule, best_end
+
+    def _scan_rules(self, text, start, end):
+        """Merged per-rule search with the same first-rule-wins result as the combined scanner."""
+        pending = [pattern.search(text, start, end) for pattern in self.compiled_rules]
+        tokens = []
+        pos = start
+        while pos < end:
+            best = None
+            for index, match in enumerate(pending):
+                if match is not None and match.start() < pos:
+                    match = pending[index] = self.compiled_rules[index].search(text, pos, end)
+                if match is not None and (best is None or match.start() < pending[best].start()):
+                    best = index
+            if best is None:
+                break
+            match_start, match_end = pending[best].span()
+            if match_end > match_start:
+                tokens.append((match_start, match_end, best))
+                pos = match_end
+            else:
+                pos = match_end + 1
+        return tokens
+
+    def tokenize_line(self, text, in_block_comment=False):
+        """Tokenize one block and return (tokens, in_block_comment) for the block that follows."""
+        tokens = []
+        length = len(text)
+        pos = 0
+        search_from = 0
+        while True:
+            if in_block_comment:
+                end_match = self.block_comment_end.search(text, search_from) if self.block_comment_end else None
+                if end_match is None:
+                    if length > pos:
+                        tokens.append((pos, length, self.block_comment_rule))
+                    return tokens, True
+                tokens.append((pos, end_match.end(), self.block_comment_rule))
+                pos = search_from = end_match.end()
+                in_block_comment = False
+                continue
+            line_tokens = self.tokenize(text, pos, length)
+            start_match = self._find_block_comment_start(text, pos, line_tokens)
+            if start_match is None:
+                tokens.extend(line_tokens)
+                return tokens, False
+            # A block comment opens outside any string or line comment: it swallows the rest of the scan
+            tokens.extend(token for token in line_tokens if token[1] <= start_match.start())
+            pos = start_match.start()
+            search_from = start_match.end()
+            in_block_comment = True
+
+    def line_state(self, text, in_block_comment=False):
+        """Return only the block comment state after this line, skipping the full scan when no delimiter is present."""
+        if in_block_comment:
+            if self.block_comment_end is None or not self.block_comment_end.search(text):
+                return True
+        elif self.block_comment_start is None or not self.block_comment_start.search(text):
+            return False
+        return self.tokenize_line(text, in_block_comment)[1]
+
+    def _find_block_comment_start(self, text, pos, line_tokens):
+        if self.block_comment_start is None:
+            return None
+        start_match = self.block_comment_start.search(text, pos)
+        token_index = 0
+        while start_match is not None:
+            start = start_match.start()
+            while token_index < len(line_tokens) and line_tokens[token_index][1] <= start:
+                token_index += 1
+            if token_index < len(line_tokens) and line_tokens[token_index][0] <= start:
+                # Inside a string, a line comment or a complete /* ... */ token
+                start_match = self.block_comment_start.search(text, line_tokens[token_index][1])
+                continue
+            return start_match
+        return None
+
+class HighlightCache:
+    """LRU cache of tokenized lines keyed by (line text, entry block comment state).
+
+    Keys carry no block numbers, so lines that move after an insert or delete still hit.
+    Entries are evicted oldest first once either the entry count or the estimated byte size exceeds its budget.
+    """
+    ENTRY_OVERHEAD = 200  # Key and value tuples plus the OrderedDict node, approximately
+    TOKEN_SIZE = 80  # One (start, end, rule) tuple
+
+    def __init__(self, max_entries=20000, max_bytes=8 * 1024 * 1024):
+        self.entries = OrderedDict()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.bytes_used = 0
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    def get(self, text, in_block_comment):
+        """Return (tokens, in_block_comment after the line) or None."""
+        key = (text, in_block_comment)
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value[0], value[1]
+
+    def put(self, text, in_block_comment, tokens, out_state):
+        key = (text, in_block_comment)
+        size = self.ENTRY_OVERHEAD + sys.getsizeof(text) + self.TOKEN_SIZE * len(tokens)
+        if size > self.max_bytes:
+            return
+        old_value = self.entries.pop(key, None)
+        if old_value is not None:
+            self.bytes_used -= old_value[2]
+        self.entries[key] = (tokens, out_state, size)
+        self.bytes_used += size
+        while len(self.entries) > self.max_entries or self.bytes_used > self.max_bytes:
+            _, (_, _, evicted_size) = self.entries.popitem(last=False)
+            self.bytes_used -= evicted_size
+            self.evicted += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.bytes_used = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        hit_rate = 100.0 * self.hits / lookups if lookups else 0.0
+        return (f"{self.hits} hits, {self.misses} misses ({hit_rate:.1f}% hit rate), {self.evicted} evicted, "
+                f"{len(self.entries)}/{self.max_entries} entries, {self.bytes_used // 1024}/{self.max_bytes // 1024} KB")
+
+class FileCache:
+    """LRU cache of the decoded text of recently opened files, so closing and reopening a file skips the read.
+
+    Entries are keyed by path and only returned while the file still has the modification time and size it
+    had when it was read. The newest HOT_ENTRIES entries are kept as text; older ones are zlib compressed
+    when compress is on, and handed back as text (and made hot again) on a hit. Entries are evicted oldest
+    first once the stored size exceeds max_bytes. File loads look entries up and store them on worker
+    threads, so every method takes the lock.
+    """
+    HOT_ENTRIES = 4
+    ENTRY_OVERHEAD = 200  # The entry tuple and its OrderedDict node, approximately
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, compress=True):
+        self.entries = OrderedDict()  # path -> (mtime, size, encoding, text or compressed bytes, compressed, stored bytes)
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.bytes_used = 0
+        self.compressed_entries = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    def get(self, path, mtime, size):
+        """Return (text, encoding) if the file is cached with this modification time and size, otherwise None."""
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is None or entry[0] != mtime or entry[1] != size:
+                if entry is not None:
+                    self.remove(path)  # Stale: the file changed since it was cached
+                self.misses += 1
+                return None
+            self.hits += 1
+            _, _, encoding, data, compressed, _ = entry
+            if not compressed:
+                self.entries.move_to_end(path)
+                return data, encoding
+            text = zlib.decompress(data).decode("utf-8")
+            self.store(path, mtime, size, text, encoding)
+            return text, encoding
+
+    def put(self, path, mtime, size, text, encoding):
+        with self.lock:
+            self.store(path, mtime, size, text, encoding)
+
+    def discard(self, path):
+        with self.lock:
+            if path in self.entries:
+                self.remove(path)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes_used = 0
+            self.compressed_entries = 0
+
+    def store(self, path, mtime, size, text, encoding):
+        if path in self.entries:
+            self.remove(path)
+        stored = self.ENTRY_OVERHEAD + sys.getsizeof(text)
+        if stored > self.max_bytes:
+            return
+        self.entries[path] = (mtime, size, encoding, text, False, stored)
+        self.bytes_used += stored
+        if self.compress and len(self.entries) > self.HOT_ENTRIES:
+            # Entries are compressed as they leave the hot end, so only the one just pushed out can still be text
+            cold_path = next(itertools.islice(reversed(self.entries), self.HOT_ENTRIES, None))
+            self.compress_entry(cold_path)
+        while self.bytes_used > self.max_bytes:
+            self.remove(next(iter(self.entries)))
+            self.evicted += 1
+
+    def compress_entry(self, path):
+        mtime, size, encoding, text, compressed, stored = self.entries[path]
+        if compressed:
+            return
+        data = zlib.compress(text.encode("utf-8"), 1)
+        compressed_size = self.ENTRY_OVERHEAD + len(data)
+        self.entries[path] = (mtime, size, encoding, data, True, compressed_size)
+        self.bytes_used += compressed_size - stored
+        self.compressed_entries += 1
+
+    def remove(self, path):
+        entry = self.entries.pop(path)
+        self.bytes_used -= entry[5]
+        if entry[4]:
+            self.compressed_entries -= 1
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            hit_rate = 100.0 * self.hits / lookups if lookups else 0.0
+            return (f"{self.hits} hits, {self.misses} misses ({hit_rate:.1f}% hit rate), {self.evicted} evicted, "
+                    f"{len(self.entries)} files ({self.compressed_entries} compressed), "
+                    f"{self.bytes_used // 1024}/{self.max_bytes // 1024} KB")
+
+class LanguageRuleset:
+    """Compiled highlighting rules of one language file, shared read-only by every open tab.
+
+    Rulesets are kept in a process-wide registry keyed by the file path, modification time and size, so the
+    grammar is compiled once however many tabs are opened, and saving the file produces a new ruleset.
+    """
+    registry = {}
+
+    def __init__(self, language_file, config, log):
+        self.language_file = language_file
+        self.highlighting_rules = []
+        self.rule_names = []
+        self.risky_rules = []  # (rule index, name, [risks])
+        rule_specs = []
+        try:
+            block_start = config.get("block_comment_start", r'/\*')
+            self.block_comment_start = re.compile(block_start)
+            if show_hl_info:
+                log(f"HL: Loaded block comment start: {block_start}", "INFO")
+        except re.error as e:
+            log(f"HL: Invalid block comment start pattern '{block_start}': {str(e)}", "ERROR")
+            self.block_comment_start = None
+
+        try:
+            block_end = config.get("block_comment_end", r'\*/')
+            self.block_comment_end = re.compile(block_end)
+            if show_hl_info:
+                log(f"HL: Loaded block comment end: {block_end}", "INFO")
+        except re.error as e:
+            log(f"HL: Invalid block comment end pattern '{block_end}': {str(e)}", "ERROR")
+            self.block_comment_end = None
+
+        for rule in config.get("patterns", []):
+            try:
+                pattern = rule["match"]
+                color = QColor(rule["color"])
+                bold = rule.get("bold", False)
+                italic = rule.get("italic", False)
+                case_insensitive = rule.get("case_insensitive", False)
+                format = QTextCharFormat()
+                format.setForeground(color)
+                if bold:
+                    format.setFontWeight(QFont.Bold)
+                if italic:
+                    format.setFontItalic(True)
+                flags = re.IGNORECASE if case_insensitive else 0
+                compiled_pattern = re.compile(pattern, flags)
+                self.highlighting_rules.append((compiled_pattern, format))
+                rule_specs.append((pattern, case_insensitive))
+                name = rule.get("name", f"rule {len(rule_specs) - 1}")
+                self.rule_names.append(name)
+                risks = self.backtracking_risks(pattern, flags)
+                if risks:
+                    self.risky_rules.append((len(rule_specs) - 1, name, risks))
+                    log(f"HL: Rule {len(rule_specs) - 1} ({name}) may backtrack heavily: {'; '.join(risks)}", "WARNING")
+                if show_rules_info:
+                    log(f"HL: Loaded rule - Pattern: {pattern}, Color: {rule['color']}, Case Insensitive: {case_insensitive}", "INFO")
+            except re.error as e:
+                log(f"HL: Invalid regex pattern '{rule.get('match', 'unknown')}' in JSON: {str(e)}", "ERROR")
+            except Exception as e:
+                log(f"HL: Error processing rule {rule.get('match', 'unknown')}: {str(e)}", "ERROR")
+        self.highlighting_rules = tuple(self.highlighting_rules)
+        self.rule_names = tuple(self.rule_names)
+        self.rule_specs = tuple(rule_specs)
+        self.tokenizer = RuleTokenizer(rule_specs, self.block_comment_start, self.block_comment_end)
+        if show_rules_info:
+            log(f"HL: Built {'combined' if self.tokenizer.combined else 'per-rule'} tokenizer for {len(rule_specs)} rules", "INFO")
+
+    @staticmethod
+    def backtracking_risks(pattern, flags=0):
+        """Return reasons a pattern may backtrack badly, found by walking its parse tree.
+
+        Flags unbounded quantifiers nested inside other unbounded quantifiers (exponential on a failing match)
+        and lookarounds containing an unbounded quantifier, such as (?![^"]*"), which rescan the rest of the
+        line at every candidate position (quadratic on long lines). Atomic groups and possessive quantifiers
+        do not backtrack and are not flagged.
+        """
+        try:
+            parsed = sre_parse.parse(pattern, flags)
+        except Exception:
+            return []
+        repeats = (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT)
+        assertions = (sre_constants.ASSERT, sre_constants.ASSERT_NOT)
+        non_backtracking = (getattr(sre_constants, "ATOMIC_GROUP", None), getattr(sre_constants, "POSSESSIVE_REPEAT", None))
+
+        def children(op, av):
+            if op in repeats:
+                return [av[2]]
+            if op is sre_constants.SUBPATTERN:
+                return [av[-1]]
+            if op is sre_constants.BRANCH:
+                return list(av[1])
+            if op in assertions:
+                return [av[1]]
+            if op is sre_constants.GROUPREF_EXISTS:
+                return [branch for branch in av[1:] if branch]
+            return []
+
+        def has_unbounded(items):
+            for op, av in items:
+                if op in repeats and av[1] == sre_constants.MAXREPEAT:
+                    return True
+                if op not in non_backtracking and any(has_unbounded(child) for child in children(op, av)):
+                    return True
+            return False
+
+        risks = []
+
+        def walk(items):
+            for op, av in items:
+                if op in repeats and av[1] == sre_constants.MAXREPEAT and has_unbounded(av[2]):
+                    risks.append("nested unbounded quantifiers")
+                elif op in assertions and has_unbounded(av[1]):
+                    risks.append("lookaround with an unbounded quantifier rescans the rest of the line at every candidate")
+                if op not in non_backtracking:
+                    for child in children(op, av):
+                        walk(child)
+
+        walk(parsed)
+        return list(dict.fromkeys(risks))
+
+    @staticmethod
+    def registry_key(language_file):
+        stat = os.stat(language_file)
+        return (os.path.normcase(os.path.abspath(language_file)), stat.st_mtime_ns, stat.st_size)
+
+    @classmethod
+    def get(cls, language_file, log):
+        """Return the ruleset for the file as it is on disk now, compiling it only if it changed; None on error."""
+        try:
+            key = cls.registry_key(language_file)
+        except OSError as e:
+            log(f"HL: Error reading {language_file}: {str(e)}", "ERROR")
+            return None
+        ruleset = cls.registry.get(key)
+        if ruleset is not None:
+            return ruleset
+        try:
+            with open(language_file, "r", encoding="utf-8") as f:
+                config = json.load(f)
+            if show_rules_info:
+                log(f"HL: Loaded language file from {language_file}", "INFO")
+            ruleset = cls(language_file, config, log)
+        except json.JSONDecodeError as e:
+            log(f"HL: Corrupted JSON in {language_file}: {str(e)}", "ERROR")
+            return None
+        except Exception as e:
+            log(f"HL: Error loading {language_file}: {str(e)}", "ERROR")
+            return None
+        # Older versions of the same file are no longer needed once every tab has moved on
+        for old_key in [old_key for old_key in cls.registry if old_key[0] == key[0]]:
+            del cls.registry[old_key]
+        cls.registry[key] = ruleset
+        log(f"HL: Compiled {len(ruleset.highlighting_rules)} highlighting rules from {os.path.basename(language_file)}", "INFO")
+        return ruleset
+
+class RuleProfiler:
+    """Times every rule of a ruleset on its own over a set of source lines.
+
+    Each rule is run with finditer across every line, as the per-rule fallback scanner would, so the report
+    shows which patterns cost the most, how often they match and the single line each one is slowest on.
+    """
+    def __init__(self, ruleset):
+        self.ruleset = ruleset
+
+    def profile(self, sources):
+        """Profile over sources, an iterable of (source name, list of lines); returns results costliest first."""
+        results = [{"index": index, "name": name, "pattern": pattern.pattern, "time": 0.0, "matches": 0,
+                    "worst_time": 0.0, "worst_source": None, "worst_line_num": 0, "worst_line": ""}
+                   for index, ((pattern, _), name) in enumerate(zip(self.ruleset.highlighting_rules, self.ruleset.rule_names))]
+        patterns = [pattern for pattern, _ in self.ruleset.highlighting_rules]
+        perf_counter = time.perf_counter
+        line_count = 0
+        for source_name, lines in sources:
+            for line_num, text in enumerate(lines, 1):
+                line_count += 1
+                for result, pattern in zip(results, patterns):
+                    started = perf_counter()
+                    matches = 0
+                    for _ in pattern.finditer(text):
+                        matches += 1
+                    elapsed = perf_counter() - started
+                    result["time"] += elapsed
+                    result["matches"] += matches
+                    if elapsed > result["worst_time"]:
+                        result["worst_time"] = elapsed
+                        result["worst_source"] = source_name
+                        result["worst_line_num"] = line_num
+                        result["worst_line"] = text
+        self.line_count = line_count
+        return sorted(results, key=lambda result: result["time"], reverse=True)
+
+class TokenizeSignals(QObject):
+    """Carries DocumentTokenizeTask results back to the GUI thread (queued, as the task runs on a pool thread)."""
+    batch_ready = pyqtSignal(int, object)  # first block number, [(tokens, entry_in_block_comment, in_block_comment), ...]
+    finished = pyqtSignal()
+
+class DocumentTokenizeTask(QRunnable):
+    """Tokenizes a snapshot of a document's lines on a QThreadPool thread.
+
+    Each block's tokens come back as a compact array('I') of start, end, rule triples, in batches of
+    BATCH_LINES blocks. The task remembers the highlighter's document revision when the snapshot was taken
+    so the GUI thread can tell which results an edit has made stale.
+    """
+    BATCH_LINES = 1000
+
+    def __init__(self, tokenizer, lines, revision):
+        super().__init__()
+        self.tokenizer = tokenizer
+        self.lines = lines
+        self.revision = revision
+        self.cancelled = False
+        self.signals = TokenizeSignals()
+
+    def run(self):
+        in_block_comment = False
+        first_block_num = 0
+        batch = []
+        for block_num, text in enumerate(self.lines):
+            if self.cancelled:
+                return
+            tokens, out_state = self.tokenizer.tokenize_line(text, in_block_comment)
+            batch.append((array('I', [value for token in tokens for value in token]), in_block_comment, out_state))
+            in_block_comment = out_state
+            if len(batch) >= self.BATCH_LINES:
+                self.signals.batch_ready.emit(first_block_num, batch)
+                first_block_num = block_num + 1
+                batch = []
+        if batch and not self.cancelled:
+            self.signals.batch_ready.emit(first_block_num, batch)
+        self.signals.finished.emit()
+
+class LineIndexSignals(QObject):
+    """Carries LineIndexTask progress back to the GUI thread."""
+    progress = pyqtSignal(int)  # lines indexed so far
+    finished = pyqtSignal(int)
+
+class LineIndexTask(QRunnable):
+    """Finds the byte offset of every line start of a memory-mapped file on a QThreadPool thread.
+
+    Offsets are appended to the view's array('Q') one chunk at a time, so the lines already indexed can be
+    shown while the rest of the file is still being scanned.
+    """
+    CHUNK_BYTES = 4 * 1024 * 1024
+
+    def __init__(self, data, offsets):
+        super().__init__()
+        self.data = data
+        self.offsets = offsets
+        self.cancelled = False
+        self.signals = LineIndexSignals()
+
+    def run(self):
+        size = len(self.data)
+        position = 0
+        try:
+            while position < size:
+                if self.cancelled:
+                    return
+                chunk_end = min(size, position + self.CHUNK_BYTES)
+                starts = array('Q')
+                newline = self.data.find(b"\n", position, chunk_end)
+                while newline != -1:
+                    starts.append(newline + 1)
+                    newline = self.data.find(b"\n", newline + 1, chunk_end)
+                self.offsets.extend(starts)
+                position = chunk_end
+                self.signals.progress.emit(len(self.offsets))
+        except ValueError:
+            return  # The view closed the mapping
+        if not self.cancelled:
+            self.signals.finished.emit(len(self.offsets))
+
 class SyntaxHighlighter:
+    # Block comment state after each block, kept in QTextBlock.userState(); Qt starts new blocks at -1
+    STATE_UNKNOWN = -1
+    OUTSIDE_BLOCK_COMMENT = 0
+    IN_BLOCK_COMMENT = 1
+
     def __init__(self, text_edit, ide):
         self.text_edit = text_edit
         self.ide = ide
-        self.block_format_cache = {}
+        self.highlight_cache = HighlightCache(self.ide.settings.get('highlight_cache_entries', 20000),
+                                              self.ide.settings.get('highlight_cache_bytes', 8 * 1024 * 1024))
         self.highlighting_rules = []
+        self.tokenizer = None
         self.block_comment_start = None
         self.block_comment_end = None
         self.last_block_count = self.text_edit.document().blockCount()
@@ -227,85 +1050,154 @@ class SyntaxHighlighter:
         self.highlight_pending = False
         self.last_visible_range = None
         self.highlighted_blocks = set()
-        self.load_highlighting_rules()
+        self.ruleset = None
         self.text_edit.document().contentsChange.connect(self.on_contents_change)
         self.text_edit.document().blockCountChanged.connect(self.block_count_changed)
         self.pending_changes = []
+        self.state_dirty_range = None  # (first, last) block numbers whose block comment state must be recomputed
+        # Edits only widen state_dirty_range; one pass per event loop turn paints them, however many signals arrived
+        self.edit_flush_timer = QTimer()
+        self.edit_flush_timer.setSingleShot(True)
+        self.edit_flush_timer.setInterval(0)
+        self.edit_flush_timer.timeout.connect(self.flush_edits)
+        # Idle-time highlighting: prefetch around the viewport first, then sweep the rest of the document
+        self.idle_timer = QTimer()
+        self.idle_timer.setSingleShot(True)
+        self.idle_timer.timeout.connect(self._highlight_idle_chunk)
+        self.idle_prefetch_ranges = deque()
+        self.idle_sweep_block_num = 0  # Blocks before this one have been painted by the sweep
+        # Whole-document tokenizing on a worker thread; results are applied in time slices on the GUI thread
+        self.document_revision = 0  # Bumped on every contentsChange
+        self.tokenize_task = None
+        self.tokenize_task_pending = False  # Start a task once the document is known to be a .gcb file
+        self.tokenize_dirty_from = None  # Lowest block edited since the running task took its snapshot
+        self.tokenize_batches = deque()
+        self.tokenize_apply_timer = QTimer()
+        self.tokenize_apply_timer.setSingleShot(True)
+        self.tokenize_apply_timer.timeout.connect(self._apply_tokenize_batches)
+        self.load_highlighting_rules()
+
+    def set_document(self, document):
+        """Follow a document installed with setDocument; the signals connected in __init__ belong to the old one."""
+        document.contentsChange.connect(self.on_contents_change)
+        document.blockCountChanged.connect(self.block_count_changed)
+        self.last_block_count = document.blockCount()
+        self.highlighted_blocks.clear()
+        self.state_dirty_range = (0, max(0, document.blockCount() - 1))
+        self.idle_prefetch_ranges.clear()
+        self.idle_sweep_block_num = 0
+        self.cancel_document_tokenize()
+        self.tokenize_task_pending = True
 
     def highlight_all_blocks(self):
         if show_hl_info:
             self.ide.terminal.log("HL: Highlighting all blocks for printing", "INFO")
         if not hasattr(self.text_edit, "file_path") or not self.text_edit.file_path.lower().endswith(".gcb"):
             return
+        # Whatever the worker has applied so far is kept; the rest is finished here synchronously
+        self.cancel_document_tokenize()
         doc = self.text_edit.document()
-        was_modified = doc.isModified()
-        was_undo_enabled = doc.isUndoRedoEnabled()
-        doc.setUndoRedoEnabled(False)
-        try:
-            block = doc.firstBlock()
-            in_block_comment = False
-            while block.isValid():
-                block_num = block.blockNumber()
-                text = block.text()
-                block_length = len(text)
-                format_ranges = []
-                if in_block_comment:
-                    end_match = self.block_comment_end.search(text)
-                    if end_match and end_match.end() <= block_length:
-                        format_ranges.append((0, end_match.end(), self.highlighting_rules[0][1]))
-                        in_block_comment = False
-                    else:
-                        format_ranges.append((0, block_length, self.highlighting_rules[0][1]))
-                else:
-                    start_match = self.block_comment_start.search(text)
-                    if start_match:
-                        start_pos = start_match.start()
-                        end_match = self.block_comment_end.search(text, start_pos)
-                        if end_match and end_match.end() <= block_length:
-                            format_ranges.append((start_pos, end_match.end(), self.highlighting_rules[0][1]))
-                        else:
-                            format_ranges.append((start_pos, block_length, self.highlighting_rules[0][1]))
-                            in_block_comment = True
-                if not in_block_comment:
-                    max_matches = 1000
-                    for pattern, format in self.highlighting_rules[1:]:
-                        match_count = 0
-                        for match in pattern.finditer(text):
-                            if match_count >= max_matches:
-                                self.ide.terminal.log(f"HL: Reached max matches ({max_matches}) for pattern {pattern.pattern}", "ERROR")
-                                break
-                            start, end = match.start(), match.end()
-                            if end <= block_length:
-                                format_ranges.append((start, end, format))
-                            match_count += 1
-                if len(format_ranges) > 10000:  # Use max_total_ranges
-                    self.ide.terminal.log(f"HL: Exceeded max total ranges (10000) in block {block_num}", "ERROR")
-                    block = block.next()
-                    continue
-                cursor = QTextCursor(block)
-                cursor.beginEditBlock()
-                try:
-                    cursor.setPosition(block.position())
-                    cursor.setPosition(block.position() + block_length, QTextCursor.KeepAnchor)
-                    cursor.setCharFormat(QTextCharFormat())  # Clear existing formats
-                    format_ranges.sort(key=lambda x: x[0])  # Sort by start position
-                    for start, end, format in format_ranges:
-                        if end > block_length:
-                            self.ide.terminal.log(f"HL: Skipping invalid range ({start}, {end}) in block {block_num}", "ERROR")
-                            continue
-                        cursor.setPosition(block.position() + start)
-                        cursor.setPosition(block.position() + end, QTextCursor.KeepAnchor)
-                        cursor.mergeCharFormat(format)
-                finally:
-                    cursor.endEditBlock()
-                self.highlighted_blocks.add(block_num)
-                block.setUserData(TextBlockData(block.text(), in_block_comment))
+        block = doc.firstBlock()
+        in_block_comment = False
+        skipped_blocks = 0
+        while block.isValid():
+            block_num = block.blockNumber()
+            if self.block_is_painted(block, in_block_comment):
+                # Already done by the visible pass or the idle sweep
+                in_block_comment = block.userData().in_block_comment
+                block.setUserState(self.IN_BLOCK_COMMENT if in_block_comment else self.OUTSIDE_BLOCK_COMMENT)
+                skipped_blocks += 1
                 block = block.next()
-        finally:
-            doc.setUndoRedoEnabled(was_undo_enabled)
-            doc.setModified(was_modified)
+                continue
+            entry_in_block_comment = in_block_comment
+            text = block.text()
+            format_ranges, in_block_comment = self.compute_block_ranges(text, in_block_comment)
+            block.setUserState(self.IN_BLOCK_COMMENT if in_block_comment else self.OUTSIDE_BLOCK_COMMENT)
+            if len(format_ranges) > 10000:  # Use max_total_ranges
+                self.ide.terminal.log(f"HL: Exceeded max total ranges (10000) in block {block_num}", "ERROR")
+                block = block.next()
+                continue
+            self.apply_block_formats(block, format_ranges, in_block_comment, entry_in_block_comment, mark_dirty=False)
+            self.highlighted_blocks.add(block_num)
+            block = block.next()
+        self.mark_blocks_dirty(doc.firstBlock(), doc.lastBlock())
+        self.idle_sweep_block_num = doc.blockCount()
+        if show_hl_info:
+            self.ide.terminal.log(f"HL: {skipped_blocks} of {doc.blockCount()} blocks were already highlighted", "INFO")
         if show_hl_info:
             self.ide.terminal.log("HL: Completed highlighting all blocks", "INFO")
+        if self.ide.settings.get('show_hl_info', False):
+            self.ide.terminal.log(f"HL: Cache {self.highlight_cache.stats()}", "INFO")
+
+    def compute_block_ranges(self, text, in_block_comment):
+        """Tokenize one block in a single pass, or take the tokens from the cache, and map them to the rule formats."""
+        if self.tokenizer is None:
+            return [], in_block_comment
+        cached = self.highlight_cache.get(text, in_block_comment)
+        if cached is None:
+            tokens, out_state = self.tokenizer.tokenize_line(text, in_block_comment)
+            self.highlight_cache.put(text, in_block_comment, tokens, out_state)
+            in_block_comment = out_state
+        else:
+            tokens, in_block_comment = cached
+        rules = self.highlighting_rules
+        return [(start, end, rules[rule][1]) for start, end, rule in tokens], in_block_comment
+
+    def block_is_painted(self, block, entry_in_block_comment):
+        """True when the block was painted for its current text and entry state."""
+        block_data = block.userData()
+        return (block_data is not None and block_data.format_key is not None
+                and block_data.entry_in_block_comment == entry_in_block_comment and block_data.text == block.text())
+
+    def highlight_block(self, block, mark_dirty=True):
+        """Tokenize and paint one block unless it is already painted; returns True if its formats changed."""
+        entry_in_block_comment = self.block_entry_state(block)
+        if self.block_is_painted(block, entry_in_block_comment):
+            return False
+        format_ranges, in_block_comment = self.compute_block_ranges(block.text(), entry_in_block_comment)
+        if len(format_ranges) > 10000:  # Use max_total_ranges
+            self.ide.terminal.log(f"HL: Exceeded max total ranges (10000) in block {block.blockNumber()}", "ERROR")
+            return False
+        self.highlighted_blocks.add(block.blockNumber())
+        return self.apply_block_formats(block, format_ranges, in_block_comment, entry_in_block_comment, mark_dirty)
+
+    def apply_block_formats(self, block, format_ranges, in_block_comment, entry_in_block_comment=False, mark_dirty=True):
+        """Paint format ranges through the block layout, leaving the document contents, undo stack and modified flag alone.
+
+        markContentsDirty costs about the same for one block as for a long run of them, so callers painting many
+        blocks pass mark_dirty=False and mark the whole span once with mark_blocks_dirty.
+        """
+        block_num = block.blockNumber()
+        block_length = len(block.text())
+        format_ranges = sorted(format_ranges, key=lambda x: x[0])  # Sort by start position
+        format_key = tuple((start, end, id(format)) for start, end, format in format_ranges)
+        block_data = block.userData()
+        if block_data and block_data.format_key == format_key and block_data.text == block.text():
+            block_data.in_block_comment = in_block_comment
+            block_data.entry_in_block_comment = entry_in_block_comment
+            return False
+        layout_ranges = []
+        for start, end, format in format_ranges:
+            if end > block_length:
+                self.ide.terminal.log(f"HL: Skipping invalid range ({start}, {end}) in block {block_num}", "ERROR")
+                continue
+            format_range = QTextLayout.FormatRange()
+            format_range.start = start
+            format_range.length = end - start
+            format_range.format = format
+            layout_ranges.append(format_range)
+        block.layout().setFormats(layout_ranges)
+        block.setUserData(TextBlockData(block.text(), in_block_comment, format_key, entry_in_block_comment))
+        if mark_dirty:
+            # Only relayouts the block; no contentsChange or undo entry is produced
+            self.text_edit.document().markContentsDirty(block.position(), block.length())
+        return True
+
+    def mark_blocks_dirty(self, first_block, last_block):
+        """Relayout the span from first_block to last_block after painting it with mark_dirty=False."""
+        if first_block.isValid() and last_block.isValid():
+            start = first_block.position()
+            self.text_edit.document().markContentsDirty(start, last_block.position() + last_block.length() - start)
 
     def load_highlighting_rules(self):
         """Load highlighting rules from JSON configuration in user directory, copying from fallback if needed."""
@@ -334,60 +1226,34 @@ class SyntaxHighlighter:
                 return
 
         if os.path.exists(language_file):
-            try:
-                with open(language_file, "r", encoding="utf-8") as f:
-                    config = json.load(f)
-                    self.highlighting_rules = []
-                    if show_rules_info:
-                        self.ide.terminal.log(f"HL: Loaded language file from {language_file}", "INFO")
-
-                    try:
-                        block_start = config.get("block_comment_start", r'/\*')
-                        self.block_comment_start = re.compile(block_start)
-                        if show_hl_info:
-                            self.ide.terminal.log(f"HL: Loaded block comment start: {block_start}", "INFO")
-                    except re.error as e:
-                        self.ide.terminal.log(f"HL: Invalid block comment start pattern '{block_start}': {str(e)}", "ERROR")
-                        self.block_comment_start = None
-
-                    try:
-                        block_end = config.get("block_comment_end", r'\*/')
-                        self.block_comment_end = re.compile(block_end)
-                        if show_hl_info:
-                            self.ide.terminal.log(f"HL: Loaded block comment end: {block_end}", "INFO")
-                    except re.error as e:
-                        self.ide.terminal.log(f"HL: Invalid block comment end pattern '{block_end}': {str(e)}", "ERROR")
-                        self.block_comment_end = None
-
-                    for rule in config.get("patterns", []):
-                        try:
-                            pattern = rule["match"]
-                            color = QColor(rule["color"])
-                            bold = rule.get("bold", False)
-                            italic = rule.get("italic", False)
-                            case_insensitive = rule.get("case_insensitive", False)
-                            format = QTextCharFormat()
-                            format.setForeground(color)
-                            if bold:
-                                format.setFontWeight(QFont.Bold)
-                            if italic:
-                                format.setFontItalic(True)
-                            flags = re.IGNORECASE if case_insensitive else 0
-                            compiled_pattern = re.compile(pattern, flags)
-                            self.highlighting_rules.append((compiled_pattern, format))
-                            if show_rules_info:
-                                self.ide.terminal.log(f"HL: Loaded rule - Pattern: {pattern}, Color: {rule['color']}, Case Insensitive: {case_insensitive}", "INFO")
-                        except re.error as e:
-                                self.ide.terminal.log(f"HL: Invalid regex pattern '{rule.get('match', 'unknown')}' in JSON: {str(e)}", "ERROR")
-                        except Exception as e:
-                                self.ide.terminal.log(f"HL: Error processing rule {rule.get('match', 'unknown')}: {str(e)}", "ERROR")
-            except json.JSONDecodeError as e:
-                self.ide.terminal.log(f"HL: Corrupted JSON in {language_file}: {str(e)}", "ERROR")
-            except Exception as e:
-                self.ide.terminal.log(f"HL: Error loading {language_file}: {str(e)}", "ERROR")
+            ruleset = LanguageRuleset.get(language_file, self.ide.terminal.log)
+            if ruleset is not None:
+                self.set_ruleset(ruleset)
         else:
       	    self.ide.terminal.log(f"HL: Language file not found at {language_file} after copy attempt", "ERROR")
 
+    def set_ruleset(self, ruleset):
+        """Switch to a compiled ruleset and repaint: cached tokens, block states and painted formats all depend on it."""
+        if ruleset is self.ruleset:
+            return
+        self.ruleset = ruleset
+        self.highlighting_rules = ruleset.highlighting_rules
+        self.block_comment_start = ruleset.block_comment_start
+        self.block_comment_end = ruleset.block_comment_end
+        self.tokenizer = ruleset.tokenizer
+        self.highlight_cache.clear()  # Cached tokens hold rule indices of the previous rules
+        doc = self.text_edit.document()
+        block = doc.firstBlock()
+        while block.isValid():
+            block.setUserState(self.STATE_UNKNOWN)
+            block.setUserData(None)
+            block = block.next()
+        self.state_dirty_range = (0, max(0, doc.blockCount() - 1))
+        self.idle_sweep_block_num = 0
+        self.cancel_document_tokenize()
+        self.tokenize_task_pending = True
+        self.schedule_highlighting()
+
     def schedule_highlighting(self):
         if show_hl_info:
             self.ide.terminal.log("HL: Scheduling highlighting", "INFO")
@@ -398,25 +1264,74 @@ class SyntaxHighlighter:
         self.highlight_timer.start()
 
     def block_count_changed(self, new_block_count):
-        if new_block_count != self.last_block_count:
-            start_block_num = 0  # Rehighlight all blocks
-            end_block_num = new_block_count - 1
-            self.pending_changes.append((start_block_num, end_block_num))
-            if show_hl_info:
-                self.ide.terminal.log(f"HL: Block count changed to {new_block_count}, scheduling highlight for {start_block_num}-{end_block_num}", "INFO")
-            self._apply_highlighting()  # Immediate highlight
-            self.last_block_count = new_block_count
-
-    def on_contents_change(self):
-        # Mark all visible blocks for rehighlighting
-        start_block_num = self.text_edit.cursorForPosition(self.text_edit.viewport().pos()).blockNumber()
-        end_block_num = self.text_edit.document().findBlock(self.text_edit.cursorForPosition(
-            self.text_edit.viewport().rect().bottomRight()).position()).blockNumber()
-        self.pending_changes.append((start_block_num, end_block_num))
+        # Inserted and removed lines arrive through contentsChange; only the bookkeeping is needed here
         if show_hl_info:
-            self.ide.terminal.log(f"HL: Text changed, scheduling highlight for {start_block_num}-{end_block_num}", "INFO")
-        self._apply_highlighting()  # Immediate highlight
-            
+            self.ide.terminal.log(f"HL: Block count changed from {self.last_block_count} to {new_block_count}", "INFO")
+        self.last_block_count = new_block_count
+
+    def on_contents_change(self, position=0, chars_removed=0, chars_added=0):
+        # Turn the edit delta into the block range it touched; removed text leaves nothing behind but the block at position
+        doc = self.text_edit.document()
+        first_block_num = doc.findBlock(position).blockNumber()
+        last_block = doc.findBlock(position + chars_added)
+        last_block_num = last_block.blockNumber() if last_block.isValid() else doc.blockCount() - 1
+        if self.state_dirty_range:
+            first_block_num = min(first_block_num, self.state_dirty_range[0])
+            last_block_num = max(last_block_num, self.state_dirty_range[1])
+        self.state_dirty_range = (max(0, first_block_num), max(0, last_block_num))
+        self.idle_sweep_block_num = min(self.idle_sweep_block_num, first_block_num)
+        self.document_revision += 1
+        if self.tokenize_task is not None:
+            self.tokenize_dirty_from = first_block_num if self.tokenize_dirty_from is None else min(self.tokenize_dirty_from, first_block_num)
+        if show_hl_info:
+            self.ide.terminal.log(f"HL: Contents changed at {position} (-{chars_removed} +{chars_added}), scheduling highlight for {first_block_num}-{last_block_num}", "INFO")
+        self.edit_flush_timer.start()
+
+    def flush_edits(self):
+        """Highlight everything edited since the last pass; called by the zero timer or at the end of a key event."""
+        self.edit_flush_timer.stop()
+        if self.state_dirty_range is not None:
+            self._apply_highlighting()
+
+    def update_block_states(self, first_block_num, last_block_num):
+        """Recompute block comment states from the first edited block forward, stopping at the first block past the edit whose state is unchanged.
+
+        Returns the number of the last block rescanned.
+        """
+        if self.tokenizer is None:
+            return last_block_num
+        block = self.text_edit.document().findBlockByNumber(first_block_num)
+        # Resume from the nearest block whose predecessor has a known state
+        while block.isValid() and block.previous().isValid() and block.previous().userState() == self.STATE_UNKNOWN:
+            block = block.previous()
+        in_block_comment = self.block_entry_state(block)
+        recomputed_blocks = 0
+        while block.isValid():
+            in_block_comment = self.tokenizer.line_state(block.text(), in_block_comment)
+            state = self.IN_BLOCK_COMMENT if in_block_comment else self.OUTSIDE_BLOCK_COMMENT
+            recomputed_blocks += 1
+            if block.userState() == state and block.blockNumber() >= last_block_num:
+                break
+            block.setUserState(state)
+            if not block.next().isValid():
+                break
+            block = block.next()
+        if show_hl_info:
+            self.ide.terminal.log(f"HL: Recomputed block comment state for {recomputed_blocks} blocks from block {first_block_num}", "INFO")
+        return block.blockNumber()
+
+    def block_entry_state(self, block):
+        """Return whether a block starts inside a block comment, from the state stored on the block before it."""
+        previous = block.previous()
+        if not previous.isValid():
+            return False
+        state = previous.userState()
+        if state == self.STATE_UNKNOWN:
+            # Never indexed (e.g. the language file was missing): fill the index up to this block
+            self.update_block_states(0, previous.blockNumber())
+            state = previous.userState()
+        return state == self.IN_BLOCK_COMMENT
+
     def _apply_highlighting(self):
         if show_hl_info:
             self.ide.terminal.log("HL: Applying highlighting", "INFO")
@@ -435,41 +1350,32 @@ class SyntaxHighlighter:
                 self.ide.terminal.log(f"HL: File {self.text_edit.file_path} is not .gcb, skipping highlighting", "INFO")
             return
         doc = self.text_edit.document()
-        was_modified = doc.isModified()
-        cursor = self.text_edit.cursorForPosition(self.text_edit.viewport().pos())
-        first_visible_block = doc.findBlock(cursor.position())
-        # Use bottomRight to include partially visible bottom line
-        last_visible_block = doc.findBlock(self.text_edit.cursorForPosition(
-            self.text_edit.viewport().rect().bottomRight()).position())
-        # Extend to next block if slightly visible
-        if last_visible_block.isValid():
-            next_block = last_visible_block.next()
-            if next_block.isValid() and next_block.layout().position().y() < self.text_edit.viewport().rect().bottom():
-                last_visible_block = next_block
-        visible_range = (first_visible_block.blockNumber(), last_visible_block.blockNumber() if last_visible_block.isValid() else doc.blockCount() - 1)
+        if self.state_dirty_range:
+            first_block_num, last_block_num = self.state_dirty_range
+            self.state_dirty_range = None
+            # Blocks whose entry state changed need repainting along with the edited ones
+            last_block_num = max(last_block_num, self.update_block_states(first_block_num, last_block_num))
+            self.pending_changes.append((first_block_num, last_block_num))
+        if self.tokenize_task_pending:
+            self.start_document_tokenize()
+        visible_range = self.text_edit.visible_block_range()
+        first_visible_block = doc.findBlockByNumber(visible_range[0])
         if show_hl_info:
             self.ide.terminal.log(f"HL: Visible range: {visible_range[0]}-{visible_range[1]}", "INFO")
         blocks_to_highlight = set()
-        # Add pending changes
+        # Paint only the part of each dirty range that is on screen, or about to be once the view follows the
+        # text cursor; the rest is painted when scrolled into view
+        page = visible_range[1] - visible_range[0] + 1
+        cursor_block_num = self.text_edit.textCursor().blockNumber()
+        paint_windows = (visible_range, (cursor_block_num - page, cursor_block_num + page))
         for start_block_num, end_block_num in self.pending_changes:
-            for block_num in range(start_block_num, end_block_num + 1):
-                block = doc.findBlockByNumber(block_num)
-                if block.isValid():
+            for window_start, window_end in paint_windows:
+                for block_num in range(max(start_block_num, window_start), min(end_block_num, window_end) + 1):
                     blocks_to_highlight.add(block_num)
-                    # Clear highlighted_blocks for modified blocks
-                    if block_num in self.highlighted_blocks:
-                        self.highlighted_blocks.remove(block_num)
-                    # Clear cache and highlighted_blocks for modified and subsequent blocks
-                    if block_num in self.block_format_cache:
-                        del self.block_format_cache[block_num]
-                    for cached_key in list(self.block_format_cache.keys()):
-                        if cached_key[0] >= block_num:
-                            del self.block_format_cache[cached_key]
-                            self.highlighted_blocks.discard(cached_key[0])
+                    self.highlighted_blocks.discard(block_num)
             if show_hl_info:
                 self.ide.terminal.log(f"HL: Added pending blocks {start_block_num}-{end_block_num} to highlight", "INFO")
-        self.pending_changes.clear()
-        if not blocks_to_highlight:
+        if not self.pending_changes:
             block = first_visible_block
             while block.isValid() and block.blockNumber() <= visible_range[1]:
                 block_num = block.blockNumber()
@@ -477,115 +1383,1168 @@ class SyntaxHighlighter:
                 block = block.next()
             if show_hl_info:
                 self.ide.terminal.log(f"HL: No pending changes, highlighting new visible blocks {visible_range[0]}-{visible_range[1]}", "INFO")
+        self.pending_changes.clear()
+        self.schedule_idle_highlighting(visible_range)
         if not blocks_to_highlight:
             if show_hl_info:
                 self.ide.terminal.log("HL: No blocks to highlight", "INFO")
             self.highlight_pending = False
             return
-        in_block_comment = False
-        block = doc.firstBlock()
-        while block.isValid() and block.blockNumber() < visible_range[0]:
-            block_data = block.userData()
-            if block_data:
-                in_block_comment = block_data.get_in_block_comment()
-            block = block.next()
-        # Check for single-line comments
+        painted_blocks = 0
+        first_painted = last_painted = None
         for block_num in sorted(blocks_to_highlight):
             block = doc.findBlockByNumber(block_num)
-            if block.isValid() and block.text().lstrip().startswith('//'):
-                blocks_to_highlight.remove(block_num)
-                blocks_to_highlight.add(block_num)  # Re-add to process last
-        max_total_ranges = 10000
-        was_undo_enabled = doc.isUndoRedoEnabled()
-        doc.setUndoRedoEnabled(False)
-        try:
-            for block_num in sorted(blocks_to_highlight):
-                block = doc.findBlockByNumber(block_num)
-                if not block.isValid():
-                    self.ide.terminal.log(f"HL: Invalid block number {block_num}, skipping", "ERROR")
+            if not block.isValid():
+                self.ide.terminal.log(f"HL: Invalid block number {block_num}, skipping", "ERROR")
+                continue
+            if show_hl_info:
+                self.ide.terminal.log(f"HL: Highlighting block {block_num}: {block.text()[:50]}...", "INFO")
+            if self.highlight_block(block, mark_dirty=False):
+                painted_blocks += 1
+                if first_painted is None:
+                    first_painted = block
+                last_painted = block
+        if first_painted is not None:
+            self.mark_blocks_dirty(first_painted, last_painted)
+        if show_hl_info:
+            self.ide.terminal.log(f"HL: Painted {painted_blocks} of {len(blocks_to_highlight)} blocks - isUndoAvailable: {doc.isUndoAvailable()}, isModified: {doc.isModified()}", "INFO")
+        if self.ide.settings.get('show_hl_info', False):
+            self.ide.terminal.log(f"HL: Cache {self.highlight_cache.stats()}", "INFO")
+        self.highlight_pending = False
+        self.last_visible_range = visible_range
+
+    def schedule_idle_highlighting(self, visible_range):
+        """Queue the prefetch margin around the viewport and (re)start the idle timer; any edit or scroll pushes it back."""
+        margin = (visible_range[1] - visible_range[0] + 1) * self.ide.settings.get('highlight_prefetch_pages', 2)
+        self.idle_prefetch_ranges.clear()
+        self.idle_prefetch_ranges.append((visible_range[1] + 1, visible_range[1] + margin))
+        self.idle_prefetch_ranges.append((max(0, visible_range[0] - margin), visible_range[0] - 1))
+        self.idle_timer.start(self.ide.settings.get('highlight_idle_delay', 500))
+
+    def _highlight_idle_chunk(self):
+        """Paint blocks for one short time slice, prefetch ranges first and then the document sweep."""
+        if not hasattr(self.text_edit, "file_path") or not self.text_edit.file_path.lower().endswith(".gcb") or self.tokenizer is None:
+            return
+        if self.state_dirty_range:
+            self._apply_highlighting()  # Brings the block states up to date and reschedules the idle pass
+            return
+        doc = self.text_edit.document()
+        block_count = doc.blockCount()
+        deadline = time.perf_counter() + self.ide.settings.get('highlight_idle_slice', 4) / 1000.0
+        painted_blocks = []
+        while time.perf_counter() < deadline:
+            if self.idle_prefetch_ranges:
+                start_block_num, end_block_num = self.idle_prefetch_ranges[0]
+                if start_block_num > min(end_block_num, block_count - 1):
+                    self.idle_prefetch_ranges.popleft()
                     continue
-                text = block.text()
+                self.idle_prefetch_ranges[0] = (start_block_num + 1, end_block_num)
+                block_num = start_block_num
+            elif self.tokenize_task is not None:
+                # The worker is covering the rest of the document; the sweep resumes when it finishes
+                self.mark_painted_runs_dirty(painted_blocks)
+                return
+            elif self.idle_sweep_block_num < block_count:
+                block_num = self.idle_sweep_block_num
+                self.idle_sweep_block_num += 1
+            else:
+                self.mark_painted_runs_dirty(painted_blocks)
                 if show_hl_info:
-                    self.ide.terminal.log(f"HL: Highlighting block {block_num}: {text[:50]}...", "INFO")
-                block_length = len(text)
-                # Apply single-line comment format if applicable
-                if text.lstrip().startswith('//'):
-                    format_ranges = [(0, block_length, self.highlighting_rules[3][1])]  # // comment rule
-                    in_block_comment = False
-                    if show_hl_info:
-                        self.ide.terminal.log(f"HL: Applied single-line comment format for block {block_num}", "INFO")
-                else:
-                    # Check cache for unchanged block
-                    text_hash = hash(text)
-                    cache_key = (block_num, text_hash)
-                    if cache_key in self.block_format_cache:
-                        format_ranges, in_block_comment = self.block_format_cache[cache_key]
-                        if show_hl_info:
-                            self.ide.terminal.log(f"HL: Using cached ranges for block {block_num}", "INFO")
-                    else:
-                        format_ranges = []
-                        block_number = block.blockNumber()
-                        if in_block_comment:
-                            end_match = self.block_comment_end.search(text)
-                            if end_match and end_match.end() <= block_length:
-                                format_ranges.append((0, end_match.end(), self.highlighting_rules[0][1]))
-                                in_block_comment = False
-                            else:
-                                format_ranges.append((0, block_length, self.highlighting_rules[0][1]))
-                        else:
-                            start_match = self.block_comment_start.search(text)
-                            if start_match:
-                                start_pos = start_match.start()
-                                end_match = self.block_comment_end.search(text, start_pos)
-                                if end_match and end_match.end() <= block_length:
-                                    format_ranges.append((start_pos, end_match.end(), self.highlighting_rules[0][1]))
-                                else:
-                                    format_ranges.append((start_pos, block_length, self.highlighting_rules[0][1]))
-                                    in_block_comment = True
-                        if not in_block_comment:
-                            max_matches = 1000
-                            for pattern, format in self.highlighting_rules[1:]:
-                                match_count = 0
-                                for match in pattern.finditer(text):
-                                    if match_count >= max_matches:
-                                        self.ide.terminal.log(f"HL: Reached max matches ({max_matches}) for pattern {pattern.pattern}", "ERROR")
-                                        break
-                                    start, end = match.start(), match.end()
-                                    if end <= block_length:
-                                        format_ranges.append((start, end, format))
-                                    match_count += 1
-                        # Cache format_ranges and in_block_comment state
-                        self.block_format_cache[cache_key] = (format_ranges, in_block_comment)
-                if len(format_ranges) > max_total_ranges:
-                    self.ide.terminal.log(f"HL: Exceeded max total ranges ({max_total_ranges}) in block {block_number}", "ERROR")
+                    self.ide.terminal.log(f"HL: Idle highlighting reached the end of {block_count} blocks", "INFO")
+                return
+            block = doc.findBlockByNumber(block_num)
+            if self.highlight_block(block, mark_dirty=False):
+                painted_blocks.append(block)
+        self.mark_painted_runs_dirty(painted_blocks)
+        self.idle_timer.start(0)
+
+    def start_document_tokenize(self):
+        """Tokenize the whole document on the thread pool, replacing any task still running."""
+        self.tokenize_task_pending = False
+        if not hasattr(self.text_edit, "file_path") or not self.text_edit.file_path.lower().endswith(".gcb") or self.tokenizer is None:
+            return
+        self.cancel_document_tokenize()
+        # toPlainText joins blocks with \n; lines it alters (non-breaking spaces) fail the text check and are left to the sweep
+        lines = self.text_edit.document().toPlainText().split("\n")
+        task = DocumentTokenizeTask(self.tokenizer, lines, self.document_revision)
+        task.signals.batch_ready.connect(lambda first_block_num, batch, task=task: self.on_tokenize_batch(task, first_block_num, batch))
+        task.signals.finished.connect(lambda task=task: self.on_tokenize_batch(task, None, None))
+        self.tokenize_task = task
+        self.tokenize_dirty_from = None
+        QThreadPool.globalInstance().start(task)
+        if show_hl_info:
+            self.ide.terminal.log(f"HL: Started background tokenizing of {len(lines)} blocks at revision {self.document_revision}", "INFO")
+
+    def cancel_document_tokenize(self):
+        if self.tokenize_task is not None:
+            self.tokenize_task.cancelled = True
+        self.tokenize_task = None
+        self.tokenize_dirty_from = None
+        self.tokenize_batches.clear()
+        self.tokenize_apply_timer.stop()
+
+    def stop_background_work(self):
+        """Cancel the worker task and idle timers, e.g. when the tab is closed."""
+        self.cancel_document_tokenize()
+        self.tokenize_task_pending = False
+        self.idle_timer.stop()
+        self.highlight_timer.stop()
+        self.edit_flush_timer.stop()
+
+    def on_tokenize_batch(self, task, first_block_num, batch):
+        # batch is None for the finished signal, queued behind the last batch
+        if task is not self.tokenize_task:
+            return  # Cancelled or replaced
+        self.tokenize_batches.append((first_block_num, batch))
+        if not self.tokenize_apply_timer.isActive():
+            self.tokenize_apply_timer.start(0)
+
+    def _apply_tokenize_batches(self):
+        """Apply worker results for one time slice: cache the tokens, store the block states and paint the blocks."""
+        task = self.tokenize_task
+        if task is None:
+            return
+        doc = self.text_edit.document()
+        rules = self.highlighting_rules
+        deadline = time.perf_counter() + self.ide.settings.get('highlight_idle_slice', 4) / 1000.0
+        painted_blocks = []
+        applied_blocks = 0
+        while self.tokenize_batches and time.perf_counter() < deadline:
+            first_block_num, batch = self.tokenize_batches.popleft()
+            if batch is None:
+                self.finish_document_tokenize(task, "finished")
+                break
+            # After an edit only blocks above the first edited one still match the snapshot
+            valid_until = len(batch)
+            if task.revision != self.document_revision:
+                valid_until = max(0, min(valid_until, (self.tokenize_dirty_from or 0) - first_block_num))
+            block = doc.findBlockByNumber(first_block_num)
+            index = 0
+            while index < valid_until and block.isValid() and time.perf_counter() < deadline:
+                token_array, entry_in_block_comment, in_block_comment = batch[index]
+                text = task.lines[first_block_num + index]
+                if text == block.text():
+                    tokens = list(zip(token_array[0::3], token_array[1::3], token_array[2::3]))
+                    self.highlight_cache.put(text, entry_in_block_comment, tokens, in_block_comment)
+                    block.setUserState(self.IN_BLOCK_COMMENT if in_block_comment else self.OUTSIDE_BLOCK_COMMENT)
+                    if not self.block_is_painted(block, entry_in_block_comment):
+                        format_ranges = [(start, end, rules[rule][1]) for start, end, rule in tokens]
+                        if self.apply_block_formats(block, format_ranges, in_block_comment, entry_in_block_comment, mark_dirty=False):
+                            painted_blocks.append(block)
+                    applied_blocks += 1
+                block = block.next()
+                index += 1
+            if index < valid_until and block.isValid():
+                # Out of time: keep the rest of the batch for the next slice
+                self.tokenize_batches.appendleft((first_block_num + index, batch[index:]))
+                break
+            if valid_until < len(batch):
+                # Everything from the edit onwards is stale; the idle sweep repaints it
+                self.finish_document_tokenize(task, f"discarded from block {first_block_num + valid_until} after an edit")
+                break
+        self.mark_painted_runs_dirty(painted_blocks)
+        if show_hl_info:
+            self.ide.terminal.log(f"HL: Applied background tokens for {applied_blocks} blocks, painted {len(painted_blocks)}", "INFO")
+        if self.tokenize_batches and self.tokenize_task is task:
+            self.tokenize_apply_timer.start(0)
+
+    def finish_document_tokenize(self, task, outcome):
+        task.cancelled = True
+        self.tokenize_task = None
+        self.tokenize_dirty_from = None
+        self.tokenize_batches.clear()
+        self.idle_timer.start(self.ide.settings.get('highlight_idle_delay', 500))
+        if show_hl_info:
+            self.ide.terminal.log(f"HL: Background tokenizing {outcome}", "INFO")
+
+    def mark_painted_runs_dirty(self, painted_blocks):
+        """Mark each run of consecutive painted blocks dirty in one call; prefetch and sweep blocks may be far apart."""
+        run_start = None
+        for index, block in enumerate(painted_blocks):
+            if run_start is None:
+                run_start = block
+            next_block = painted_blocks[index + 1] if index + 1 < len(painted_blocks) else None
+            if next_block is None or next_block.blockNumber() != block.blockNumber() + 1:
+                self.mark_blocks_dirty(run_start, block)
+                run_start = None
+
+def changed_line_span(document, position, chars_added, old_line_count):
+    """Map a contentsChange to (first line, lines it held before, lines it holds now); None if it cannot be placed.
+
+    The block count difference says how many lines the edited range held before the change.
+    """
+    first_line = document.findBlock(position).blockNumber()
+    last_block = document.findBlock(position + chars_added)
+    last_line = last_block.blockNumber() if last_block.isValid() else document.blockCount() - 1
+    new_span = last_line - first_line + 1
+    old_span = new_span - (document.blockCount() - old_line_count)
+    if first_line < 0 or old_span < 0 or first_line + old_span > old_line_count:
+        return None
+    return first_line, old_span, new_span
+
+def diff_line_ranges(old_lines, new_lines, max_edits=1000):
+    """Return the (old start, old end, new start, new end) line ranges that differ between two lists of lines.
+
+    The lines both lists start and end with are trimmed, then the rest is compared with Myers' O(ND) algorithm,
+    whose cost grows with the number of lines inserted and deleted rather than the length of the files, so a
+    few edits to a long file with many repeated lines stay cheap. Past max_edits inserted or deleted lines it
+    hands over to difflib, which is faster on very different texts but may report larger ranges.
+    """
+    head = 0
+    limit = min(len(old_lines), len(new_lines))
+    while head < limit and old_lines[head] == new_lines[head]:
+        head += 1
+    tail = 0
+    while tail < limit - head and old_lines[-1 - tail] == new_lines[-1 - tail]:
+        tail += 1
+    a = old_lines[head:len(old_lines) - tail]
+    b = new_lines[head:len(new_lines) - tail]
+    if not a or not b:
+        ranges = [(0, len(a), 0, len(b))] if a or b else []
+    else:
+        ranges = myers_line_ranges(a, b, max_edits)
+        if ranges is None:
+            matcher = difflib.SequenceMatcher(None, a, b)
+            ranges = [(i1, i2, j1, j2) for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != "equal"]
+    return [(i1 + head, i2 + head, j1 + head, j2 + head) for i1, i2, j1, j2 in ranges]
+
+def myers_line_ranges(a, b, max_edits):
+    """The differing line ranges of a and b by Myers' shortest edit script, or None past max_edits edits."""
+    n, m = len(a), len(b)
+    v = {1: 0}  # Diagonal k (line of a - line of b) -> furthest line of a reached on it
+    trace = []  # v before each step, to walk the path back
+    for d in range(min(n + m, max_edits) + 1):
+        trace.append(v.copy())
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[k - 1] < v[k + 1]):
+                x = v[k + 1]  # Down: a line of b inserted
+            else:
+                x = v[k - 1] + 1  # Right: a line of a deleted
+            y = x - k
+            while x < n and y < m and a[x] == b[y]:
+                x += 1
+                y += 1
+            v[k] = x
+            if x >= n and y >= m:
+                return myers_backtrack(trace, n, m)
+    return None
+
+def myers_backtrack(trace, n, m):
+    """Walk a Myers path back from the end, joining the single line edits that touch into ranges."""
+    ranges = []
+    x, y = n, m
+    for d in range(len(trace) - 1, 0, -1):
+        v = trace[d]
+        k = x - y
+        down = k == -d or (k != d and v[k - 1] < v[k + 1])
+        previous_k = k + 1 if down else k - 1
+        previous_x = v[previous_k]
+        previous_y = previous_x - previous_k
+        edit_end = (previous_x, previous_y + 1) if down else (previous_x + 1, previous_y)
+        if ranges and (ranges[-1][0], ranges[-1][2]) == edit_end:
+            ranges[-1][0], ranges[-1][2] = previous_x, previous_y
+        else:
+            ranges.append([previous_x, edit_end[0], previous_y, edit_end[1]])
+        x, y = previous_x, previous_y
+    return [tuple(edit_range) for edit_range in reversed(ranges)]
+
+class EditJournal:
+    """Recent revisions of one document, stored as line deltas instead of full-text snapshots.
+
+    The journal keeps a shadow copy of the document as a list of lines. Each contentsChange replaces the
+    lines it touched in the shadow and stores (first line, removed lines, inserted lines), so recording an
+    edit costs the size of the edit rather than the size of the document. Every CHECKPOINT_INTERVAL
+    revisions a tuple of the shadow lines is kept as a checkpoint; it shares the line strings with the
+    shadow, so it costs one pointer per line, and it bounds how many deltas a rebuild has to undo. The
+    oldest deltas and checkpoints are dropped to stay within max_revisions and max_bytes.
+    """
+    CHECKPOINT_INTERVAL = 50
+    LINE_OVERHEAD = 56  # Approximate bytes per stored line: the str header plus its list slot
+
+    def __init__(self, document, max_revisions=100, max_bytes=4 * 1024 * 1024):
+        self.document = document
+        self.max_revisions = max_revisions
+        self.max_bytes = max_bytes
+        # toRawText keeps the characters toPlainText would replace, matching QTextBlock.text()
+        self.lines = document.toRawText().split("\u2029")
+        self.revision = 0
+        self.entries = deque()  # (revision, first line, removed lines, inserted lines, size)
+        self.checkpoints = deque()  # (revision, lines, size)
+        self.bytes_used = 0
+        document.contentsChange.connect(self.on_contents_change)
+
+    def detach(self):
+        try:
+            self.document.contentsChange.disconnect(self.on_contents_change)
+        except (RuntimeError, TypeError):
+            pass  # The editor deletes the document it owned when it is given a new one
+
+    def delta_size(self, lines):
+        return sum(map(len, lines)) + self.LINE_OVERHEAD * len(lines)
+
+    def on_contents_change(self, position, chars_removed, chars_added):
+        doc = self.document
+        span = changed_line_span(doc, position, chars_added, len(self.lines))
+        if span is None:
+            # The change cannot be placed in the shadow; record it as a replacement of the whole text
+            span = (0, len(self.lines), doc.blockCount())
+        first_line, old_span, new_span = span
+        block = doc.findBlockByNumber(first_line)
+        inserted = []
+        for _ in range(new_span):
+            inserted.append(block.text())
+            block = block.next()
+        inserted = tuple(inserted)
+        removed = tuple(self.lines[first_line:first_line + old_span])
+        if removed == inserted:
+            return  # Format-only change
+        self.lines[first_line:first_line + old_span] = inserted
+        self.revision += 1
+        size = self.delta_size(removed) + self.delta_size(inserted)
+        self.entries.append((self.revision, first_line, removed, inserted, size))
+        self.bytes_used += size
+        if self.revision % self.CHECKPOINT_INTERVAL == 0:
+            checkpoint_size = 8 * len(self.lines)
+            self.checkpoints.append((self.revision, tuple(self.lines), checkpoint_size))
+            self.bytes_used += checkpoint_size
+        self.trim()
+
+    def trim(self):
+        while self.entries and (len(self.entries) > self.max_revisions or self.bytes_used > self.max_bytes):
+            self.bytes_used -= self.entries.popleft()[4]
+        # Checkpoints older than the oldest revision that can still be rebuilt are of no use
+        oldest = self.oldest_revision()
+        while self.checkpoints and (self.checkpoints[0][0] < oldest or self.bytes_used > self.max_bytes):
+            self.bytes_used -= self.checkpoints.popleft()[2]
+
+    def oldest_revision(self):
+        """The oldest revision rebuild() can return: the one before the oldest delta still kept."""
+        return self.entries[0][0] - 1 if self.entries else self.revision
+
+    def rebuild(self, revision):
+        """Return the text of the document as it was at a revision, or None if it is no longer kept."""
+        if not self.oldest_revision() <= revision <= self.revision:
+            return None
+        # Start from the nearest checkpoint at or after the revision and undo the deltas in between
+        base_revision, base_lines = self.revision, self.lines
+        for checkpoint_revision, checkpoint_lines, size in self.checkpoints:
+            if checkpoint_revision >= revision:
+                base_revision, base_lines = checkpoint_revision, checkpoint_lines
+                break
+        lines = list(base_lines)
+        for entry_revision, first_line, removed, inserted, size in reversed(self.entries):
+            if entry_revision <= revision:
+                break
+            if entry_revision <= base_revision:
+                lines[first_line:first_line + len(inserted)] = removed
+        return "\n".join(lines)
+
+class DocumentOutline:
+    """Symbols declared in one document, for the Outline panel, kept up to date an edit at a time.
+
+    symbol_lines holds the numbers of the lines that declare something, in order, and symbols the matching
+    (kind, name) pairs. End Sub, End Function, End Macro and End Table lines are kept as "End" entries so the
+    panel can nest a sub's Dims and labels under it, and lines holding a block comment delimiter of the
+    language file as "Comment" entries with their text, so declarations inside /* */ can be left out without
+    rescanning the document. An edit reparses only the lines it touched. Moving the lines after it is deferred:
+    pending_shift is added to every entry from pending_index on, and folded in when the entries are read or
+    the next edit lands elsewhere. The table is built the first time the panel shows the document.
+    """
+    SYMBOL_PATTERN = re.compile(
+        r"[ \t]*(?:(?P<block>sub|function|macro|table)\s+(?P<block_name>[A-Za-z_][\w.]*)"
+        r"|(?P<end>end\s+(?:sub|function|macro|table))\b"
+        r"|#define\s+(?P<define>[A-Za-z_]\w*)"
+        r"|dim\s+(?P<dim>[^'\";\n]+)"
+        r"|(?P<label>[A-Za-z_]\w*):(?=[ \t]*(?:$|'|;|//)))",
+        re.IGNORECASE | re.MULTILINE)
+    # Anchored on the newline before each line so the scan can skip straight to line starts
+    LINE_START_PATTERN = re.compile("\n" + SYMBOL_PATTERN.pattern, SYMBOL_PATTERN.flags)
+    DIM_TYPE_PATTERN = re.compile(r"\s+(?:as|at|alias)\s+|//", re.IGNORECASE)
+
+    def __init__(self, text_edit):
+        self.text_edit = text_edit
+        self.document = None
+        self.line_count = 0
+        self.symbol_lines = None  # None until first needed
+        self.symbols = None
+        self.pending_index = 0
+        self.pending_shift = 0
+        self.version = 0  # Bumped when the entries change, but not when they only move
+        self.delimiter_pattern = None
+        self.tokenizer = None
+
+    def set_document(self, document):
+        if self.document is not None:
+            try:
+                self.document.contentsChange.disconnect(self.on_contents_change)
+            except (RuntimeError, TypeError):
+                pass  # The editor deletes the document it owned when it is given a new one
+        self.document = document
+        document.contentsChange.connect(self.on_contents_change)
+        self.symbol_lines = self.symbols = None
+        self.version += 1
+        self.text_edit.ide.schedule_outline_refresh(self.text_edit)
+
+    def parse_lines(self, numbered_lines):
+        """Parse (line number, text) pairs into entries."""
+        line_numbers = []
+        symbols = []
+        match = self.SYMBOL_PATTERN.match
+        delimiter = self.delimiter_pattern.search if self.delimiter_pattern is not None else None
+        for line_number, text in numbered_lines:
+            match_result = match(text)
+            if match_result is not None:
+                symbol = self.symbol_from_match(match_result)
+                if symbol is not None:
+                    line_numbers.append(line_number)
+                    symbols.append(symbol)
+            if delimiter is not None and delimiter(text):
+                line_numbers.append(line_number)
+                symbols.append(("Comment", text))
+        return line_numbers, symbols
+
+    @classmethod
+    def symbol_from_match(cls, match):
+        if match.group("block"):
+            return (match.group("block").capitalize(), match.group("block_name"))
+        if match.group("end"):
+            return ("End", "")
+        if match.group("define"):
+            return ("#define", match.group("define"))
+        if match.group("dim") is not None:
+            names = cls.DIM_TYPE_PATTERN.split(match.group("dim"), 1)[0]
+            names = ", ".join(name.split("(")[0].strip() for name in names.split(",") if name.strip())
+            return ("Dim", names) if names else None
+        return ("Label", match.group("label"))
+
+    def parse_document(self, lines):
+        """Parse a whole document, finding the candidate lines with one regex scan per pattern over the text."""
+        text = "\n" + "\n".join(lines)
+        candidates = set()
+        scans = [(self.LINE_START_PATTERN, 0)]
+        if self.delimiter_pattern is not None:
+            scans.append((self.delimiter_pattern, -1))
+        for pattern, line_number in scans:
+            position = 0
+            for match in pattern.finditer(text):
+                line_number += text.count("\n", position, match.start())
+                position = match.start()
+                candidates.add(line_number)
+        return self.parse_lines((line_number, lines[line_number]) for line_number in sorted(candidates))
+
+    def ensure_parsed(self):
+        """Build the table if needed and fold in any deferred line shift."""
+        ruleset = self.text_edit.highlighter.ruleset
+        tokenizer = ruleset.tokenizer if ruleset is not None else None
+        if tokenizer is not self.tokenizer:
+            # The comment entries depend on the language file's delimiters
+            self.tokenizer = tokenizer
+            patterns = [pattern.pattern for pattern in (ruleset.block_comment_start, ruleset.block_comment_end) if pattern is not None] if ruleset else []
+            self.delimiter_pattern = re.compile("|".join(f"(?:{pattern})" for pattern in patterns)) if patterns else None
+            self.symbol_lines = self.symbols = None
+        if self.symbol_lines is None:
+            lines = self.document.toRawText().split("\u2029")
+            self.line_count = len(lines)
+            self.symbol_lines, self.symbols = self.parse_document(lines)
+            self.pending_index, self.pending_shift = len(self.symbol_lines), 0
+            self.version += 1
+        self.apply_pending_shift()
+
+    def apply_pending_shift(self):
+        if self.pending_shift:
+            index, shift = self.pending_index, self.pending_shift
+            self.symbol_lines[index:] = [line_number + shift for line_number in self.symbol_lines[index:]]
+        self.pending_index, self.pending_shift = len(self.symbol_lines), 0
+
+    def entry_index(self, line_number):
+        """Index of the first entry at or after a line, allowing for the deferred shift."""
+        index = bisect.bisect_left(self.symbol_lines, line_number, 0, self.pending_index)
+        if index == self.pending_index:
+            index = bisect.bisect_left(self.symbol_lines, line_number - self.pending_shift, index)
+        return index
+
+    def entry_line(self, index):
+        return self.symbol_lines[index] + (self.pending_shift if index >= self.pending_index else 0)
+
+    def visible_entries(self):
+        """Yield (index, kind, name) for the entries outside block comments, comment entries excluded."""
+        self.ensure_parsed()
+        in_block_comment = False
+        for index, (kind, name) in enumerate(self.symbols):
+            if kind == "Comment":
+                in_block_comment = self.tokenizer.line_state(name, in_block_comment)
+            elif not in_block_comment:
+                yield index, kind, name
+
+    def on_contents_change(self, position, chars_removed, chars_added):
+        if self.symbol_lines is None:
+            return
+        span = changed_line_span(self.document, position, chars_added, self.line_count)
+        self.line_count = self.document.blockCount()
+        if span is None:
+            self.symbol_lines = self.symbols = None  # Parsed again when next shown
+            self.version += 1
+            self.text_edit.ide.schedule_outline_refresh(self.text_edit)
+            return
+        first_line, old_span, new_span = span
+        block = self.document.findBlockByNumber(first_line)
+        texts = []
+        for _ in range(new_span):
+            texts.append(block.text())
+            block = block.next()
+        line_numbers, symbols = self.parse_lines(enumerate(texts, first_line))
+        start = self.entry_index(first_line)
+        end = self.entry_index(first_line + old_span)
+        shift = new_span - old_span
+        if not shift and self.symbols[start:end] == symbols and [self.entry_line(index) for index in range(start, end)] == line_numbers:
+            return  # Typing that declares nothing new leaves the table and the panel alone
+        # Entries from end on move by shift; only the ones between end and the deferred shift are moved now
+        lines = self.symbol_lines
+        if end <= self.pending_index:
+            lines[end:self.pending_index] = [line_number + shift for line_number in lines[end:self.pending_index]]
+        else:
+            lines[self.pending_index:end] = [line_number + self.pending_shift for line_number in lines[self.pending_index:end]]
+            self.pending_index = end
+        self.pending_shift += shift
+        lines[start:end] = line_numbers
+        self.pending_index += len(line_numbers) - (end - start)
+        if self.symbols[start:end] != symbols:
+            self.symbols[start:end] = symbols
+            self.version += 1
+            self.text_edit.ide.schedule_outline_refresh(self.text_edit)
+
+def block_comment_state(text, in_block_comment):
+    """Return whether a line ends inside a /* */ comment, for when no language file tokenizer is at hand."""
+    position = 0
+    while True:
+        position = text.find("*/" if in_block_comment else "/*", position)
+        if position == -1:
+            return in_block_comment
+        in_block_comment = not in_block_comment
+        position += 2
+
+def parse_library_file(path, tokenizer=None):
+    """Read the Subs, Functions, Macros, Tables, #defines and global Dims declared in one library file.
+
+    Runs in the library indexer's worker processes, so it stays a module level function. Returns
+    (path, mtime, size, symbols), symbols being (name, kind, line, signature, doc) tuples with doc taken from
+    the comment lines just above the declaration, or symbols None if the file could not be read. Declarations
+    on lines that start inside a block comment are left out, tracked with the language file's tokenizer as
+    the Outline panel does, so a delimiter in a string or line comment does not count.
+    """
+    try:
+        stat = os.stat(path)
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return path, None, None, None
+    symbols = []
+    comments = []
+    in_block = in_block_comment = False
+    for line_number, text in enumerate(lines):
+        stripped = text.strip()
+        commented = in_block_comment
+        if tokenizer is not None:
+            in_block_comment = tokenizer.line_state(text, in_block_comment)
+        else:
+            in_block_comment = block_comment_state(text, in_block_comment)
+        if commented or stripped.startswith("/*"):
+            continue
+        if stripped.startswith(("'", ";", "//")):
+            comments.append(stripped.lstrip("'; /").rstrip())
+            continue
+        if not stripped:
+            continue
+        match = DocumentOutline.SYMBOL_PATTERN.match(text)
+        symbol = DocumentOutline.symbol_from_match(match) if match is not None else None
+        if symbol is not None:
+            kind, name = symbol
+            doc = "\n".join(line for line in comments[-LibraryIndex.DOC_LINES:] if line)
+            if kind == "End":
+                in_block = False
+            elif kind in ("Sub", "Function", "Macro", "Table"):
+                in_block = True
+                symbols.append((name, kind, line_number, stripped, doc))
+            elif kind == "#define" or (kind == "Dim" and not in_block):
+                for dim_name in name.split(", "):
+                    symbols.append((dim_name, kind, line_number, stripped, doc))
+        comments = []
+    return path, stat.st_mtime, stat.st_size, symbols
+
+class LibraryIndex:
+    """Symbols of the GCBASIC include library, kept in an SQLite database so they survive restarts.
+
+    Each file is recorded with the mtime and size it had when parsed. An update parses only the files that
+    are new or have changed since, spread over a process pool, and drops the ones that are gone. Names are
+    looked up case-insensitively, as GCBASIC compares them. The GUI thread reads through its own connection
+    while an update writes through another; WAL mode lets the reads go on during the write.
+    """
+    SCHEMA_VERSION = 2  # 2: declarations after a block comment opened mid-line are left out
+    DOC_LINES = 8  # Comment lines kept above a declaration for its hover text
+    POOL_MIN_FILES = 16  # Fewer changed files than this are parsed without starting worker processes
+    COMMIT_FILES = 50
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.connection = None  # The GUI thread's, opened on first lookup
+
+    def connect(self):
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        connection = sqlite3.connect(self.db_path, timeout=30)
+        connection.execute("PRAGMA journal_mode=WAL")
+        if connection.execute("PRAGMA user_version").fetchone()[0] != self.SCHEMA_VERSION:
+            with connection:
+                connection.execute("DROP TABLE IF EXISTS files")
+                connection.execute("DROP TABLE IF EXISTS symbols")
+                connection.execute("CREATE TABLE files (path TEXT PRIMARY KEY, mtime REAL NOT NULL, size INTEGER NOT NULL)")
+                connection.execute("CREATE TABLE symbols (name_key TEXT NOT NULL, name TEXT NOT NULL, kind TEXT NOT NULL, "
+                                   "path TEXT NOT NULL, line INTEGER NOT NULL, signature TEXT NOT NULL, doc TEXT NOT NULL)")
+                connection.execute("CREATE INDEX symbols_by_name ON symbols (name_key)")
+                connection.execute("CREATE INDEX symbols_by_path ON symbols (path)")
+                connection.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+        return connection
+
+    def lookup(self, name):
+        """Return the (name, kind, path, line, signature, doc) rows declaring name, subs and functions first."""
+        if self.connection is None:
+            self.connection = self.connect()
+        return self.connection.execute(
+            "SELECT name, kind, path, line, signature, doc FROM symbols WHERE name_key = ? "
+            "ORDER BY kind = '#define', kind = 'Dim', path, line", (name.lower(),)).fetchall()
+
+    def update(self, folders, workers, full=False, cancelled=lambda: False, progress=None, tokenizer=None):
+        """Bring the index in line with the .h files in folders and return the counts of files parsed and removed.
+
+        tokenizer is the language file's RuleTokenizer, used to find block comments; it is pickled to the workers.
+        """
+        connection = self.connect()
+        try:
+            if full:
+                with connection:
+                    connection.execute("DELETE FROM files")
+                    connection.execute("DELETE FROM symbols")
+            found = {}
+            for folder in folders:
+                if not os.path.isdir(folder):
                     continue
-                cursor = QTextCursor(block)
-                cursor.beginEditBlock()
-                try:
-                    cursor.setPosition(block.position())
-                    cursor.setPosition(block.position() + block_length, QTextCursor.KeepAnchor)
-                    cursor.setCharFormat(QTextCharFormat())  # Clear existing formats
-                    format_ranges.sort(key=lambda x: x[0])  # Sort by start position
-                    for start, end, format in format_ranges:
-                        if end > block_length:
-                            self.ide.terminal.log(f"HL: Skipping invalid range ({start}, {end}) in block {block_number}", "ERROR")
-                            continue
-                        cursor.setPosition(block.position() + start)
-                        cursor.setPosition(block.position() + end, QTextCursor.KeepAnchor)
-                        cursor.mergeCharFormat(format)
-                finally:
-                    cursor.endEditBlock()
-                self.highlighted_blocks.add(block_num)
-                block.setUserData(TextBlockData(block.text(), in_block_comment))
+                for entry in os.scandir(folder):
+                    if entry.name.lower().endswith(".h") and entry.is_file():
+                        stat = entry.stat()
+                        found[entry.path] = (stat.st_mtime, stat.st_size)
+            known = {path: (mtime, size) for path, mtime, size in connection.execute("SELECT path, mtime, size FROM files")}
+            removed = [path for path in known if path not in found]
+            changed = sorted(path for path, state in found.items() if known.get(path) != state)
+            with connection:
+                for path in removed:
+                    connection.execute("DELETE FROM files WHERE path = ?", (path,))
+                    connection.execute("DELETE FROM symbols WHERE path = ?", (path,))
+            if not changed:
+                return 0, len(removed)
+            parsed = 0
+            if len(changed) < self.POOL_MIN_FILES or workers == 1:
+                parsed = self.store_results(connection, (parse_library_file(path, tokenizer) for path in changed), len(changed), cancelled, progress)
+            else:
+                # Spawned rather than forked: the GUI process has threads running
+                with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+                    results = pool.map(parse_library_file, changed, itertools.repeat(tokenizer, len(changed)), chunksize=8)
+                    parsed = self.store_results(connection, results, len(changed), cancelled, progress)
+                    if cancelled():
+                        pool.shutdown(wait=False, cancel_futures=True)
+            return parsed, len(removed)
         finally:
-            doc.setUndoRedoEnabled(was_undo_enabled)
-            doc.setModified(was_modified)
-            if show_hl_info:
-                self.ide.terminal.log(f"HL: After highlighting - isUndoAvailable: {doc.isUndoAvailable()}, isModified: {doc.isModified()}", "INFO")
-            self.highlight_pending = False
-        self.last_visible_range = visible_range
+            connection.close()
+
+    def store_results(self, connection, results, total, cancelled, progress):
+        parsed = 0
+        try:
+            for path, mtime, size, symbols in results:
+                if cancelled():
+                    break
+                connection.execute("DELETE FROM symbols WHERE path = ?", (path,))
+                if symbols is not None:
+                    connection.executemany("INSERT INTO symbols VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                           [(name.lower(), name, kind, path, line, signature, doc)
+                                            for name, kind, line, signature, doc in symbols])
+                    connection.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?)", (path, mtime, size))
+                parsed += 1
+                if parsed % self.COMMIT_FILES == 0:
+                    connection.commit()  # Work done so far survives a cancel or a crash
+                    if progress is not None:
+                        progress(parsed, total)
+        finally:
+            connection.commit()
+        return parsed
+
+class LibraryIndexSignals(QObject):
+    """Carries LibraryIndexTask progress back to the GUI thread."""
+    progress = pyqtSignal(int, int)  # files parsed, files to parse
+    finished = pyqtSignal(int, int)  # files parsed, files removed
+    failed = pyqtSignal(str)
+
+class LibraryIndexTask(QRunnable):
+    """Runs LibraryIndex.update on a QThreadPool thread."""
+
+    def __init__(self, index, folders, workers, full=False, tokenizer=None):
+        super().__init__()
+        self.index = index
+        self.folders = folders
+        self.workers = workers
+        self.full = full
+        self.tokenizer = tokenizer
+        self.cancelled = False
+        self.signals = LibraryIndexSignals()
+
+    def run(self):
+        try:
+            parsed, removed = self.index.update(self.folders, self.workers, self.full,
+                                                lambda: self.cancelled, self.signals.progress.emit, self.tokenizer)
+        except (OSError, sqlite3.Error) as e:
+            self.signals.failed.emit(str(e))
+            return
+        if not self.cancelled:
+            self.signals.finished.emit(parsed, removed)
+
+def search_pattern(text, whole_word=False, match_case=False, regular_expression=False):
+    """Compile a search term the way the find options describe; raises re.error for a bad expression."""
+    pattern = text if regular_expression else re.escape(text)
+    if whole_word:
+        pattern = rf"\b(?:{pattern})\b"
+    return re.compile(pattern, re.MULTILINE | (0 if match_case else re.IGNORECASE))
+
+class FindAllSignals(QObject):
+    """Carries FindAllTask matches back to the GUI thread."""
+    matches_found = pyqtSignal(object)  # [(start, end, line number, line text), ...]
+    finished = pyqtSignal(int, bool)  # matches found, stopped at the result limit
+
+class FindAllTask(QRunnable):
+    """Finds every match of a pattern in a snapshot of a document's text on a QThreadPool thread.
+
+    The snapshot is the document's raw text; its paragraph separators are turned into newlines here, off the
+    GUI thread, so positions stay document positions while ^, $ and . keep to one line. The whole snapshot is
+    searched in one pass, so a match may span lines, and matches are sent back in batches until max_results
+    is reached; a cancel takes effect at the next match.
+    """
+    BATCH_MATCHES = 500
+    LINE_TEXT_CHARS = 200
+    LINE_CONTEXT_CHARS = 80  # Shown before a match deep in a long line, so its preview stays a window around it
+
+    def __init__(self, pattern, text, max_results):
+        super().__init__()
+        self.pattern = pattern
+        self.text = text
+        self.max_results = max_results
+        self.cancelled = False
+        self.signals = FindAllSignals()
+
+    def run(self):
+        text = self.text.replace("\u2029", "\n")
+        batch = []
+        found = line_number = counted = 0
+        capped = False
+        for match in self.pattern.finditer(text):
+            if self.cancelled:
+                return
+            start, end = match.span()
+            if start == end:
+                continue  # Nothing to show for an empty match such as ^
+            line_number += text.count("\n", counted, start)
+            counted = start
+            window_start = max(0, start - self.LINE_CONTEXT_CHARS)
+            line_start = text.rfind("\n", window_start, start) + 1 or window_start
+            line_end = text.find("\n", start, start + self.LINE_TEXT_CHARS)
+            batch.append((start, end, line_number, text[line_start:line_end if line_end != -1 else start + self.LINE_TEXT_CHARS]))
+            found += 1
+            if found >= self.max_results:
+                capped = True
+                break
+            if len(batch) >= self.BATCH_MATCHES:
+                self.signals.matches_found.emit(batch)
+                batch = []
+        if self.cancelled:
+            return
+        if batch:
+            self.signals.matches_found.emit(batch)
+        self.signals.finished.emit(found, capped)
+
+def search_files(paths, pattern, max_matches):
+    """Search a batch of files for a compiled pattern, returning (path, line, start column, end column, line text) matches.
+
+    Runs in Find in Files' worker processes, so it stays a module level function. Stops after max_matches
+    matches and skips files that look binary.
+    """
+    results = []
+    for path in paths:
+        try:
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                text = f.read()
+        except OSError:
+            continue
+        if "\x00" in text[:1024]:
+            continue
+        line_number = counted = 0
+        for match in pattern.finditer(text):
+            start, end = match.span()
+            if start == end:
+                continue
+            line_number += text.count("\n", counted, start)
+            counted = start
+            line_start = text.rfind("\n", 0, start) + 1
+            line_end = text.find("\n", start)
+            if line_end == -1:
+                line_end = len(text)
+            results.append((path, line_number, start - line_start, min(end, line_end) - line_start,
+                            text[line_start:min(line_end, line_start + FindAllTask.LINE_TEXT_CHARS)]))
+            if len(results) >= max_matches:
+                return results
+    return results
+
+class FindInFilesSignals(QObject):
+    """Carries FindInFilesTask matches back to the GUI thread."""
+    matches_found = pyqtSignal(object)  # [(path, line number, start column, end column, line text), ...]
+    finished = pyqtSignal(int, int, bool)  # files searched, matches found, stopped at the result limit
+    failed = pyqtSignal(str)
+
+class FindInFilesTask(QRunnable):
+    """Searches the files under a folder on a QThreadPool thread, fanning batches of files out to a process pool.
+
+    The folder is walked while the first batches are already being searched. File names must match one of the
+    include globs and neither file nor folder names may match an exclude glob (hidden folders are skipped).
+    Results are sent back as each batch completes, until max_results matches have been found.
+    """
+    BATCH_FILES = 32
+    POOL_MIN_FILES = 64  # Smaller searches run in this thread rather than pay for starting worker processes
+
+    def __init__(self, folder, pattern, include_globs, exclude_globs, workers, max_results):
+        super().__init__()
+        self.folder = folder
+        self.pattern = pattern
+        self.include_globs = include_globs
+        self.exclude_globs = exclude_globs
+        self.workers = workers
+        self.max_results = max_results
+        self.cancelled = False
+        self.found = 0
+        self.signals = FindInFilesSignals()
+
+    def excluded(self, name, relative_path):
+        return any(fnmatch.fnmatch(name, exclude) or fnmatch.fnmatch(relative_path, exclude) for exclude in self.exclude_globs)
+
+    def file_batches(self):
+        batch = []
+        for folder, folder_names, file_names in os.walk(self.folder):
+            if self.cancelled:
+                return
+            relative_folder = os.path.relpath(folder, self.folder)
+            folder_names[:] = sorted(name for name in folder_names if not name.startswith(".")
+                                     and not self.excluded(name, os.path.normpath(os.path.join(relative_folder, name))))
+            for name in sorted(file_names):
+                if self.include_globs and not any(fnmatch.fnmatch(name, include) for include in self.include_globs):
+                    continue
+                if self.excluded(name, os.path.normpath(os.path.join(relative_folder, name))):
+                    continue
+                batch.append(os.path.join(folder, name))
+                if len(batch) >= self.BATCH_FILES:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+    def deliver(self, matches):
+        """Send a batch's matches on, up to the result limit; returns True once the limit is reached."""
+        matches = matches[:self.max_results - self.found]
+        if matches and not self.cancelled:
+            self.found += len(matches)
+            self.signals.matches_found.emit(matches)
+        return self.found >= self.max_results
+
+    def run(self):
+        try:
+            searched, capped = self.search()
+        except Exception as e:  # A worker process that died, or a file too big for memory
+            if not self.cancelled:
+                self.signals.failed.emit(f"{type(e).__name__}: {e}")
+            return
+        if not self.cancelled:
+            self.signals.finished.emit(searched, self.found, capped)
+
+    def search(self):
+        """Search every batch of files, returning (files searched, stopped at the result limit)."""
+        searched = 0
+        capped = False
+        batches = self.file_batches()
+        # Walk far enough to know whether worker processes are worth starting
+        first_batches = []
+        for batch in batches:
+            first_batches.append(batch)
+            if len(first_batches) * self.BATCH_FILES >= self.POOL_MIN_FILES:
+                break
+        batches = itertools.chain(first_batches, batches)
+        if self.workers <= 1 or len(first_batches) * self.BATCH_FILES < self.POOL_MIN_FILES:
+            for batch in batches:
+                if self.cancelled or capped:
+                    break
+                searched += len(batch)
+                capped = self.deliver(search_files(batch, self.pattern, self.max_results - self.found))
+        else:
+            # Spawned rather than forked: the GUI process has threads running
+            pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+            pending = {}  # future: number of files in its batch
+            try:
+                for batch in batches:
+                    if self.cancelled or capped:
+                        break
+                    pending[pool.submit(search_files, batch, self.pattern, self.max_results)] = len(batch)
+                    if len(pending) >= self.workers * 2:
+                        done, _ = wait_futures(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            searched += pending.pop(future)
+                            capped = capped or self.deliver(future.result())
+                while pending and not (self.cancelled or capped):
+                    done, _ = wait_futures(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        searched += pending.pop(future)
+                        capped = capped or self.deliver(future.result())
+            finally:
+                pool.shutdown(wait=False, cancel_futures=True)
+        return searched, capped
+
+def decode_text(data):
+    """Decode the bytes of a source file, returning (text, encoding).
+
+    A byte order mark decides it outright; otherwise the bytes are tried as strict UTF-8, then strict cp1252,
+    the encoding older GCBASIC sources on Windows were written in, and last latin-1, which takes any bytes.
+    None of the fallbacks replace a byte, so a file saved back in its encoding keeps the bytes it was read with.
+    """
+    if data.startswith(codecs.BOM_UTF8):
+        return data[len(codecs.BOM_UTF8):].decode("utf-8", errors="replace"), "utf-8-sig"
+    if data.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return data.decode("utf-16", errors="replace"), "utf-16"
+    try:
+        return data.decode("utf-8"), "utf-8"
+    except UnicodeDecodeError:
+        pass
+    try:
+        return data.decode("cp1252"), "cp1252"
+    except UnicodeDecodeError:
+        return data.decode("latin-1"), "latin-1"
+
+def read_text_file(path):
+    """Read a text file in one pass, returning (text, encoding, mtime, size) with line endings turned into newlines."""
+    with open(path, "rb") as f:
+        mtime = os.fstat(f.fileno()).st_mtime
+        data = f.read()
+    text, encoding = decode_text(data)
+    return text.replace("\r\n", "\n").replace("\r", "\n"), encoding, mtime, len(data)
+
+class FileLoadSignals(QObject):
+    """Carries FileLoadTask results back to the GUI thread."""
+    loaded = pyqtSignal(object, str, float)  # text, encoding, mtime
+    too_large = pyqtSignal()  # Past the large file threshold; open it in a LargeFileView instead
+    failed = pyqtSignal(str, bool)  # error message, the file does not exist
+
+class FileLoadTask(QRunnable):
+    """Reads and decodes a file for an editor tab on a QThreadPool thread, so a big file or a slow network
+    share never blocks the window. The file is checked against the large file threshold first, and the text
+    is taken from the file cache instead of read again when the file has not changed since it was cached.
+    """
+
+    def __init__(self, path, large_file_threshold, file_cache):
+        super().__init__()
+        self.path = path
+        self.large_file_threshold = large_file_threshold
+        self.file_cache = file_cache
+        self.cancelled = False
+        self.signals = FileLoadSignals()
+
+    def run(self):
+        try:
+            stat = os.stat(self.path)
+            if self.large_file_threshold > 0 and stat.st_size >= self.large_file_threshold:
+                result = None
+            else:
+                cached = self.file_cache.get(self.path, stat.st_mtime, stat.st_size)
+                if cached is not None:
+                    result = cached + (stat.st_mtime,)
+                else:
+                    text, encoding, mtime, size = read_text_file(self.path)
+                    self.file_cache.put(self.path, mtime, size, text, encoding)
+                    result = (text, encoding, mtime)
+        except OSError as e:
+            if not self.cancelled:
+                self.signals.failed.emit(str(e), isinstance(e, FileNotFoundError))
+            return
+        if self.cancelled:
+            return
+        if result is None:
+            self.signals.too_large.emit()
+        else:
+            self.signals.loaded.emit(*result)
+
+def write_file_atomically(path, data, mode=None):
+    """Write bytes to a temporary file next to path and rename it over path, so a crash never leaves half a file.
+
+    The new file gets mode, or the permissions of the file it replaces.
+    """
+    folder = os.path.dirname(path) or "."
+    os.makedirs(folder, exist_ok=True)
+    if mode is None:
+        try:
+            mode = os.stat(path).st_mode & 0o777
+        except OSError:
+            mode = 0o644
+    handle, temp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=folder)
+    try:
+        with os.fdopen(handle, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(temp_path, mode)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+class DeferredFileSignals(QObject):
+    """Carries DeferredFileWriteTask errors back to the GUI thread."""
+    failed = pyqtSignal(str, str)  # path, error message
+
+class DeferredFileWriteTask(QRunnable):
+    def __init__(self, path, data, mode, signals):
+        super().__init__()
+        self.path = path
+        self.data = data
+        self.mode = mode
+        self.signals = signals
+
+    def run(self):
+        try:
+            write_file_atomically(self.path, self.data, self.mode)
+        except OSError as e:
+            self.signals.failed.emit(self.path, str(e))
+
+class DeferredFile:
+    """A file the IDE rewrites often, such as the settings or the recent files list, saved in the background.
+
+    mark_dirty() asks for a save; the file is written delay ms after the first request, however many more
+    arrive meanwhile, and by flush() on exit. serialize is called on the GUI thread at write time and returns
+    the bytes, so they always reflect the latest state; nothing is written if they match what was last
+    written (or what the file held at startup). Writes run on a single thread of their own, so they reach
+    the disk in order, and replace the file atomically.
+    """
+
+    def __init__(self, path, serialize, delay, mode=None):
+        self.path = path
+        self.serialize = serialize
+        self.mode = mode
+        self.dirty = False
+        self.writes = 0
+        self.skipped = 0
+        self.timer = QTimer()
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(delay)
+        self.timer.timeout.connect(self.flush)
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(1)
+        self.signals = DeferredFileSignals()
+        self.signals.failed.connect(self.on_write_failed)
+        try:
+            with open(path, "rb") as f:
+                self.written = f.read()
+        except OSError:
+            self.written = None
+
+    def mark_dirty(self):
+        self.dirty = True
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def flush(self):
+        """Queue a write now if anything changed since the last one; returns whether one was queued."""
+        self.timer.stop()
+        if not self.dirty:
+            return False
+        self.dirty = False
+        data = self.serialize()
+        if data == self.written:
+            self.skipped += 1
+            return False
+        self.written = data
+        self.writes += 1
+        self.pool.start(DeferredFileWriteTask(self.path, data, self.mode, self.signals))
+        return True
+
+    def on_write_failed(self, path, message):
+        self.written = None  # Unknown contents on disk; the next flush writes whatever it has
+
+    def wait(self):
+        self.pool.waitForDone()
+
+class FileWatcher(QObject):
+    """Reports the open files that changed on disk, a batch at a time.
+
+    QFileSystemWatcher gets change notifications from the OS (inotify on Linux) instead of polling, but a
+    tool rewriting several files, or one file in several writes, sends a burst of them. Changed paths are
+    collected and files_changed is emitted once no new change has arrived for delay ms. Tools that save by
+    renaming a new file over the old one make the watcher drop the path, so it is added again when the batch
+    is delivered if the file is back. Between hold() and release() changes are collected but not delivered.
+    """
+    files_changed = pyqtSignal(list)
+
+    def __init__(self, delay, parent=None):
+        super().__init__(parent)
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.fileChanged.connect(self.on_file_changed)
+        self.watched = set()
+        self.pending = set()
+        self.held = False
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(delay)
+        self.timer.timeout.connect(self.flush)
+
+    def watch(self, path):
+        self.watched.add(path)
+        if path not in self.watcher.files():
+            self.watcher.addPath(path)
+
+    def unwatch(self, path):
+        self.watched.discard(path)
+        self.pending.discard(path)
+        if path in self.watcher.files():
+            self.watcher.removePath(path)
+
+    def on_file_changed(self, path):
+        if path in self.watched:
+            self.pending.add(path)
+            self.timer.start()  # Restarted by every change, so a burst is delivered once
+
+    def hold(self):
+        self.held = True
+
+    def release(self):
+        """Deliver the changes collected while held, after the usual delay."""
+        self.held = False
+        if self.pending:
+            self.timer.start()
+
+    def flush(self):
+        if self.held:
+            return  # Kept in pending until release()
+        paths = sorted(self.pending)
+        self.pending.clear()
+        watched_files = set(self.watcher.files())
+        for path in paths:
+            if path not in watched_files and os.path.exists(path):
+                self.watcher.addPath(path)
+        if paths:
+            self.files_changed.emit(paths)
+
+class CustomTextEdit(QPlainTextEdit):
+    MAX_FIND_SELECTIONS = 2000
 
-class CustomTextEdit(QTextEdit):
     def __init__(self, ide):
         super().__init__()
         self.ide = ide
@@ -593,24 +2552,67 @@ class CustomTextEdit(QTextEdit):
         if show_hl_info:
             self.ide.terminal.log(f"HL: CustomTextEdit initialized - undoRedoEnabled: {self.isUndoRedoEnabled()}, document undoRedoEnabled: {self.document().isUndoRedoEnabled()}", "INFO")
         self.line_number_area = LineNumberArea(self)
+        self.journal = None
         self.highlighter = SyntaxHighlighter(self, ide)
-        self.document().blockCountChanged.connect(self.update_line_number_area_width)
-        self.cursorPositionChanged.connect(self.update_line_number_area)
+        self.outline = DocumentOutline(self)
+        self.outline.set_document(self.document())
+        self.blockCountChanged.connect(self.update_line_number_area_width)
+        self.updateRequest.connect(self.on_update_request)
         self.textChanged.connect(self.on_text_changed)
         self.update_line_number_area_width()
         self.setContextMenuPolicy(Qt.CustomContextMenu)
         self.customContextMenuRequested.connect(self.show_context_menu)
         self._is_highlighting = False
-        self.verticalScrollBar().valueChanged.connect(self.on_scroll)
+        self.find_starts = array('Q')  # Find-all matches, in order; only the ones in view get extra selections
+        self.find_ends = array('Q')
+        self.encoding = None  # Encoding the file was read in and is saved in; None for the platform default
+        self.load_task = None  # The FileLoadTask filling this editor, until its last chunk is in
+        self.load_callbacks = []  # Called with the editor once it has finished loading
+
+    def setDocument(self, document):
+        # Documents must carry a QPlainTextDocumentLayout; create them with plain_text_document()
+        super().setDocument(document)
+        self.highlighter.set_document(document)
+        self.outline.set_document(document)
+        self.reset_journal()
+
+    def begin_loading(self):
+        """Stop the outline following the document while a file is put into it a chunk at a time.
+
+        The highlighter keeps following it, so the block comment states are worked out a chunk at a time too
+        instead of in one pass over the whole file at the end.
+        """
+        self.document().contentsChange.disconnect(self.outline.on_contents_change)
+
+    def finish_loading(self):
+        """Give the filled document to the outline and start the edit journal from it."""
+        self.outline.set_document(self.document())
+        self.reset_journal()
+
+    def reset_journal(self):
+        """Start the edit journal over from the current text."""
+        if self.journal is not None:
+            self.journal.detach()
+        self.journal = EditJournal(self.document(), self.ide.settings.get("edit_journal_revisions", 100),
+                                   self.ide.settings.get("edit_journal_bytes", 4 * 1024 * 1024))
+
+    def visible_block_range(self):
+        """Return the first and last block numbers at least partly inside the viewport."""
+        block = self.firstVisibleBlock()
+        first = last = block.blockNumber()
+        offset = self.contentOffset()
+        height = self.viewport().height()
+        while block.isValid() and self.blockBoundingGeometry(block).translated(offset).top() <= height:
+            last = block.blockNumber()
+            block = block.next()
+        return first, last
 
     def line_number_area_width(self):
         if not self.ide.settings["line_numbers"]:
             return 0
-        doc = self.document()
-        line_count = doc.blockCount()
+        line_count = self.blockCount()
         digits = len(str(max(1, line_count)))
-        font = QFont("Consolas", self.ide.settings["editor_font_size"])
-        fm = QFontMetrics(font)
+        fm = self.line_number_area.ensure_style()
         base_width = 40
         extra_digits = max(0, digits - 3)
         width = base_width + (extra_digits * 8)
@@ -618,11 +2620,13 @@ class CustomTextEdit(QTextEdit):
         return max(width, max_number_width + 10)
 
     def update_line_number_area_width(self):
+        # Called for every new line; the gutter only needs resizing when the number of digits changes
         width = self.line_number_area_width()
-        self.setViewportMargins(width, 0, 0, 0)
-        self.line_number_area.setFixedWidth(width)
         self.line_number_area.setVisible(self.ide.settings["line_numbers"])
-        self.update_line_number_area()
+        if width != self.viewportMargins().left() or width != self.line_number_area.width():
+            self.setViewportMargins(width, 0, 0, 0)
+            self.line_number_area.setFixedWidth(width)
+            self.update_line_number_area()
 
     def update_line_number_area(self):
         self.line_number_area.update()
@@ -631,10 +2635,95 @@ class CustomTextEdit(QTextEdit):
         super().resizeEvent(event)
         cr = self.contentsRect()
         self.line_number_area.setGeometry(cr.left(), cr.top(), self.line_number_area_width(), cr.height())
+        self.update_find_selections()
+
+    def add_find_matches(self, matches):
+        for start, end, line_number, line_text in matches:
+            self.find_starts.append(start)
+            self.find_ends.append(end)
+        self.update_find_selections()
+
+    def clear_find_matches(self):
+        if self.find_starts:
+            self.find_starts = array('Q')
+            self.find_ends = array('Q')
+            self.setExtraSelections([])
+
+    def update_find_selections(self):
+        """Give the find-all matches in view an extra selection each, so the cost follows the viewport, not the match count."""
+        if not self.find_starts:
+            return
+        document = self.document()
+        first, last = self.visible_block_range()
+        last_block = document.findBlockByNumber(last)
+        low = bisect.bisect_right(self.find_ends, document.findBlockByNumber(first).position())
+        high = bisect.bisect_left(self.find_starts, last_block.position() + last_block.length(), low)
+        match_format = QTextCharFormat()
+        match_format.setBackground(QColor("#665C00" if self.ide.settings["theme"] == "dark" else "#FFE680"))
+        end_limit = document.characterCount() - 1
+        selections = []
+        for index in range(low, min(high, low + self.MAX_FIND_SELECTIONS)):
+            selection = QTextEdit.ExtraSelection()
+            selection.cursor = QTextCursor(document)
+            selection.cursor.setPosition(min(self.find_starts[index], end_limit))
+            selection.cursor.setPosition(min(self.find_ends[index], end_limit), QTextCursor.KeepAnchor)
+            selection.format = match_format
+            selections.append(selection)
+        self.setExtraSelections(selections)
 
-    def on_scroll(self, value):
-        if not self._is_highlighting:
-            self.highlighter.schedule_highlighting()
+    def keyPressEvent(self, event):
+        started = time.perf_counter()
+        revision = self.highlighter.document_revision
+        super().keyPressEvent(event)
+        if self.highlighter.document_revision != revision:
+            # Typing is highlighted before control returns to the event loop, so the edited line is never
+            # painted with the formats it had before the keystroke
+            self.highlighter.flush_edits()
+            self.ide.keystroke_latencies.append(time.perf_counter() - started)
+
+    def word_at(self, cursor):
+        """Return the name under a cursor and its start and end positions in the document, or None."""
+        block = cursor.block()
+        column = cursor.positionInBlock()
+        for match in re.finditer(r"[A-Za-z_][\w.]*", block.text()):
+            if match.start() <= column <= match.end():
+                return match.group(), block.position() + match.start(), block.position() + match.end()
+            if match.start() > column:
+                break
+        return None
+
+    def viewportEvent(self, event):
+        if event.type() == QEvent.ToolTip:
+            cursor = self.cursorForPosition(event.pos())
+            word = self.word_at(cursor)
+            text = None
+            if word is not None:
+                # cursorForPosition snaps to the nearest character, so check the pointer is over the word itself
+                start, end = QTextCursor(cursor), QTextCursor(cursor)
+                start.setPosition(word[1])
+                end.setPosition(word[2])
+                if self.cursorRect(start).left() <= event.pos().x() <= self.cursorRect(end).right():
+                    text = self.ide.library_tooltip(word[0])
+            if text:
+                QToolTip.showText(event.globalPos(), text, self.viewport())
+            else:
+                QToolTip.hideText()
+                event.ignore()
+            return True
+        return super().viewportEvent(event)
+
+    def on_update_request(self, rect, dy):
+        # QPlainTextEdit reports every scroll here, including the ones from setTextCursor and
+        # ensureCursorVisible, which move the scroll bar with its signals blocked. The gutter follows
+        # by scrolling its pixels or repainting just the rows the editor repaints, so moving the cursor
+        # within a line only touches the row it is on.
+        if dy:
+            self.line_number_area.scroll(0, dy)
+            if not self._is_highlighting:
+                self.highlighter.schedule_highlighting()
+            self.update_find_selections()
+        else:
+            self.line_number_area.update(0, rect.y(), self.line_number_area.width(), rect.height())
 
     def on_text_changed(self):
         if not self._is_highlighting:
@@ -643,9 +2732,8 @@ class CustomTextEdit(QTextEdit):
                 if self.ide.settings.get('show_hl_info', False):
                     #self.ide.terminal.log(f"HL: Text changed - isUndoAvailable: {self.document().isUndoAvailable()}, isModified: {self.document().isModified()}, file_path: {getattr(self, 'file_path', 'None')}", "INFO")
                     self.ide.terminal.log(f"HL: Text changed - isUndoAvailable: {self.document().isUndoAvailable()}, isModified: {self.document().isModified()}, file_path: {os.path.basename(getattr(self, 'file_path', 'None'))}", "INFO")
-                if hasattr(self, "file_path") and self.file_path.lower().endswith(".gcb"):
-                    self.highlighter._apply_highlighting()
-                else:
+                # .gcb edits are already highlighted from the contentsChange delta
+                if not (hasattr(self, "file_path") and self.file_path.lower().endswith(".gcb")):
                     self.highlighter.schedule_highlighting()
             except Exception as e:
                 if self.ide.settings.get('show_hl_info', False):
@@ -681,6 +2769,342 @@ class CustomTextEdit(QTextEdit):
         select_all_action = menu.addAction("Select All")
         select_all_action.setShortcut("Ctrl+A")
         select_all_action.triggered.connect(self.selectAll)
+        menu.addSeparator()
+        definition_action = menu.addAction("Go to Definition")
+        definition_action.setShortcut("F12")
+        clicked = self.cursorForPosition(position)
+        definition_action.triggered.connect(lambda: self.ide.goto_definition(self, clicked))
+        definition_action.setEnabled(self.word_at(clicked) is not None)
+        if self.ide.settings["theme"] == "dark":
+            bg_color = "#2E2E2E"
+            fg_color = "#FFFFFF"
+            hover_color = "#555555"
+            border_color = "#444444"
+        else:
+            bg_color = "#F5F5F5"
+            fg_color = "#000000"
+            hover_color = "#D3D3D3"
+            border_color = "#CCCCCC"
+        menu.setStyleSheet(
+            f"QMenu {{ background-color: {bg_color}; color: {fg_color}; border: 1px solid {border_color}; }}"
+            f"QMenu::item {{ padding: 2px 16px; }}"
+            f"QMenu::item:selected {{ background-color: {hover_color}; }}"
+        )
+        menu.exec_(self.mapToGlobal(position))
+
+class LargeFileView(QAbstractScrollArea):
+    """Read-only view of a memory-mapped file, used for files past the large file threshold.
+
+    Only the lines on screen are decoded and highlighted, so opening costs the time to map the file and
+    memory stays close to the size of the line index. The index is built by a LineIndexTask; lines become
+    visible as it reaches them. The context menu offers to load the file into a normal editor tab.
+    """
+    LOOKBACK_LINES = 200  # How far back the block comment state of the first line on screen is looked for
+    MAX_LINE_BYTES = 64 * 1024  # Longer lines are shown cut short
+    MAX_COPY_BYTES = 16 * 1024 * 1024
+
+    def __init__(self, ide, file_path):
+        super().__init__()
+        self.ide = ide
+        self.file_path = os.path.abspath(file_path)
+        self.file = None
+        self.data = None
+        self.file_size = 0
+        self.offsets = array('Q', [0])
+        self.index_task = None
+        self.indexing = False
+        self.index_started = 0.0
+        self.ruleset = None
+        self.rule_styles = []
+        self.state_anchor = (0, False)  # (line, block comment state at its start) from the last paint
+        self.current_line = 0
+        self.anchor_line = 0  # Other end of the selected lines
+        self.widest_line = 0
+        self.setFocusPolicy(Qt.StrongFocus)
+        self.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.customContextMenuRequested.connect(self.show_context_menu)
+        self.apply_text_settings()
+        language_file = self.ide.settings.get("language_file")
+        if language_file and os.path.exists(language_file):
+            self.set_ruleset(LanguageRuleset.get(language_file, self.ide.terminal.log))
+
+    def open_file(self):
+        """Map the file and start indexing its lines; returns False if it cannot be mapped."""
+        try:
+            self.file = open(self.file_path, "rb")
+            self.file_size = os.fstat(self.file.fileno()).st_size
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:
+            self.ide.terminal.log(f"Error mapping {self.file_path}: {str(e)}", "ERROR")
+            self.close_file()
+            return False
+        self.offsets = array('Q', [0])
+        self.state_anchor = (0, False)
+        self.widest_line = 0
+        task = LineIndexTask(self.data, self.offsets)
+        task.signals.progress.connect(lambda count, task=task: self.on_index_progress(task))
+        task.signals.finished.connect(lambda count, task=task: self.on_index_finished(task))
+        self.index_task = task
+        self.indexing = True
+        self.index_started = time.perf_counter()
+        QThreadPool.globalInstance().start(task)
+        self.update_scroll_ranges()
+        self.viewport().update()
+        return True
+
+    def close_file(self):
+        if self.index_task is not None:
+            self.index_task.cancelled = True
+            self.index_task = None
+        self.indexing = False
+        if self.data is not None:
+            self.data.close()
+            self.data = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        self.offsets = array('Q', [0])
+        self.file_size = 0
+
+    def reload_file(self):
+        """Map the file again after it changed on disk, keeping the current line where possible."""
+        line = self.current_line
+        self.close_file()
+        if self.open_file():
+            self.current_line = self.anchor_line = line
+            self.update_tab_badge()
+
+    def on_index_progress(self, task):
+        if task is not self.index_task:
+            return
+        self.update_scroll_ranges()
+        self.update_tab_badge()
+        self.viewport().update()
+
+    def on_index_finished(self, task):
+        if task is not self.index_task:
+            return
+        self.index_task = None
+        self.indexing = False
+        elapsed_ms = (time.perf_counter() - self.index_started) * 1000
+        self.ide.terminal.log(f"Indexed {self.line_count():,} lines of {os.path.basename(self.file_path)} in {elapsed_ms:.0f} ms", "INFO")
+        self.update_scroll_ranges()
+        self.update_tab_badge()
+        self.viewport().update()
+
+    def update_tab_badge(self):
+        index = self.ide.tabs.indexOf(self)
+        if index == -1:
+            return
+        self.ide.tabs.setTabText(index, f"{os.path.basename(self.file_path)} [large]")
+        status = f"indexing, {self.line_count():,} lines so far" if self.indexing else f"{self.line_count():,} lines"
+        self.ide.tabs.setTabToolTip(index, f"{self.file_path}\nLarge file, read-only: {self.file_size / 1048576:.1f} MB, {status}")
+
+    def line_count(self):
+        # While indexing, the last offset found may start a line whose end has not been reached yet
+        count = len(self.offsets)
+        return count - 1 if self.indexing else count
+
+    def line_text(self, line_number):
+        start = self.offsets[line_number]
+        end = self.offsets[line_number + 1] if line_number + 1 < len(self.offsets) else self.file_size
+        raw = self.data[start:min(end, start + self.MAX_LINE_BYTES)]
+        return raw.decode("utf-8", errors="replace").rstrip("\r\n").expandtabs(self.tab_size)
+
+    def selected_lines(self):
+        return min(self.anchor_line, self.current_line), max(self.anchor_line, self.current_line)
+
+    def set_ruleset(self, ruleset):
+        self.ruleset = ruleset if self.file_path.lower().endswith(".gcb") else None
+        self.build_rule_styles()
+        self.state_anchor = (0, False)
+        self.viewport().update()
+
+    def build_rule_styles(self):
+        """Turn the ruleset's character formats into the pen colour and font each rule is drawn with."""
+        self.rule_styles = []
+        if self.ruleset is None:
+            return
+        for pattern, format in self.ruleset.highlighting_rules:
+            font = QFont(self.text_font)
+            font.setBold(format.fontWeight() >= QFont.Bold)
+            font.setItalic(format.fontItalic())
+            self.rule_styles.append((format.foreground().color(), font))
+
+    def apply_text_settings(self, editor_font=None):
+        settings = self.ide.settings
+        self.text_font = QFont(editor_font) if editor_font is not None else QFont(settings.get("editor_font", "Consolas"), settings["editor_font_size"])
+        metrics = QFontMetrics(self.text_font)
+        self.line_height = metrics.height()
+        self.ascent = metrics.ascent()
+        self.char_width = max(1, metrics.width(" "))
+        self.tab_size = max(1, round(80 / self.char_width))  # QPlainTextEdit's default 80 px tab stops
+        light = settings["theme"] == "light"
+        self.text_color = QColor("#000000" if light else "#FFFFFF")
+        self.gutter_color = QColor(Qt.lightGray if light else Qt.darkGray)
+        self.number_color = QColor(Qt.black if light else Qt.white)
+        self.selection_color = QColor(0, 120, 215, 60)
+        self.setStyleSheet(f"background: transparent; color: {self.text_color.name()};")
+        self.build_rule_styles()
+        self.update_scroll_ranges()
+        self.viewport().update()
+
+    def gutter_width(self):
+        if not self.ide.settings["line_numbers"]:
+            return 0
+        return len(str(max(1, self.line_count()))) * self.char_width + 15
+
+    def update_scroll_ranges(self):
+        rows = max(1, self.viewport().height() // self.line_height)
+        vertical = self.verticalScrollBar()
+        vertical.setRange(0, max(0, self.line_count() - rows))
+        vertical.setPageStep(rows)
+        columns = max(1, (self.viewport().width() - self.gutter_width()) // self.char_width)
+        horizontal = self.horizontalScrollBar()
+        horizontal.setRange(0, max(0, self.widest_line - columns + 1))
+        horizontal.setPageStep(columns)
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.update_scroll_ranges()
+
+    def entry_state(self, line_number):
+        """Block comment state at the start of a line, carried on from the last paint or looked for LOOKBACK_LINES back."""
+        anchor_line, in_block_comment = self.state_anchor
+        if not anchor_line <= line_number <= anchor_line + self.LOOKBACK_LINES:
+            anchor_line, in_block_comment = max(0, line_number - self.LOOKBACK_LINES), False
+        tokenizer = self.ruleset.tokenizer
+        for number in range(anchor_line, line_number):
+            in_block_comment = tokenizer.line_state(self.line_text(number), in_block_comment)
+        self.state_anchor = (line_number, in_block_comment)
+        return in_block_comment
+
+    def paintEvent(self, event):
+        if self.data is None:
+            return
+        painter = QPainter(self.viewport())
+        width = self.viewport().width()
+        height = self.viewport().height()
+        line_height = self.line_height
+        gutter = self.gutter_width()
+        first = self.verticalScrollBar().value()
+        last = min(self.line_count(), first + height // line_height + 1)
+        first_column = self.horizontalScrollBar().value()
+        last_column = first_column + (width - gutter) // self.char_width + 1
+        left = gutter + 4 - first_column * self.char_width
+        selection_first, selection_last = self.selected_lines()
+        highlight = bool(self.rule_styles)
+        in_block_comment = self.entry_state(first) if highlight and first < last else False
+        widest_line = self.widest_line
+        painter.setClipRect(gutter, 0, width - gutter, height)
+        for row, line_number in enumerate(range(first, last)):
+            y = row * line_height
+            if selection_first <= line_number <= selection_last:
+                painter.fillRect(gutter, y, width - gutter, line_height, self.selection_color)
+            text = self.line_text(line_number)
+            widest_line = max(widest_line, len(text))
+            baseline = y + self.ascent
+            spans = []
+            if highlight:
+                tokens, in_block_comment = self.ruleset.tokenizer.tokenize_line(text, in_block_comment)
+                position = 0
+                for start, end, rule in tokens:
+                    if start > position:
+                        spans.append((position, start, None))
+                    spans.append((start, end, self.rule_styles[rule]))
+                    position = end
+                if position < len(text):
+                    spans.append((position, len(text), None))
+            else:
+                spans.append((0, len(text), None))
+            # Only the columns on screen are drawn; the rest of a long line is skipped
+            for start, end, style in spans:
+                start = max(start, first_column)
+                end = min(end, last_column)
+                if start >= end:
+                    continue
+                color, font = style if style is not None else (self.text_color, self.text_font)
+                painter.setPen(color)
+                painter.setFont(font)
+                painter.drawText(left + start * self.char_width, baseline, text[start:end])
+        if gutter:
+            painter.setClipping(False)
+            painter.fillRect(0, 0, gutter, height, self.gutter_color)
+            painter.setPen(self.number_color)
+            painter.setFont(self.text_font)
+            for row, line_number in enumerate(range(first, last)):
+                painter.drawText(QRect(0, row * line_height, gutter - 5, line_height), Qt.AlignRight | Qt.AlignVCenter, str(line_number + 1))
+        painter.end()
+        if widest_line > self.widest_line:
+            self.widest_line = widest_line
+            self.update_scroll_ranges()
+
+    def set_current_line(self, line_number, extend_selection=False):
+        line_number = max(0, min(line_number, self.line_count() - 1))
+        self.current_line = line_number
+        if not extend_selection:
+            self.anchor_line = line_number
+        vertical = self.verticalScrollBar()
+        if line_number < vertical.value():
+            vertical.setValue(line_number)
+        elif line_number >= vertical.value() + vertical.pageStep():
+            vertical.setValue(line_number - vertical.pageStep() + 1)
+        self.viewport().update()
+
+    def goto_line(self, line_number):
+        """Select a line and scroll it to the middle of the view."""
+        self.set_current_line(line_number)
+        self.verticalScrollBar().setValue(self.current_line - self.verticalScrollBar().pageStep() // 2)
+
+    def keyPressEvent(self, event):
+        key = event.key()
+        rows = self.verticalScrollBar().pageStep()
+        extend_selection = bool(event.modifiers() & Qt.ShiftModifier)
+        moves = {Qt.Key_Up: -1, Qt.Key_Down: 1, Qt.Key_PageUp: -rows, Qt.Key_PageDown: rows}
+        if key in moves:
+            self.set_current_line(self.current_line + moves[key], extend_selection)
+        elif key == Qt.Key_Home and event.modifiers() & Qt.ControlModifier:
+            self.set_current_line(0, extend_selection)
+        elif key == Qt.Key_End and event.modifiers() & Qt.ControlModifier:
+            self.set_current_line(self.line_count() - 1, extend_selection)
+        elif key == Qt.Key_Home:
+            self.horizontalScrollBar().setValue(0)
+        elif key in (Qt.Key_Left, Qt.Key_Right):
+            horizontal = self.horizontalScrollBar()
+            horizontal.setValue(horizontal.value() + (1 if key == Qt.Key_Right else -1))
+        else:
+            super().keyPressEvent(event)
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.LeftButton:
+            line_number = self.verticalScrollBar().value() + event.pos().y() // self.line_height
+            self.set_current_line(line_number, bool(event.modifiers() & Qt.ShiftModifier))
+        super().mousePressEvent(event)
+
+    def copy(self):
+        """Copy the selected lines to the clipboard."""
+        if self.data is None or self.line_count() == 0:
+            return
+        first, last = self.selected_lines()
+        start = self.offsets[first]
+        end = self.offsets[last + 1] if last + 1 < len(self.offsets) else self.file_size
+        if end - start > self.MAX_COPY_BYTES:
+            self.ide.terminal.log(f"Selection is too large to copy ({(end - start) / 1048576:.1f} MB)", "ERROR")
+            return
+        QApplication.clipboard().setText(self.data[start:end].decode("utf-8", errors="replace"))
+
+    def show_context_menu(self, position):
+        menu = QMenu(self)
+        menu.setFont(QFont("Arial", self.ide.settings["ui_font_size"]))
+        copy_action = menu.addAction("Copy")
+        copy_action.setShortcut("Ctrl+C")
+        copy_action.triggered.connect(self.copy)
+        goto_action = menu.addAction("Go to Line")
+        goto_action.setShortcut("Ctrl+G")
+        goto_action.triggered.connect(self.ide.goto_line)
+        menu.addSeparator()
+        edit_action = menu.addAction("Edit in Full Editor")
+        edit_action.triggered.connect(lambda: self.ide.switch_large_file_to_editor(self))
         if self.ide.settings["theme"] == "dark":
             bg_color = "#2E2E2E"
             fg_color = "#FFFFFF"
@@ -791,6 +3215,104 @@ class LicenseDialog(QDialog):
         else:
             self.parent().terminal.log(f"Invalid URL clicked: {url.toString()}", "ERROR")
 
+class FindDialog(QDialog):
+    """Asks for a search term and how to match it: as whole words, with matching case, or as a regular expression."""
+
+    def __init__(self, parent, title, search="", options=None):
+        super().__init__(parent)
+        self.setWindowTitle(title)
+        self.setMinimumWidth(400)
+        options = options or {}
+        self.pattern = None
+        layout = QVBoxLayout()
+        layout.addWidget(QLabel("Search for:"))
+        self.search_edit = QLineEdit(search)
+        self.search_edit.selectAll()
+        layout.addWidget(self.search_edit)
+        self.word_box = QCheckBox("Whole &word")
+        self.word_box.setChecked(options.get("whole_word", False))
+        self.case_box = QCheckBox("Match &case")
+        self.case_box.setChecked(options.get("match_case", False))
+        self.regex_box = QCheckBox("Regular e&xpression")
+        self.regex_box.setChecked(options.get("regular_expression", False))
+        self.options_layout = QHBoxLayout()
+        for box in (self.word_box, self.case_box, self.regex_box):
+            self.options_layout.addWidget(box)
+        layout.addLayout(self.options_layout)
+        self.error_label = QLabel()
+        self.error_label.setStyleSheet("color: red;")
+        self.error_label.hide()
+        layout.addWidget(self.error_label)
+        button_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        button_box.accepted.connect(self.check_and_accept)
+        button_box.rejected.connect(self.reject)
+        layout.addWidget(button_box)
+        self.setLayout(layout)
+        self.setFont(QFont("Arial", parent.settings["ui_font_size"]))
+
+    def options(self):
+        return {"whole_word": self.word_box.isChecked(), "match_case": self.case_box.isChecked(),
+                "regular_expression": self.regex_box.isChecked()}
+
+    def check_and_accept(self):
+        if not self.search_edit.text():
+            return
+        try:
+            self.pattern = search_pattern(self.search_edit.text(), **self.options())
+        except re.error as e:
+            self.error_label.setText(f"Invalid regular expression: {e}")
+            self.error_label.show()
+            return
+        self.accept()
+
+class ReplaceDialog(FindDialog):
+    """FindDialog with a replacement, which may use \\1 or \\g<name> groups with a regular expression, and a selection-only scope."""
+
+    def __init__(self, parent, search="", replace="", options=None, has_selection=False, selection_only=False):
+        super().__init__(parent, "Search and Replace", search, options)
+        self.replace_edit = QLineEdit(replace)
+        self.layout().insertWidget(2, QLabel("Replace with:"))
+        self.layout().insertWidget(3, self.replace_edit)
+        self.selection_box = QCheckBox("In &selection only")
+        self.selection_box.setChecked(has_selection and selection_only)
+        self.selection_box.setEnabled(has_selection)
+        self.options_layout.addWidget(self.selection_box)
+
+class FindInFilesDialog(FindDialog):
+    """FindDialog with the folder to search, subfolders included, and globs for the files to include and exclude."""
+
+    def __init__(self, parent, search="", options=None, folders=(), include="", exclude=""):
+        super().__init__(parent, "Find in Files", search, options)
+        self.folder_box = QComboBox()
+        self.folder_box.setEditable(True)
+        self.folder_box.addItems(folders)
+        browse_button = QPushButton("&Browse...")
+        browse_button.clicked.connect(self.browse)
+        folder_layout = QHBoxLayout()
+        folder_layout.addWidget(self.folder_box, 1)
+        folder_layout.addWidget(browse_button)
+        self.include_edit = QLineEdit(include)
+        self.exclude_edit = QLineEdit(exclude)
+        layout = self.layout()
+        layout.insertWidget(2, QLabel("In folder:"))
+        layout.insertLayout(3, folder_layout)
+        layout.insertWidget(4, QLabel("Files to include (for example *.gcb;*.h):"))
+        layout.insertWidget(5, self.include_edit)
+        layout.insertWidget(6, QLabel("Files and folders to exclude:"))
+        layout.insertWidget(7, self.exclude_edit)
+
+    def browse(self):
+        folder = QFileDialog.getExistingDirectory(self, "Find in Files", self.folder_box.currentText())
+        if folder:
+            self.folder_box.setEditText(folder)
+
+    def check_and_accept(self):
+        if not os.path.isdir(self.folder_box.currentText()):
+            self.error_label.setText("Choose a folder to search")
+            self.error_label.show()
+            return
+        super().check_and_accept()
+
 class FloatingButtonBar(QWidget):
     def __init__(self, parent):
         super().__init__(parent)
@@ -1047,6 +3569,9 @@ class CustomTasksMenu(QMenu):
 
 
 class IDE(QMainWindow):
+    REPLACE_MERGE_GAP = 256  # Replace-all matches closer than this many characters are edited as one range
+    LOAD_CHUNK_CHARS = 64 * 1024  # A file being opened goes into its editor this many characters per event loop turn
+
     def __init__(self, filename=None):
         super().__init__()
         self.setWindowTitle(f"GCBASIC Essential IDE : Build {BUILD_NUMBER}")
@@ -1081,6 +3606,27 @@ class IDE(QMainWindow):
             "show_terminal_info": False,
             "show_rules_info": False,
             "highlight_timer_interval": 100,
+            "highlight_cache_entries": 20000,
+            "highlight_cache_bytes": 8388608,
+            "highlight_idle_delay": 500,
+            "highlight_idle_slice": 4,
+            "highlight_prefetch_pages": 2,
+            "large_file_threshold_mb": 10,
+            "file_cache_mb": 32,
+            "file_cache_compress": True,
+            "external_change_delay": 300,
+            "settings_save_delay": 2000,
+            "edit_journal_revisions": 100,
+            "edit_journal_bytes": 4194304,
+            "show_outline": True,
+            "outline_refresh_delay": 300,
+            "index_library": True,
+            "library_index_workers": 0,
+            "find_all_max_results": 10000,
+            "find_all_refresh_delay": 300,
+            "find_in_files_include": "*.gcb;*.h",
+            "find_in_files_exclude": "",
+            "find_in_files_workers": 0,
             "button_bar": {
                 "button1": "[F5]:hexflash.png",
                 "button2": "[F6]:hex.png",
@@ -1092,16 +3638,18 @@ class IDE(QMainWindow):
         }
         self.first_time_settings = False
         self.recent_files = []
-        self.file_cache = {}
-        self.history = {}
         self.file_states = {}
+        self.settings_file = DeferredFile(self.get_settings_path(), self.settings_data, self.settings["settings_save_delay"], 0o600)
+        self.recent_files_file = DeferredFile(self.recent_files_path, self.recent_files_data, self.settings["settings_save_delay"])
         self.file_menu = None
         self.last_search = None
+        self.last_replace = None
         self.info_action = None
         self.error_action = None
         self.show_terminal_action = None
         self.line_numbers_action = None
         self.task_output_cache = []
+        self.keystroke_latencies = deque(maxlen=1000)  # Seconds from key event to highlighted, for edits typed in an editor
         self.task_number_mapping = {}  # Map single char (1-9, A-Z) to task
         self.task_selection_mode = False  # Flag for F4 task selection
         self.terminal = TerminalWindow()
@@ -1111,6 +3659,45 @@ class IDE(QMainWindow):
         self.addDockWidget(Qt.BottomDockWidgetArea, self.dock)
         if self.settings.get('show_terminal_info', False):
             self.terminal.log(f"Initialized Terminal dock with objectName: {self.dock.objectName()}", "INFO")
+        self.outline_tree = QTreeWidget()
+        self.outline_tree.setHeaderHidden(True)
+        self.outline_tree.itemActivated.connect(self.goto_outline_item)
+        self.outline_tree.itemClicked.connect(self.goto_outline_item)
+        self.outline_dock = QDockWidget("Outline", self)
+        self.outline_dock.setObjectName("OutlineDock")
+        self.outline_dock.setWidget(self.outline_tree)
+        self.addDockWidget(Qt.LeftDockWidgetArea, self.outline_dock)
+        self.outline_dock.visibilityChanged.connect(lambda visible: visible and self.refresh_outline())
+        self.outline_timer = QTimer(self)
+        self.outline_timer.setSingleShot(True)
+        self.outline_timer.timeout.connect(self.refresh_outline)
+        self.outline_shown = (None, None)  # (outline, version) the panel was last built from
+        self.library_index = LibraryIndex(os.path.join(config_dir, "library_index.db"))
+        self.library_index_task = None
+        self.find_results_list = QListWidget()
+        self.find_results_list.setUniformItemSizes(True)  # One line per result; saves measuring each one as thousands stream in
+        self.find_results_list.itemActivated.connect(self.goto_find_result)
+        self.find_results_list.itemClicked.connect(self.goto_find_result)
+        self.find_dock = QDockWidget("Find Results", self)
+        self.find_dock.setObjectName("FindResultsDock")
+        self.find_dock.setWidget(self.find_results_list)
+        self.addDockWidget(Qt.BottomDockWidgetArea, self.find_dock)
+        self.find_dock.hide()
+        self.find_dock_placed = False  # Tabbed with the terminal the first time it is shown, then left where the user puts it
+        # Unchecked only when the dock is closed, not when the Terminal tab is brought in front of it
+        self.find_dock.toggleViewAction().toggled.connect(lambda shown: shown or self.stop_searches())
+        self.find_results_list.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.find_results_list.customContextMenuRequested.connect(self.show_find_results_menu)
+        self.find_in_files_task = None
+        self.find_in_files_search = None  # (folder, search text) of the Find in Files search shown in the dock
+        self.find_options = {}
+        self.replace_options = {"match_case": True}  # Kept apart from find_options: replacing matches case unless asked not to
+        self.find_all_search = None  # (editor, document, pattern, search text) of the search shown in the dock
+        self.find_all_task = None
+        self.find_all_count = 0
+        self.find_all_timer = QTimer(self)
+        self.find_all_timer.setSingleShot(True)
+        self.find_all_timer.timeout.connect(self.run_find_all)
         self.background_widget = BackgroundWidget(self)
         self.setCentralWidget(self.background_widget)
         self.central_layout = QVBoxLayout(self.background_widget)
@@ -1123,7 +3710,7 @@ class IDE(QMainWindow):
         self.tabs.setStyleSheet("QTabWidget::pane { background: transparent; border: 0; } "
                                "QTabBar::tab { background: transparent; } "
                                "QTabWidget > QWidget > QWidget { background: transparent; } "
-                               "QTextEdit { background: transparent; }")
+                               "QPlainTextEdit { background: transparent; }")
         self.central_layout.addWidget(self.tabs, 1)
         self.tabs.tabBar().tabBarClicked.connect(self.update_background)
         icon_path = resource_path("app_icon.ico")
@@ -1131,12 +3718,6 @@ class IDE(QMainWindow):
             self.setWindowIcon(QIcon(icon_path))
         else:
             self.terminal.log(f"Application icon not found at {icon_path}", "ERROR")
-        self.check_file_timer = QTimer(self)
-        self.check_file_timer.timeout.connect(self.check_all_files)
-        if self.settings["check_external_modifications"]:
-            self.check_file_timer.start(5000)
-        else:
-            self.check_file_timer.stop()
         self.button_bar = None
         self._tasks_loaded = False
         # Initialize ide_tasks_menu as CustomTasksMenu
@@ -1146,11 +3727,20 @@ class IDE(QMainWindow):
         self.init_ui()
         # self.terminal.log(f"Tasks: ide_tasks_menu type after init_ui: {type(self.ide_tasks_menu).__name__}", "INFO")
         self.load_settings()
+        self.file_cache = FileCache(self.settings.get("file_cache_mb", 32) * 1048576, self.settings.get("file_cache_compress", True))
+        self.file_watcher = FileWatcher(self.settings.get("external_change_delay", 300), self)
+        self.file_watcher.files_changed.connect(self.on_files_changed)
+        for state_file in (self.settings_file, self.recent_files_file):
+            state_file.timer.setInterval(self.settings.get("settings_save_delay", 2000))
+            state_file.signals.failed.connect(self.on_state_file_write_failed)
         self.load_and_populate_tasks()
         self.apply_theme()
         self.apply_terminal_settings()
+        self.apply_outline_settings()
         self.apply_logging_settings()
         self.init_button_bar()
+        if self.settings["index_library"]:
+            self.update_library_index()
         if filename and os.path.exists(filename):
             self.open_file_by_path(filename)
         if self.first_time_settings and not filename:
@@ -1260,7 +3850,7 @@ class IDE(QMainWindow):
         self.tabs.setStyleSheet("QTabWidget::pane { background: transparent; border: 0; } "
                                "QTabBar::tab { background: transparent; } "
                                "QTabWidget > QWidget > QWidget { background: transparent; } "
-                               "QTextEdit { background: transparent; }")
+                               "QPlainTextEdit { background: transparent; }")
         self.central_layout.addWidget(self.tabs, 1)
         self.tabs.tabBar().tabBarClicked.connect(self.update_background)
         icon_path = resource_path("app_icon.ico")
@@ -1269,12 +3859,6 @@ class IDE(QMainWindow):
             self.setWindowIcon(QIcon(icon_path))
         else:
             self.terminal.log(f"Application icon not found at {icon_path}", "ERROR")
-        self.check_file_timer = QTimer(self)
-        self.check_file_timer.timeout.connect(self.check_all_files)
-        if self.settings["check_external_modifications"]:
-            self.check_file_timer.start(5000)
-        else:
-            self.check_file_timer.stop()
         self.button_bar = None
         self._tasks_loaded = False  # Flag to track tasks loading
         self.init_ui()
@@ -1316,6 +3900,7 @@ class IDE(QMainWindow):
     def on_tab_changed(self, index):
         if index >= 0:
             self.check_file_changes(self.tabs.widget(index))
+        self.refresh_outline()
 
     def update_background(self, index=None):
         self.background_widget.update()
@@ -1326,6 +3911,11 @@ class IDE(QMainWindow):
     def normalize_path(self, path):
         return os.path.normpath(os.path.abspath(path)).lower()
 
+    def current_text_edit(self):
+        """Return the current tab if it is an editor; large file views are read-only and have no document."""
+        current_tab = self.tabs.currentWidget()
+        return current_tab if isinstance(current_tab, CustomTextEdit) else None
+
     def init_ui(self):
         menubar = self.menuBar()
         self.file_menu = menubar.addMenu("&File")
@@ -1410,6 +4000,14 @@ class IDE(QMainWindow):
         find_previous_action.setShortcut("Shift+F3")
         find_previous_action.triggered.connect(self.find_previous)
         edit_menu.addAction(find_previous_action)
+        find_all_action = QAction("Find &All", self)
+        find_all_action.setShortcut("Ctrl+Alt+F")
+        find_all_action.triggered.connect(self.find_all)
+        edit_menu.addAction(find_all_action)
+        find_in_files_action = QAction("Find in F&iles", self)
+        find_in_files_action.setShortcut("Ctrl+Shift+F")
+        find_in_files_action.triggered.connect(self.find_in_files)
+        edit_menu.addAction(find_in_files_action)
         search_replace_action = QAction("&Search and Replace", self)
         search_replace_action.setShortcut("Ctrl+H")
         search_replace_action.triggered.connect(self.search_and_replace)
@@ -1430,6 +4028,10 @@ class IDE(QMainWindow):
         goto_action.setShortcut("Ctrl+G")
         goto_action.triggered.connect(self.goto_line)
         edit_menu.addAction(goto_action)
+        definition_action = QAction("Go to &Definition", self)
+        definition_action.setShortcut("F12")
+        definition_action.triggered.connect(lambda: self.goto_definition())
+        edit_menu.addAction(definition_action)
         comment_action = QAction("Toggle Co&mment", self)
         comment_action.setShortcut("Ctrl+/")
         comment_action.triggered.connect(self.toggle_comment)
@@ -1482,6 +4084,17 @@ class IDE(QMainWindow):
         marker_duration_action = QAction("Goto Marker Duration", self)
         marker_duration_action.triggered.connect(self.set_goto_marker_duration)
         editor_menu.addAction(marker_duration_action)
+        self.outline_action = QAction("Show &Outline", self)
+        self.outline_action.setCheckable(True)
+        self.outline_action.setChecked(self.settings["show_outline"])
+        self.outline_action.triggered.connect(self.toggle_outline)
+        editor_menu.addAction(self.outline_action)
+        large_file_action = QAction("Large File Threshold", self)
+        large_file_action.triggered.connect(self.set_large_file_threshold)
+        editor_menu.addAction(large_file_action)
+        rebuild_library_action = QAction("Rebuild &Library Index", self)
+        rebuild_library_action.triggered.connect(lambda: self.update_library_index(full=True))
+        editor_menu.addAction(rebuild_library_action)
         self.info_action = QAction("Toggle Info Logs", self)
         self.info_action.setCheckable(True)
         self.info_action.setChecked(self.settings["show_info"])
@@ -1506,6 +4119,15 @@ class IDE(QMainWindow):
         gcbasic_timeout_action = QAction("&GCBASIC Compiler Timeout", self)
         gcbasic_timeout_action.triggered.connect(self.set_gcbasic_timeout)
         logging_menu.addAction(gcbasic_timeout_action)
+        profile_rules_action = QAction("&Profile Highlighting Rules", self)
+        profile_rules_action.triggered.connect(self.profile_highlighting_rules)
+        logging_menu.addAction(profile_rules_action)
+        latency_action = QAction("&Keystroke Latency", self)
+        latency_action.triggered.connect(self.show_keystroke_latency)
+        logging_menu.addAction(latency_action)
+        file_cache_action = QAction("&File Cache Statistics", self)
+        file_cache_action.triggered.connect(lambda: self.terminal.log(f"Cache: {self.file_cache.stats()}", "INFO"))
+        logging_menu.addAction(file_cache_action)
         external_checks_action = QAction("Check &External Modifications", self)
         external_checks_action.setCheckable(True)
         external_checks_action.setChecked(self.settings["check_external_modifications"])
@@ -1590,13 +4212,79 @@ class IDE(QMainWindow):
                 self.terminal.log(f"Selected font {selected_font} is not a valid monospaced font, ignoring", "ERROR")
                             
     def repaint_highlighting(self):
-        current_tab = self.tabs.currentWidget()
+        current_tab = self.current_text_edit()
         if current_tab:
             current_tab.highlighter._apply_highlighting()
+            current_tab.highlighter.start_document_tokenize()
             self.terminal.log("Syntax highlighting repainted", "INFO")
         else:
             self.terminal.log("No file open to repaint highlighting", "ERROR")
 
+    def profile_highlighting_rules(self):
+        """Time each highlighting rule over the open documents or a folder of sources and log the costliest."""
+        current_tab = self.current_text_edit()
+        ruleset = current_tab.highlighter.ruleset if current_tab else None
+        if ruleset is None:
+            ruleset = LanguageRuleset.get(self.settings.get("language_file"), self.terminal.log)
+        if ruleset is None:
+            self.terminal.log("Profile: no highlighting rules loaded", "ERROR")
+            return
+        choices = ["Open documents", "Folder..."]
+        choice, ok = QInputDialog.getItem(self, "Profile Highlighting Rules", "Profile rules over:", choices, 0, False)
+        if not ok:
+            return
+        sources = []
+        if choice == choices[0]:
+            for i in range(self.tabs.count()):
+                if isinstance(self.tabs.widget(i), CustomTextEdit):
+                    sources.append((self.tabs.tabText(i), self.tabs.widget(i).toPlainText().splitlines()))
+        else:
+            folder = QFileDialog.getExistingDirectory(self, "Select Folder to Profile", self.settings.get("last_folder", ""))
+            if not folder:
+                return
+            for root, _, files in os.walk(folder):
+                for name in sorted(files):
+                    if name.lower().endswith((".gcb", ".h")):
+                        path = os.path.join(root, name)
+                        try:
+                            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                                sources.append((os.path.relpath(path, folder), f.read().splitlines()))
+                        except OSError as e:
+                            self.terminal.log(f"Profile: cannot read {path}: {e}", "ERROR")
+        if not sources:
+            self.terminal.log("Profile: nothing to profile", "ERROR")
+            return
+        profiler = RuleProfiler(ruleset)
+        QApplication.setOverrideCursor(Qt.WaitCursor)
+        try:
+            results = profiler.profile(sources)
+        finally:
+            QApplication.restoreOverrideCursor()
+        total_time = sum(result["time"] for result in results) or 1e-9
+        risky = {index for index, _, _ in ruleset.risky_rules}
+        self.terminal.log(f"Profile: {len(results)} rules over {profiler.line_count} lines in {len(sources)} sources, "
+                          f"{total_time * 1000:.1f} ms total", "INFO")
+        for result in results[:10]:
+            worst_line = result["worst_line"].strip()
+            if len(worst_line) > 60:
+                worst_line = worst_line[:57] + "..."
+            self.terminal.log(f"Profile: rule {result['index']} ({result['name']}){' [backtracking risk]' if result['index'] in risky else ''}: "
+                              f"{result['time'] * 1000:.2f} ms ({result['time'] / total_time:.0%}), {result['matches']} matches, "
+                              f"worst {result['worst_time'] * 1000:.3f} ms at {result['worst_source']}:{result['worst_line_num']} {worst_line!r}", "INFO")
+
+    def show_keystroke_latency(self):
+        """Log the time from key event to highlighted edit over the last keystrokes typed."""
+        if not self.keystroke_latencies:
+            self.terminal.log("Latency: no keystrokes recorded yet", "INFO")
+            return
+        samples = sorted(self.keystroke_latencies)
+
+        def percentile(fraction):
+            return samples[min(len(samples) - 1, int(round(fraction * (len(samples) - 1))))] * 1000
+
+        self.terminal.log(f"Latency: {len(samples)} keystrokes, key to highlighted p50 {percentile(0.5):.2f} ms, "
+                          f"p99 {percentile(0.99):.2f} ms, max {samples[-1] * 1000:.2f} ms", "INFO")
+
     def open_url(self, url):
         qurl = QUrl(url)
         if qurl.isValid():
@@ -1880,7 +4568,7 @@ class IDE(QMainWindow):
                     return
                 local_file_path = current_tab.file_path
                 dirname = os.path.dirname(local_file_path)
-                if current_tab.document().isModified():
+                if isinstance(current_tab, CustomTextEdit) and current_tab.document().isModified():
                     self.save_file()
                     self.terminal.log(f"Saved file {local_file_path} before executing GCBASIC task", "INFO")
             if command.lower() == "explorer":
@@ -2071,7 +4759,7 @@ class IDE(QMainWindow):
                 self.terminal.scrollToBottom()
                 self.terminal.user_scrolled = False
                 QApplication.processEvents()
-                current_tab = self.tabs.currentWidget()
+                current_tab = self.current_text_edit()
                 selected_text = current_tab.textCursor().selectedText() if current_tab else ""
                 if not selected_text:
                     selected_text = ""
@@ -2143,17 +4831,23 @@ class IDE(QMainWindow):
                         sub_menu.setFont(ui_font)
         self.tabs.setFont(ui_font)
         self.terminal.setFont(ui_font)
+        self.outline_tree.setFont(ui_font)
+        self.find_results_list.setFont(ui_font)
         if self.line_numbers_action:
             self.line_numbers_action.setChecked(self.settings["line_numbers"])
         if text_edit is None:
             for i in range(self.tabs.count()):
                 self.apply_text_settings(self.tabs.widget(i))
+        elif isinstance(text_edit, LargeFileView):
+            text_edit.apply_text_settings(editor_font)
         else:
             text_edit.setFont(editor_font)
             text_edit.document().setDefaultFont(editor_font)
             if self.settings["word_wrap"]:
+                text_edit.setLineWrapMode(QPlainTextEdit.WidgetWidth)
                 text_edit.setWordWrapMode(QTextOption.WrapAtWordBoundaryOrAnywhere)
             else:
+                text_edit.setLineWrapMode(QPlainTextEdit.NoWrap)
                 text_edit.setWordWrapMode(QTextOption.NoWrap)
             text_edit.update_line_number_area_width()
             text_edit.line_number_area.setVisible(self.settings["line_numbers"])
@@ -2168,83 +4862,189 @@ class IDE(QMainWindow):
                 self.terminal.log(f"Line Numbering set to font: {self.settings['editor_font']}", "INFO")
 
     def save_recent_files(self):
-        try:
-            recent_names = [self.recent_files[i]["name"] if i < len(self.recent_files) else "" for i in range(10)]
-            recent_dirs = [self.recent_files[i]["path"] if i < len(self.recent_files) else "" for i in range(10)]
-            recent_data = {
-                "RecentName": recent_names,
-                "RecentDir": recent_dirs,
-                "RecentN": 1
-            }
-            os.makedirs(os.path.dirname(self.recent_files_path), exist_ok=True)
-            with open(self.recent_files_path, "w", encoding="utf-8") as f:
-                json.dump(recent_data, f, indent=4)
-            if show_file_info:
-                self.terminal.log(f"Saved recent files to {self.recent_files_path}", "INFO")
-        except Exception as e:
-            self.terminal.log(f"Error saving recent files to {self.recent_files_path}: {str(e)}", "ERROR")
+        """Save the recent files list once the current burst of changes is over; see DeferredFile."""
+        self.recent_files_file.mark_dirty()
+
+    def recent_files_data(self):
+        recent_names = [self.recent_files[i]["name"] if i < len(self.recent_files) else "" for i in range(10)]
+        recent_dirs = [self.recent_files[i]["path"] if i < len(self.recent_files) else "" for i in range(10)]
+        recent_data = {
+            "RecentName": recent_names,
+            "RecentDir": recent_dirs,
+            "RecentN": 1
+        }
+        return json.dumps(recent_data, indent=4).encode("utf-8")
 
-    def open_file_by_path(self, file_path):
-        if not os.path.exists(file_path):
+    def open_file_by_path(self, file_path, large_file_view=True, on_loaded=None):
+        """Open a file in a new tab, or switch to its tab if it is already open.
+
+        The tab appears at once in a loading state while a FileLoadTask reads the file, and the text is put in a
+        chunk at a time. on_loaded is called with the tab when its text is all in, straight away if it already is.
+        """
+        normalized_path = self.normalize_path(file_path)
+        for i in range(self.tabs.count()):
+            tab = self.tabs.widget(i)
+            if self.normalize_path(tab.file_path) == normalized_path:
+                self.tabs.setCurrentWidget(tab)
+                if on_loaded is not None and getattr(tab, "load_task", None) is not None:
+                    tab.load_callbacks.append(on_loaded)
+                elif on_loaded is not None:
+                    on_loaded(tab)
+                return
+        text_edit = CustomTextEdit(self)
+        text_edit.file_path = os.path.abspath(file_path)
+        text_edit.setReadOnly(True)
+        if on_loaded is not None:
+            text_edit.load_callbacks.append(on_loaded)
+        threshold = self.settings.get("large_file_threshold_mb", 0) * 1048576 if large_file_view else 0
+        task = FileLoadTask(file_path, threshold, self.file_cache)
+        task.signals.loaded.connect(lambda text, encoding, mtime, task=task: self.on_file_loaded(text_edit, task, text, encoding, mtime))
+        task.signals.too_large.connect(lambda task=task: self.on_file_too_large(text_edit, task))
+        task.signals.failed.connect(lambda message, missing, task=task: self.on_file_load_failed(text_edit, task, message, missing))
+        # Set before the tab is shown: switching to it checks the file for changes unless it is loading
+        text_edit.load_task = task
+        self.tabs.addTab(text_edit, f"{os.path.basename(file_path)} [loading]")
+        self.tabs.setCurrentWidget(text_edit)
+        self.apply_text_settings(text_edit)
+        QThreadPool.globalInstance().start(task)
+        self.background_widget.update()
+
+    def remove_loading_tab(self, text_edit):
+        text_edit.load_task = None
+        text_edit.highlighter.stop_background_work()
+        index = self.tabs.indexOf(text_edit)
+        if index != -1:
+            self.tabs.removeTab(index)
+        text_edit.deleteLater()
+        self.background_widget.update()
+        return index
+
+    def on_file_load_failed(self, text_edit, task, message, missing):
+        if task is not text_edit.load_task:
+            return
+        self.remove_loading_tab(text_edit)
+        file_path = task.path
+        if missing:
             self.terminal.log(f"File {file_path} does not exist", "ERROR")
             normalized_path = self.normalize_path(file_path)
             if normalized_path in [self.normalize_path(entry["path"]) for entry in self.recent_files]:
                 self.recent_files = [entry for entry in self.recent_files if self.normalize_path(entry["path"]) != normalized_path]
                 self.save_recent_files()
+        else:
+            self.terminal.log(f"Error opening {file_path}: {message}", "ERROR")
+
+    def on_file_too_large(self, text_edit, task):
+        if task is not text_edit.load_task:
             return
-        normalized_path = self.normalize_path(file_path)
-        for i in range(self.tabs.count()):
-            if self.normalize_path(self.tabs.widget(i).file_path) == normalized_path:
-                self.tabs.setCurrentWidget(self.tabs.widget(i))
-                return
-        try:
-            current_mtime = os.path.getmtime(file_path)
-            if file_path in self.file_cache and file_path in self.file_states:
-                cached_mtime, _ = self.file_states[file_path]
-                if current_mtime <= cached_mtime:
-                    content = self.file_cache[file_path]
-                else:
-                    with open(file_path, "r") as f:
-                        content = f.read()
-                    self.file_cache[file_path] = content
-            else:
-                with open(file_path, "r") as f:
-                    content = f.read()
-                self.file_cache[file_path] = content
-        except Exception as e:
-            self.terminal.log(f"Error opening {file_path}: {str(e)}", "ERROR")
+        callbacks = text_edit.load_callbacks
+        index = self.remove_loading_tab(text_edit)
+        self.open_large_file(task.path)
+        view = self.tabs.currentWidget()
+        if isinstance(view, LargeFileView) and self.normalize_path(view.file_path) == self.normalize_path(task.path):
+            if index != -1:
+                self.tabs.tabBar().moveTab(self.tabs.indexOf(view), index)
+            for callback in callbacks:
+                callback(view)
+
+    def on_file_loaded(self, text_edit, task, text, encoding, mtime):
+        if task is not text_edit.load_task:
             return
-        text_edit = CustomTextEdit(self)
-        text_edit.setDocument(QTextDocument(content))
-        text_edit.file_path = os.path.abspath(file_path)
-        text_edit.textChanged.connect(lambda: self.record_history(text_edit))
-        try:
-            current_mtime = os.path.getmtime(file_path)
-            self.file_states[file_path] = (current_mtime, None)
-        except Exception as e:
-            self.terminal.log(f"Error getting mtime for {file_path}: {str(e)}", "ERROR")
+        self.file_states[text_edit.file_path] = (mtime, None)
+        text_edit.encoding = encoding
+        if encoding in ("cp1252", "latin-1"):
+            self.terminal.log(f"{os.path.basename(text_edit.file_path)} is not UTF-8, reading and saving it as {encoding}", "INFO")
+        text_edit.document().setUndoRedoEnabled(False)
+        text_edit.begin_loading()
+        self.fill_loaded_file(text_edit, task, text, 0)
+
+    def fill_loaded_file(self, text_edit, task, text, position):
+        """Put the next LOAD_CHUNK_CHARS of a loaded file into its editor, ending on a line break, then yield to the event loop."""
+        if task is not text_edit.load_task:
+            return
+        end = text.find("\n", position + self.LOAD_CHUNK_CHARS)
+        end = len(text) if end == -1 else end + 1
+        cursor = QTextCursor(text_edit.document())
+        cursor.movePosition(QTextCursor.End)
+        cursor.insertText(text[position:end])
         text_edit.document().setModified(False)
-        self.tabs.addTab(text_edit, os.path.basename(file_path))
-        self.tabs.setCurrentWidget(text_edit)
-        self.apply_text_settings(text_edit)
-        text_edit.highlighter.schedule_highlighting()
+        if end < len(text):
+            QTimer.singleShot(0, lambda: self.fill_loaded_file(text_edit, task, text, end))
+            return
+        file_path = task.path
+        text_edit.load_task = None
+        self.file_watcher.watch(text_edit.file_path)
+        text_edit.document().setUndoRedoEnabled(True)
         text_edit.document().setModified(False)
+        text_edit.finish_loading()
+        text_edit.setReadOnly(False)
+        self.tabs.setTabText(self.tabs.indexOf(text_edit), os.path.basename(file_path))
+        text_edit.highlighter.schedule_highlighting()
         if show_hl_info:
             self.terminal.log(f"HL: Opened file {file_path} - undoRedoEnabled: {text_edit.isUndoRedoEnabled()}, isUndoAvailable: {text_edit.document().isUndoAvailable()}, isModified: {text_edit.document().isModified()}", "INFO")
-        if show_file_info:            
-            self.terminal.log(f"Loaded file {file_path} with line_numbers: {self.settings['line_numbers']}", "INFO")
+        if show_file_info:
+            self.terminal.log(f"Loaded file {file_path} ({text_edit.encoding}) with line_numbers: {self.settings['line_numbers']}", "INFO")
+        normalized_path = self.normalize_path(file_path)
+        if normalized_path in [self.normalize_path(entry["path"]) for entry in self.recent_files]:
+            self.recent_files = [entry for entry in self.recent_files if self.normalize_path(entry["path"]) != normalized_path]
+        self.recent_files.insert(0, {"name": os.path.basename(file_path), "path": file_path})
+        if len(self.recent_files) > 10:
+            self.recent_files.pop()
+        self.save_recent_files()
+        self.settings['last_folder'] = os.path.dirname(os.path.abspath(file_path))
+        self.save_settings()
+        callbacks, text_edit.load_callbacks = text_edit.load_callbacks, []
+        for callback in callbacks:
+            callback(text_edit)
+
+    def open_large_file(self, file_path):
+        """Open a file past the large file threshold in a memory-mapped, read-only view."""
+        view = LargeFileView(self, file_path)
+        if not view.open_file():
+            view.deleteLater()
+            return
+        try:
+            self.file_states[view.file_path] = (os.path.getmtime(file_path), None)
+        except Exception as e:
+            self.terminal.log(f"Error getting mtime for {file_path}: {str(e)}", "ERROR")
+        self.file_watcher.watch(view.file_path)
+        self.tabs.addTab(view, os.path.basename(file_path))
+        view.update_tab_badge()
+        self.tabs.setCurrentWidget(view)
+        view.setFocus()
+        self.terminal.log(f"Opened {os.path.basename(file_path)} ({view.file_size / 1048576:.1f} MB) read-only as a large file", "INFO")
+        normalized_path = self.normalize_path(file_path)
         if normalized_path in [self.normalize_path(entry["path"]) for entry in self.recent_files]:
             self.recent_files = [entry for entry in self.recent_files if self.normalize_path(entry["path"]) != normalized_path]
         self.recent_files.insert(0, {"name": os.path.basename(file_path), "path": file_path})
         if len(self.recent_files) > 10:
             self.recent_files.pop()
         self.save_recent_files()
-        last_folder = os.path.dirname(os.path.abspath(file_path))
-        self.settings['last_folder'] = last_folder
+        self.settings['last_folder'] = os.path.dirname(os.path.abspath(file_path))
         self.save_settings()
-        self.check_file_changes(text_edit)
         self.background_widget.update()
 
+    def switch_large_file_to_editor(self, view):
+        """Replace a large file view with a normal editor tab on the same file, at the same line."""
+        index = self.tabs.indexOf(view)
+        if index == -1:
+            return
+        reply = QMessageBox.question(self, "Edit Large File",
+                                     f"Loading {os.path.basename(view.file_path)} ({view.file_size / 1048576:.1f} MB) into the editor "
+                                     "may take a while and use a lot of memory. Continue?",
+                                     QMessageBox.Yes | QMessageBox.No)
+        if reply != QMessageBox.Yes:
+            return
+        file_path = view.file_path
+        line_number = view.current_line
+        view.close_file()
+        self.tabs.removeTab(index)
+        view.deleteLater()
+        self.open_file_by_path(file_path, large_file_view=False,
+                               on_loaded=lambda text_edit: self.goto_text_line(text_edit, line_number))
+        text_edit = self.current_text_edit()
+        if text_edit is not None and self.normalize_path(text_edit.file_path) == self.normalize_path(file_path):
+            self.tabs.tabBar().moveTab(self.tabs.indexOf(text_edit), index)
+
     def open_file(self):
         last_folder = self.settings.get('last_folder', os.path.expanduser('~'))
         if not os.path.exists(last_folder):
@@ -2259,19 +5059,17 @@ class IDE(QMainWindow):
             self.open_file_by_path(file_path)
 
     def save_file(self):
-        current_tab = self.tabs.currentWidget()
+        current_tab = self.current_text_edit()
         if current_tab and hasattr(current_tab, "file_path"):
-            if current_tab.file_path.startswith("untitled_"):
+            if current_tab.load_task is not None:
+                self.terminal.log(f"{os.path.basename(current_tab.file_path)} is still loading", "ERROR")
+            elif current_tab.file_path.startswith("untitled_"):
                 self.save_file_as()
             else:
                 try:
-                    with open(current_tab.file_path, "w") as f:
-                        f.write(current_tab.toPlainText())
-                        f.flush()
-                        os.fsync(f.fileno())
+                    self.write_text_file(current_tab, current_tab.file_path)
                     current_tab.document().setModified(False)
-                    if current_tab.file_path in self.file_cache:
-                        del self.file_cache[current_tab.file_path]
+                    self.file_cache.discard(current_tab.file_path)
                     current_mtime = os.path.getmtime(current_tab.file_path)
                     self.file_states[current_tab.file_path] = (current_mtime, None)
                     self.tabs.setTabText(self.tabs.currentIndex(), os.path.basename(current_tab.file_path))
@@ -2285,12 +5083,13 @@ class IDE(QMainWindow):
                     last_folder = os.path.dirname(os.path.abspath(current_tab.file_path))
                     self.settings['last_folder'] = last_folder
                     self.save_settings()
+                    self.reload_language_rules_if_saved(current_tab.file_path)
                 except Exception as e:
                     self.terminal.log(f"Error saving {current_tab.file_path}: {str(e)}", "ERROR")
 
     def save_file_as(self):
-        current_tab = self.tabs.currentWidget()
-        if current_tab and hasattr(current_tab, "file_path"):
+        current_tab = self.current_text_edit()
+        if current_tab and hasattr(current_tab, "file_path") and current_tab.load_task is None:
             last_folder = self.settings.get('last_folder', os.path.expanduser('~'))
             if not os.path.exists(last_folder):
                 last_folder = os.path.expanduser('~')
@@ -2302,14 +5101,12 @@ class IDE(QMainWindow):
             )
             if file_path:
                 try:
-                    with open(file_path, "w") as f:
-                        f.write(current_tab.toPlainText())
-                        f.flush()
-                        os.fsync(f.fileno())
+                    self.write_text_file(current_tab, file_path)
+                    self.file_watcher.unwatch(current_tab.file_path)
                     current_tab.file_path = os.path.abspath(file_path)
+                    self.file_watcher.watch(current_tab.file_path)
                     current_tab.document().setModified(False)
-                    if file_path in self.file_cache:
-                        del self.file_cache[file_path]
+                    self.file_cache.discard(file_path)
                     current_mtime = os.path.getmtime(file_path)
                     self.file_states[file_path] = (current_mtime, None)
                     self.tabs.setTabText(self.tabs.currentIndex(), os.path.basename(file_path))
@@ -2323,14 +5120,47 @@ class IDE(QMainWindow):
                     last_folder = os.path.dirname(os.path.abspath(file_path))
                     self.settings['last_folder'] = last_folder
                     self.save_settings()
+                    self.reload_language_rules_if_saved(file_path)
                 except Exception as e:
                     self.terminal.log(f"Error saving {file_path}: {str(e)}", "ERROR")
 
+    def write_text_file(self, text_edit, file_path):
+        """Write an editor's text in the encoding its file was read in, switching to UTF-8 if the text no longer fits it."""
+        text = text_edit.toPlainText()
+        encoding = text_edit.encoding
+        if encoding is not None:
+            try:
+                text.encode(encoding)
+            except UnicodeEncodeError:
+                self.terminal.log(f"{os.path.basename(file_path)} has characters {encoding} cannot hold, saving it as UTF-8", "INFO")
+                encoding = text_edit.encoding = "utf-8"
+        with open(file_path, "w", encoding=encoding) as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def reload_language_rules_if_saved(self, file_path):
+        """Recompile the language file once after it is saved and push the new ruleset to every open tab."""
+        language_file = self.settings.get("language_file")
+        if not language_file or self.normalize_path(file_path) != self.normalize_path(language_file):
+            return
+        ruleset = LanguageRuleset.get(language_file, self.terminal.log)
+        if ruleset is None:
+            self.terminal.log("Language file has errors, keeping the previous highlighting rules", "ERROR")
+            return
+        for i in range(self.tabs.count()):
+            tab = self.tabs.widget(i)
+            if isinstance(tab, CustomTextEdit):
+                tab.highlighter.set_ruleset(ruleset)
+            elif isinstance(tab, LargeFileView):
+                tab.set_ruleset(ruleset)
+        self.terminal.log(f"Reloaded highlighting rules from {language_file} in {self.tabs.count()} tabs", "INFO")
+
     def save_all(self):
         saved_count = 0
         for i in range(self.tabs.count()):
             tab = self.tabs.widget(i)
-            if tab and hasattr(tab, "file_path") and tab.document().isModified():
+            if isinstance(tab, CustomTextEdit) and tab.document().isModified():
                 self.tabs.setCurrentWidget(tab)
                 self.save_file()
                 if not tab.document().isModified():
@@ -2342,18 +5172,21 @@ class IDE(QMainWindow):
         block_count = doc.blockCount()  # Count all blocks
         max_digits = len(str(block_count)) if block_count > 0 else 1
         new_doc = QTextDocument()
+        new_doc.setDefaultFont(doc.defaultFont())
         cursor = QTextCursor(new_doc)
         line_number = 1
         block = doc.firstBlock()
         while block.isValid():
             line_number_str = f"{line_number:>{max_digits}} "
             cursor.insertText(line_number_str, QTextCharFormat())  # Plain format for line numbers
-            # Copy block text and formatting (empty blocks will have no text)
-            block_cursor = QTextCursor(block)
-            block_cursor.movePosition(QTextCursor.StartOfBlock)
-            block_cursor.movePosition(QTextCursor.EndOfBlock, QTextCursor.KeepAnchor)
-            if block_cursor.hasSelection():
-                cursor.insertFragment(block_cursor.selection())
+            text_start = cursor.position()
+            cursor.insertText(block.text(), QTextCharFormat())
+            # Highlighting lives in the block layout, so bake it into the printed copy as character formats
+            for format_range in block.layout().formats():
+                cursor.setPosition(text_start + format_range.start)
+                cursor.setPosition(text_start + format_range.start + format_range.length, QTextCursor.KeepAnchor)
+                cursor.mergeCharFormat(format_range.format)
+            cursor.movePosition(QTextCursor.End)
             if block.next().isValid():  # Add block separator only if not the last block
                 cursor.insertBlock()
             line_number += 1
@@ -2365,6 +5198,8 @@ class IDE(QMainWindow):
         if not isinstance(text_edit, CustomTextEdit):
             self.terminal.log("No file open to print", "ERROR")
             return
+        if hasattr(text_edit, "file_path") and text_edit.file_path.lower().endswith(".gcb"):
+            text_edit.highlighter.start_document_tokenize()  # Runs while the print dialog is open
         printer = QPrinter(QPrinter.HighResolution)
         dialog = QPrintDialog(printer, self)
         if dialog.exec_() != QDialog.Accepted:
@@ -2372,19 +5207,14 @@ class IDE(QMainWindow):
         # Highlight entire .GCB file
         if hasattr(text_edit, "file_path") and text_edit.file_path.lower().endswith(".gcb"):
             text_edit.highlighter.highlight_all_blocks()
-        # Create document with line numbers
+        # Create document with line numbers, carrying the highlighting across
         doc = self.format_document_with_line_numbers(text_edit)
-        # Reapply highlighting to new document for .gcb files
-        if hasattr(text_edit, "file_path") and text_edit.file_path.lower().endswith(".gcb"):
-            temp_text_edit = CustomTextEdit(self)
-            temp_text_edit.setDocument(doc)
-            temp_text_edit.highlighter.highlight_all_blocks()
         doc.print_(printer)
         self.terminal.log(f"Printed file: {text_edit.file_path if hasattr(text_edit, 'file_path') else 'untitled'}", "INFO")
 
     def close_tab(self, index):
         tab = self.tabs.widget(index)
-        if tab and hasattr(tab, "file_path") and self.settings["save_confirmation"] and tab.document().isModified():
+        if isinstance(tab, CustomTextEdit) and self.settings["save_confirmation"] and tab.document().isModified():
             self.terminal.log(f"Prompting save for {tab.file_path} (modified: {tab.document().isModified()})", "INFO")
             reply = QMessageBox.question(self, "Save File", f"Save {tab.file_path} before closing?",
                                          QMessageBox.Yes | QMessageBox.No | QMessageBox.Cancel)
@@ -2392,6 +5222,17 @@ class IDE(QMainWindow):
                 self.save_file()
             elif reply == QMessageBox.Cancel:
                 return
+        if isinstance(tab, CustomTextEdit):
+            if tab.load_task is not None:
+                tab.load_task.cancelled = True
+                tab.load_task = None
+            tab.highlighter.stop_background_work()
+            if self.find_all_search is not None and self.find_all_search[0] is tab:
+                self.stop_find_all()
+        elif isinstance(tab, LargeFileView):
+            tab.close_file()
+        if hasattr(tab, "file_path"):
+            self.file_watcher.unwatch(tab.file_path)
         self.tabs.tabCloseRequested.disconnect(self.update_background_after_close)
         self.tabs.removeTab(index)
         self.tabs.tabCloseRequested.connect(self.update_background_after_close)
@@ -2407,6 +5248,8 @@ class IDE(QMainWindow):
             return
         if not hasattr(text_edit, "file_path") or text_edit.file_path.startswith("untitled_"):
             return
+        if getattr(text_edit, "load_task", None) is not None:
+            return  # Still loading; the state is recorded when it finishes
         file_path = text_edit.file_path
         try:
             current_mtime = os.path.getmtime(file_path)
@@ -2417,13 +5260,7 @@ class IDE(QMainWindow):
                                                 f"{file_path} has been modified externally. Reload?",
                                                 QMessageBox.Yes | QMessageBox.No)
                     if reply == QMessageBox.Yes:
-                        with open(file_path, "r") as f:
-                            content = f.read()
-                        text_edit.setPlainText(content)
-                        text_edit.document().setModified(False)
-                        self.file_cache[file_path] = content
-                        text_edit.highlighter.schedule_highlighting()
-                        self.file_states[file_path] = (current_mtime, "reload")
+                        self.reload_from_disk(text_edit)
                     else:
                         self.file_states[file_path] = (current_mtime, "ignore")
                 else:
@@ -2433,13 +5270,114 @@ class IDE(QMainWindow):
         except Exception as e:
             self.terminal.log(f"Error checking {file_path}: {str(e)}", "ERROR")
 
-    def record_history(self, text_edit):
-        if not hasattr(text_edit, "file_path"):
+    def reload_from_disk(self, tab):
+        """Read a tab's file again after it changed on disk."""
+        file_path = tab.file_path
+        if isinstance(tab, LargeFileView):
+            tab.reload_file()
+            current_mtime = os.path.getmtime(file_path)
+        else:
+            content, encoding, current_mtime, size = read_text_file(file_path)
+            hunks = self.reload_text(tab, content)
+            tab.encoding = encoding
+            tab.document().setModified(False)
+            self.file_cache.put(file_path, current_mtime, size, content, encoding)
+            if show_file_info:
+                self.terminal.log(f"Reloaded {file_path}: {hunks} changed ranges of lines", "INFO")
+        self.file_states[file_path] = (current_mtime, "reload")
+
+    def reload_text(self, text_edit, text):
+        """Make an editor's text match text by editing only the lines that differ, as one undo step.
+
+        The differing line ranges from diff_line_ranges are replaced back to front inside one edit block, so the
+        undo history, the cursor and the highlighting of the untouched lines survive, and Undo brings the
+        editor's text back. The view keeps its first line in place. Returns the number of ranges replaced.
+        """
+        document = text_edit.document()
+        old_lines = document.toRawText().split("\u2029")
+        new_lines = text.split("\n")
+        hunks = diff_line_ranges(old_lines, new_lines)
+        if not hunks:
+            return 0
+        # Where the first line in view ends up: after a range it moves by the range's change in size
+        first_visible = new_first_visible = text_edit.firstVisibleBlock().blockNumber()
+        for i1, i2, j1, j2 in hunks:
+            if i1 >= first_visible:
+                break
+            if i2 > first_visible:
+                new_first_visible = min(j1 + first_visible - i1, j2)
+                break
+            new_first_visible = first_visible + j2 - i2
+        scroll_bar = text_edit.verticalScrollBar()
+        scroll_value = scroll_bar.value()
+        old_count = len(old_lines)
+        cursor = QTextCursor(document)
+        cursor.beginEditBlock()
+        for i1, i2, j1, j2 in reversed(hunks):
+            if i2 < old_count:
+                # Replace whole lines, newlines included
+                cursor.setPosition(document.findBlockByNumber(i1).position())
+                cursor.setPosition(document.findBlockByNumber(i2).position(), QTextCursor.KeepAnchor)
+                cursor.insertText("".join(line + "\n" for line in new_lines[j1:j2]))
+            elif i1 > 0:
+                # Through the last line: start at the newline before the range, as the last line has none after it
+                block = document.findBlockByNumber(i1 - 1)
+                cursor.setPosition(block.position() + block.length() - 1)
+                cursor.movePosition(QTextCursor.End, QTextCursor.KeepAnchor)
+                cursor.insertText("".join("\n" + line for line in new_lines[j1:j2]))
+            else:
+                cursor.select(QTextCursor.Document)
+                cursor.insertText("\n".join(new_lines[j1:j2]))
+        cursor.endEditBlock()
+        scroll_bar.setValue(scroll_value + new_first_visible - first_visible)
+        return len(hunks)
+
+    def on_files_changed(self, paths):
+        """Ask once about all the open files the watcher reports changed since they were read or saved.
+
+        A save from the editor records the new modification time before its change notification is delivered,
+        so the editor's own writes are not reported.
+        """
+        if not self.settings.get("check_external_modifications", True):
             return
-        file_path = text_edit.file_path
-        if file_path not in self.history:
-            self.history[file_path] = deque(maxlen=100)
-        self.history[file_path].append(text_edit.toPlainText())
+        tabs = {self.normalize_path(self.tabs.widget(i).file_path): self.tabs.widget(i) for i in range(self.tabs.count())}
+        changed = []
+        for path in paths:
+            tab = tabs.get(self.normalize_path(path))
+            if tab is None or getattr(tab, "load_task", None) is not None:
+                continue
+            try:
+                current_mtime = os.path.getmtime(path)
+            except OSError:
+                continue  # Removed, or between the delete and rename of a save; the rename is reported again
+            last_mtime, user_choice = self.file_states.get(tab.file_path, (None, None))
+            if last_mtime is None:
+                self.file_states[tab.file_path] = (current_mtime, None)
+            elif current_mtime > last_mtime and user_choice != "ignore":
+                changed.append((tab, current_mtime))
+        if not changed:
+            return
+        if len(changed) == 1:
+            message = f"{changed[0][0].file_path} has been modified externally. Reload?"
+        else:
+            names = "\n".join(tab.file_path for tab, _ in changed)
+            message = f"{len(changed)} files have been modified externally:\n\n{names}\n\nReload them?"
+        self.file_watcher.hold()  # Changes that arrive while the question is up are asked about after it
+        try:
+            reply = QMessageBox.question(self, "Files Changed" if len(changed) > 1 else "File Changed", message,
+                                         QMessageBox.Yes | QMessageBox.No)
+        finally:
+            self.file_watcher.release()
+        for tab, current_mtime in changed:
+            if self.tabs.indexOf(tab) == -1:
+                continue  # Closed while the question was up
+            try:
+                if reply == QMessageBox.Yes:
+                    self.reload_from_disk(tab)
+                else:
+                    self.file_states[tab.file_path] = (current_mtime, "ignore")
+            except Exception as e:
+                self.terminal.log(f"Error reloading {tab.file_path}: {str(e)}", "ERROR")
 
     def show_recent_files(self):
         menu = QMenu()
@@ -2465,7 +5403,7 @@ class IDE(QMainWindow):
         self.save_recent_files()
 
     def undo(self):
-        current_tab = self.tabs.currentWidget()
+        current_tab = self.current_text_edit()
         if current_tab:
             doc = current_tab.document()
             if show_hl_info:
@@ -2478,7 +5416,7 @@ class IDE(QMainWindow):
                     self.terminal.log("HL: Undo not available", "INFO")
 
     def redo(self):
-        current_tab = self.tabs.currentWidget()
+        current_tab = self.current_text_edit()
         if current_tab:
             doc = current_tab.document()
             if show_hl_info:
@@ -2491,7 +5429,7 @@ class IDE(QMainWindow):
                     self.terminal.log("HL: Redo not available", "INFO")
 
     def cut(self):
-        current_tab = self.tabs.currentWidget()
+        current_tab = self.current_text_edit()
         if current_tab:
             current_tab.cut()
             current_tab.highlighter.schedule_highlighting()
@@ -2502,13 +5440,13 @@ class IDE(QMainWindow):
             current_tab.copy()
 
     def paste(self):
-        current_tab = self.tabs.currentWidget()
+        current_tab = self.current_text_edit()
         if current_tab:
             current_tab.paste()
             current_tab.highlighter.schedule_highlighting()
 
     def find(self):
-        current_tab = self.tabs.currentWidget()
+        current_tab = self.current_text_edit()
         if not current_tab:
             self.terminal.log("No file open for find", "ERROR")
             return
@@ -2523,8 +5461,222 @@ class IDE(QMainWindow):
             else:
                 pass
 
-    def find_next(self):
+    def find_all(self):
+        current_tab = self.current_text_edit()
+        if not current_tab:
+            self.terminal.log("No file open for find", "ERROR")
+            return
+        selected = current_tab.textCursor().selectedText()
+        search = selected if selected and "\u2029" not in selected else self.last_search or ""
+        dialog = FindDialog(self, "Find All", search, self.find_options)
+        if dialog.exec_() != QDialog.Accepted:
+            return
+        self.find_options = dialog.options()
+        self.last_search = dialog.search_edit.text()
+        self.stop_searches()
+        current_tab.document().contentsChange.connect(self.on_find_all_document_change)
+        self.find_all_search = (current_tab, current_tab.document(), dialog.pattern, self.last_search)
+        self.show_find_results()
+        self.run_find_all()
+
+    def show_find_results(self):
+        if not self.find_dock_placed and self.dock.isVisible() and not self.dock.isFloating():
+            self.tabifyDockWidget(self.dock, self.find_dock)
+        self.find_dock_placed = True
+        self.find_dock.show()
+        self.find_dock.raise_()
+
+    def run_find_all(self):
+        """Search the find-all document again from a fresh snapshot of its text."""
+        if self.find_all_search is None:
+            return
+        text_edit, document, pattern, search = self.find_all_search
+        if self.tabs.indexOf(text_edit) == -1 or text_edit.document() is not document:
+            self.stop_find_all()
+            return
+        task = FindAllTask(pattern, document.toRawText(), max(1, self.settings.get("find_all_max_results", 10000)))
+        task.signals.matches_found.connect(lambda matches, task=task: self.on_find_all_matches(task, matches))
+        task.signals.finished.connect(lambda found, capped, task=task: self.on_find_all_finished(task, found, capped))
+        self.find_all_task = task
+        self.find_all_count = 0
+        self.find_results_list.clear()
+        text_edit.clear_find_matches()
+        self.find_dock.setWindowTitle(f"Find Results: searching {os.path.basename(text_edit.file_path)} for '{search}'")
+        QThreadPool.globalInstance().start(task)
+
+    def on_find_all_matches(self, task, matches):
+        if task is not self.find_all_task:
+            return  # From a search that was cancelled or replaced, queued before it stopped
+        text_edit = self.find_all_search[0]
+        results = self.find_results_list
+        results.setUpdatesEnabled(False)
+        for start, end, line_number, line_text in matches:
+            item = QListWidgetItem(f"{line_number + 1}: {line_text.strip()}")
+            item.setData(Qt.UserRole, (start, end))
+            results.addItem(item)
+        results.setUpdatesEnabled(True)
+        text_edit.add_find_matches(matches)
+        self.find_all_count += len(matches)
+
+    def on_find_all_finished(self, task, found, capped):
+        if task is not self.find_all_task:
+            return
+        self.find_all_task = None
+        text_edit, _, _, search = self.find_all_search
+        limit = f" (stopped at the limit of {found})" if capped else ""
+        self.find_dock.setWindowTitle(f"Find Results: {found} matches for '{search}' in {os.path.basename(text_edit.file_path)}{limit}")
+
+    def on_find_all_document_change(self, position, chars_removed, chars_added):
+        # The matches no longer line up with the text: drop them and search again once the edits pause
+        if self.find_all_task is not None:
+            self.find_all_task.cancelled = True
+            self.find_all_task = None
+        if self.find_all_search is not None:
+            self.find_all_search[0].clear_find_matches()
+            self.find_all_timer.start(self.settings.get("find_all_refresh_delay", 300))
+
+    def stop_find_all(self):
+        """Cancel the find-all search and remove its highlights; the results list stays until the next search."""
+        self.find_all_timer.stop()
+        if self.find_all_task is not None:
+            self.find_all_task.cancelled = True
+            self.find_all_task = None
+        if self.find_all_search is not None:
+            text_edit, document, _, _ = self.find_all_search
+            self.find_all_search = None
+            try:
+                document.contentsChange.disconnect(self.on_find_all_document_change)
+                text_edit.clear_find_matches()
+            except (RuntimeError, TypeError):
+                pass  # The tab was closed
+
+    def find_in_files(self):
+        """Search the files under a folder, by default the current file's, for the Find All options."""
         current_tab = self.tabs.currentWidget()
+        gcbasic_path = os.path.normpath(os.environ.get("GCBASIC_INSTALL_PATH", os.path.expanduser("~")))
+        folders = []
+        if current_tab is not None and os.path.isfile(getattr(current_tab, "file_path", "")):
+            folders.append(os.path.dirname(os.path.abspath(current_tab.file_path)))
+        folders += [self.settings.get("last_folder", ""), os.path.join(gcbasic_path, "gcbasic", "include"),
+                    os.path.join(gcbasic_path, "gcbasic", "demos"), os.path.join(gcbasic_path, "gcbasic")]
+        folders = list(dict.fromkeys(os.path.normpath(folder) for folder in folders if folder and os.path.isdir(folder)))
+        if self.find_in_files_search is not None and self.find_in_files_search[0] in folders:
+            folders.insert(0, folders.pop(folders.index(self.find_in_files_search[0])))
+        text_edit = self.current_text_edit()
+        selected = text_edit.textCursor().selectedText() if text_edit is not None else ""
+        search = selected if selected and "\u2029" not in selected else self.last_search or ""
+        dialog = FindInFilesDialog(self, search, self.find_options, folders,
+                                   self.settings["find_in_files_include"], self.settings["find_in_files_exclude"])
+        if dialog.exec_() != QDialog.Accepted:
+            return
+        self.find_options = dialog.options()
+        self.last_search = dialog.search_edit.text()
+        self.settings["find_in_files_include"] = dialog.include_edit.text()
+        self.settings["find_in_files_exclude"] = dialog.exclude_edit.text()
+        self.save_settings()
+        self.stop_searches()
+        folder = os.path.normpath(dialog.folder_box.currentText())
+        task = FindInFilesTask(folder, dialog.pattern, self.split_globs(dialog.include_edit.text()), self.split_globs(dialog.exclude_edit.text()),
+                               self.process_worker_count("find_in_files_workers"), max(1, self.settings.get("find_all_max_results", 10000)))
+        task.signals.matches_found.connect(lambda matches, task=task: self.on_find_in_files_matches(task, matches))
+        task.signals.finished.connect(lambda searched, found, capped, task=task: self.on_find_in_files_finished(task, searched, found, capped))
+        task.signals.failed.connect(lambda message, task=task: self.on_find_in_files_failed(task, message))
+        self.find_in_files_task = task
+        self.find_in_files_search = (folder, self.last_search)
+        self.find_results_list.clear()
+        self.find_dock.setWindowTitle(f"Find Results: searching {folder} for '{self.last_search}'")
+        self.show_find_results()
+        QThreadPool.globalInstance().start(task)
+
+    @staticmethod
+    def split_globs(text):
+        return [pattern.strip() for pattern in re.split(r"[;,]", text) if pattern.strip()]
+
+    def on_find_in_files_matches(self, task, matches):
+        if task is not self.find_in_files_task:
+            return
+        folder = self.find_in_files_search[0]
+        results = self.find_results_list
+        results.setUpdatesEnabled(False)
+        for path, line_number, start, end, line_text in matches:
+            item = QListWidgetItem(f"{os.path.relpath(path, folder)}:{line_number + 1}: {line_text.strip()}")
+            item.setData(Qt.UserRole, (path, line_number, start, end))
+            results.addItem(item)
+        results.setUpdatesEnabled(True)
+
+    def on_find_in_files_finished(self, task, searched, found, capped):
+        if task is not self.find_in_files_task:
+            return
+        self.find_in_files_task = None
+        folder, search = self.find_in_files_search
+        limit = f" (stopped at the limit of {found})" if capped else ""
+        self.find_dock.setWindowTitle(f"Find Results: {found} matches for '{search}' in {searched} files under {folder}{limit}")
+
+    def on_find_in_files_failed(self, task, message):
+        if task is not self.find_in_files_task:
+            return
+        self.find_in_files_task = None
+        folder, search = self.find_in_files_search
+        self.find_dock.setWindowTitle(f"Find Results: {self.find_results_list.count()} matches for '{search}' under {folder} (search failed)")
+        self.terminal.log(f"Find in Files failed: {message}", "ERROR")
+
+    def stop_find_in_files(self):
+        if self.find_in_files_task is not None:
+            self.find_in_files_task.cancelled = True
+            self.find_in_files_task = None
+            folder, search = self.find_in_files_search
+            self.find_dock.setWindowTitle(f"Find Results: {self.find_results_list.count()} matches for '{search}' under {folder} (stopped)")
+
+    def stop_searches(self):
+        self.stop_find_all()
+        self.stop_find_in_files()
+
+    def show_find_results_menu(self, position):
+        menu = QMenu(self)
+        stop_action = menu.addAction("Stop Search")
+        stop_action.setEnabled(self.find_in_files_task is not None or self.find_all_task is not None)
+        stop_action.triggered.connect(self.stop_searches)
+        clear_action = menu.addAction("Clear Results")
+        clear_action.triggered.connect(self.stop_searches)
+        clear_action.triggered.connect(self.find_results_list.clear)
+        menu.exec_(self.find_results_list.mapToGlobal(position))
+
+    def goto_file_result(self, path, line_number, start, end):
+        self.open_file_by_path(path, on_loaded=lambda tab: self.select_file_result(tab, line_number, start, end))
+
+    def select_file_result(self, tab, line_number, start, end):
+        if isinstance(tab, LargeFileView):
+            tab.goto_line(line_number)
+        elif isinstance(tab, CustomTextEdit):
+            block = tab.document().findBlockByNumber(line_number)
+            if block.isValid():
+                self.goto_text_line(tab, line_number)
+                cursor = tab.textCursor()
+                cursor.setPosition(block.position() + min(start, block.length() - 1))
+                cursor.setPosition(block.position() + min(end, block.length() - 1), QTextCursor.KeepAnchor)
+                tab.setTextCursor(cursor)
+
+    def goto_find_result(self, item):
+        if isinstance(item.data(Qt.UserRole)[0], str):
+            self.goto_file_result(*item.data(Qt.UserRole))
+            return
+        if self.find_all_search is None:
+            return
+        text_edit = self.find_all_search[0]
+        if self.tabs.indexOf(text_edit) == -1:
+            return
+        start, end = item.data(Qt.UserRole)
+        end_limit = text_edit.document().characterCount() - 1
+        self.tabs.setCurrentWidget(text_edit)
+        cursor = text_edit.textCursor()
+        cursor.setPosition(min(start, end_limit))
+        cursor.setPosition(min(end, end_limit), QTextCursor.KeepAnchor)
+        text_edit.setTextCursor(cursor)
+        text_edit.centerCursor()
+        text_edit.setFocus()
+
+    def find_next(self):
+        current_tab = self.current_text_edit()
         if not current_tab or not self.last_search:
             self.terminal.log("No search term or file open for Find Next", "ERROR")
             return
@@ -2536,7 +5688,7 @@ class IDE(QMainWindow):
             self.terminal.log(f"No more occurrences of '{self.last_search}' found", "INFO")
 
     def find_previous(self):
-        current_tab = self.tabs.currentWidget()
+        current_tab = self.current_text_edit()
         if not current_tab or not self.last_search:
             self.terminal.log("No search term or file open for Find Previous", "ERROR")
             return
@@ -2548,24 +5700,94 @@ class IDE(QMainWindow):
             self.terminal.log(f"No previous occurrences of '{self.last_search}' found", "INFO")
 
     def search_and_replace(self):
-        current_tab = self.tabs.currentWidget()
+        current_tab = self.current_text_edit()
         if not current_tab:
             self.terminal.log("No file open for search and replace", "ERROR")
             return
-        search, ok = QInputDialog.getText(self, "Search and Replace", "Search for:")
-        if ok and search:
-            replace, ok = QInputDialog.getText(self, "Search and Replace", "Replace with:")
-            if ok:
-                content = current_tab.toPlainText()
-                new_content = content.replace(search, replace)
-                if new_content != content:
-                    current_tab.setPlainText(new_content)
-                    current_tab.highlighter.schedule_highlighting()
+        cursor = current_tab.textCursor()
+        selected = cursor.selectedText()
+        multiline_selection = "\u2029" in selected
+        search = selected if selected and not multiline_selection else self.last_search or ""
+        # Any selection can be the scope; one spanning lines is taken to be meant as it and starts checked
+        dialog = ReplaceDialog(self, search, self.last_replace or "", self.replace_options, cursor.hasSelection(), multiline_selection)
+        if dialog.exec_() != QDialog.Accepted:
+            return
+        self.replace_options = dialog.options()
+        self.last_search = dialog.search_edit.text()
+        self.last_replace = dialog.replace_edit.text()
+        if dialog.selection_box.isChecked():
+            start, end = cursor.selectionStart(), cursor.selectionEnd()
+        else:
+            start, end = 0, current_tab.document().characterCount() - 1
+        count = self.replace_all(current_tab, dialog.pattern, self.last_replace, self.replace_options["regular_expression"], start, end)
+        if count is None:
+            return
+        if count:
+            self.terminal.log(f"Replaced {count} occurrences of '{self.last_search}'", "INFO")
+        else:
+            self.terminal.log(f"No occurrences of '{self.last_search}' found", "INFO")
+
+    def replace_all(self, text_edit, pattern, replacement, expand_groups, start, end):
+        """Replace the matches of pattern between two document positions as one undo step and return how many changed.
+
+        Only the matched ranges are edited, back to front so the positions still to be edited stay valid, inside
+        one edit block: the document reports a single change, so the highlighter, journal and outline each see one
+        edit and the undo stack gets one step. Matches less than REPLACE_MERGE_GAP characters apart are replaced
+        as one range, rewriting the unchanged text between them, as each cursor edit costs far more than the
+        characters it copies. Returns None if the replacement refers to a group the pattern lacks.
+        """
+        document = text_edit.document()
+        whole_document = start == 0 and end == document.characterCount() - 1
+        text = document.toRawText().replace("\u2029", "\n")
+        position = text_edit.textCursor().position()
+        ranges = []  # (start, end, new text) of each range to edit
+        parts = []
+        range_start = range_end = None
+        count = growth = cursor_growth = 0
+        try:
+            for match in pattern.finditer(text, start, end):
+                new_text = match.expand(replacement) if expand_groups else replacement
+                match_start, match_end = match.span()
+                if new_text == match.group():
+                    continue
+                count += 1
+                change = len(new_text) - (match_end - match_start)
+                growth += change
+                if match_end <= position:
+                    cursor_growth += change  # Where the editor's cursor lands once the text before it has changed
+                if range_end is not None and match_start - range_end < self.REPLACE_MERGE_GAP:
+                    parts.append(text[range_end:match_start])
                 else:
-                    pass
+                    if range_end is not None:
+                        ranges.append((range_start, range_end, "".join(parts)))
+                    range_start, parts = match_start, []
+                parts.append(new_text)
+                range_end = match_end
+        except (re.error, IndexError) as e:
+            self.terminal.log(f"Invalid replacement '{replacement}': {e}", "ERROR")
+            return None
+        if not count:
+            return 0
+        ranges.append((range_start, range_end, "".join(parts)))
+        cursor = QTextCursor(document)
+        cursor.beginEditBlock()
+        for range_start, range_end, new_text in reversed(ranges):
+            cursor.setPosition(range_start)
+            cursor.setPosition(range_end, QTextCursor.KeepAnchor)
+            cursor.insertText(new_text)
+        cursor.endEditBlock()
+        cursor = text_edit.textCursor()
+        if whole_document:
+            cursor.setPosition(min(position + cursor_growth, document.characterCount() - 1))
+        else:
+            # Keep the replaced text selected so the next replace in selection covers the same range
+            cursor.setPosition(start)
+            cursor.setPosition(end + growth, QTextCursor.KeepAnchor)
+        text_edit.setTextCursor(cursor)
+        return count
 
     def toggle_case(self):
-        current_tab = self.tabs.currentWidget()
+        current_tab = self.current_text_edit()
         if current_tab:
             cursor = current_tab.textCursor()
             if cursor.hasSelection():
@@ -2579,7 +5801,7 @@ class IDE(QMainWindow):
                 current_tab.highlighter.schedule_highlighting()
 
     def upper_case(self):
-        current_tab = self.tabs.currentWidget()
+        current_tab = self.current_text_edit()
         if current_tab:
             cursor = current_tab.textCursor()
             if cursor.hasSelection():
@@ -2593,7 +5815,7 @@ class IDE(QMainWindow):
                 current_tab.highlighter.schedule_highlighting()
 
     def lower_case(self):
-        current_tab = self.tabs.currentWidget()
+        current_tab = self.current_text_edit()
         if current_tab:
             cursor = current_tab.textCursor()
             if cursor.hasSelection():
@@ -2607,6 +5829,13 @@ class IDE(QMainWindow):
                 current_tab.highlighter.schedule_highlighting()
 
     def goto_line(self):
+        current_tab = self.tabs.currentWidget()
+        if isinstance(current_tab, LargeFileView):
+            total_lines = max(1, current_tab.line_count())
+            line, ok = QInputDialog.getInt(self, "Go to Line", f"Line number (1-{total_lines}):", current_tab.current_line + 1, 1, total_lines)
+            if ok:
+                current_tab.goto_line(line - 1)
+            return
         if self.settings["word_wrap"]:
             self.terminal.log("Go to Line is disabled when word wrap is enabled", "INFO")
             return
@@ -2616,7 +5845,7 @@ class IDE(QMainWindow):
             total_lines = doc.blockCount()
             line, ok = QInputDialog.getInt(self, "Go to Line", f"Line number (1-{total_lines}):", 1, 1, total_lines)
             if ok:
-                block = doc.findBlockByLineNumber(line - 1)
+                block = doc.findBlockByNumber(line - 1)
                 if block.isValid():
                     cursor = current_tab.textCursor()
                     cursor.setPosition(block.position())
@@ -2627,7 +5856,7 @@ class IDE(QMainWindow):
                     self.terminal.log(f"Line {line} is out of range", "ERROR")
 
     def toggle_comment(self):
-        current_tab = self.tabs.currentWidget()
+        current_tab = self.current_text_edit()
         if not current_tab:
             return
         cursor = current_tab.textCursor()
@@ -2677,10 +5906,10 @@ class IDE(QMainWindow):
         current_tab.highlighter.schedule_highlighting()
 
     def indent(self):
-        current_tab = self.tabs.currentWidget()
+        current_tab = self.current_text_edit()
         if not current_tab:
             return
-        cursor = self.tabs.currentWidget().textCursor()
+        cursor = current_tab.textCursor()
         indent_size = self.settings["indent_size"]
         cursor.beginEditBlock()
         if cursor.hasSelection():
@@ -2705,10 +5934,10 @@ class IDE(QMainWindow):
         current_tab.highlighter.schedule_highlighting()
 
     def dedent(self):
-        current_tab = self.tabs.currentWidget()
+        current_tab = self.current_text_edit()
         if not current_tab:
             return
-        cursor = self.tabs.currentWidget().textCursor()
+        cursor = current_tab.textCursor()
         indent_size = self.settings["indent_size"]
         cursor.beginEditBlock()
         if cursor.hasSelection():
@@ -2759,7 +5988,8 @@ class IDE(QMainWindow):
             self.background_widget.update()
             self.save_settings()
             for i in range(self.tabs.count()):
-                self.tabs.widget(i).highlighter.schedule_highlighting()
+                if isinstance(self.tabs.widget(i), CustomTextEdit):
+                    self.tabs.widget(i).highlighter.schedule_highlighting()
 
     def set_indent_size(self):
         sizes = ["2", "4", "8"]
@@ -2791,6 +6021,12 @@ class IDE(QMainWindow):
             self.settings["goto_marker_duration"] = duration
             self.save_settings()
 
+    def set_large_file_threshold(self):
+        size, ok = QInputDialog.getInt(self, "Large File Threshold", "Open files of this many MB or more read-only (0 to disable):", self.settings["large_file_threshold_mb"], 0, 4096)
+        if ok:
+            self.settings["large_file_threshold_mb"] = size
+            self.save_settings()
+
     def set_ui_font_size(self):
         size, ok = QInputDialog.getInt(self, "UI Font Size", "Enter font size (8-24):", self.settings["ui_font_size"], 8, 24)
         if ok:
@@ -2833,12 +6069,16 @@ class IDE(QMainWindow):
         self.apply_terminal_settings()
         self.save_settings()
 
+    def toggle_outline(self):
+        self.settings["show_outline"] = not self.settings["show_outline"]
+        self.outline_action.setChecked(self.settings["show_outline"])
+        self.apply_outline_settings()
+        self.save_settings()
+
     def toggle_external_checks(self):
         self.settings["check_external_modifications"] = not self.settings["check_external_modifications"]
         if self.settings["check_external_modifications"]:
-            self.check_file_timer.start(5000)
-        else:
-            self.check_file_timer.stop()
+            self.check_all_files()  # Changes made while the checks were off were not reported
         self.terminal.log(f"External modification checks {'enabled' if self.settings['check_external_modifications'] else 'disabled'}", "INFO")
         self.save_settings()
 
@@ -2882,6 +6122,162 @@ class IDE(QMainWindow):
         else:
             self.dock.hide()
 
+    def apply_outline_settings(self):
+        self.outline_action.setChecked(self.settings["show_outline"])
+        self.outline_dock.setVisible(self.settings["show_outline"])
+
+    def schedule_outline_refresh(self, text_edit):
+        """Rebuild the Outline panel shortly after the symbols of the document it shows have changed."""
+        if text_edit is self.tabs.currentWidget() and self.outline_dock.isVisible():
+            self.outline_timer.start(self.settings.get("outline_refresh_delay", 300))
+
+    def refresh_outline(self):
+        """Show the current editor's symbols, nesting the Dims and labels of each sub, function and macro under it."""
+        self.outline_timer.stop()
+        if not self.outline_dock.isVisible():
+            return
+        text_edit = self.current_text_edit()
+        outline = text_edit.outline if text_edit is not None else None
+        if outline is not None:
+            outline.ensure_parsed()
+        # Edits that only move symbols to other lines leave the panel as it is; items find their line when clicked
+        shown = (outline, outline.version if outline is not None else None)
+        if shown == self.outline_shown:
+            return
+        self.outline_shown = shown
+        tree = self.outline_tree
+        scroll_position = tree.verticalScrollBar().value()
+        tree.setUpdatesEnabled(False)
+        tree.clear()
+        if outline is not None:
+            items = []
+            container = None
+            for index, kind, name in outline.visible_entries():
+                if kind == "End":
+                    container = None
+                    continue
+                item = QTreeWidgetItem([f"{kind} {name}"])
+                item.setData(0, Qt.UserRole, index)
+                if kind in ("Dim", "Label") and container is not None:
+                    container.addChild(item)
+                else:
+                    items.append(item)
+                    if kind in ("Sub", "Function", "Macro", "Table"):
+                        container = item
+            tree.addTopLevelItems(items)
+        tree.setUpdatesEnabled(True)
+        tree.verticalScrollBar().setValue(scroll_position)
+
+    def goto_outline_item(self, item, column=0):
+        text_edit = self.current_text_edit()
+        index = item.data(0, Qt.UserRole)
+        if text_edit is None or index is None or (text_edit.outline, text_edit.outline.version) != self.outline_shown:
+            return
+        self.goto_text_line(text_edit, text_edit.outline.entry_line(index))
+
+    def goto_text_line(self, text_edit, line_number):
+        """Put the cursor at the start of a line, centred and marked in the gutter."""
+        block = text_edit.document().findBlockByNumber(line_number)
+        if block.isValid():
+            cursor = text_edit.textCursor()
+            cursor.setPosition(block.position())
+            text_edit.setTextCursor(cursor)
+            text_edit.centerCursor()
+            text_edit.line_number_area.set_marker(line_number)
+            text_edit.setFocus()
+
+    def library_folders(self):
+        """The folders the library index covers: gcbasic\\include and its lowlevel subfolder."""
+        gcbasic_path = os.path.normpath(os.environ.get("GCBASIC_INSTALL_PATH", os.path.expanduser("~")))
+        include_path = os.path.join(gcbasic_path, "gcbasic", "include")
+        return [include_path, os.path.join(include_path, "lowlevel")]
+
+    def process_worker_count(self, setting):
+        """Worker processes for a background search or index: the setting, or one fewer than the CPUs (at most 8) if 0."""
+        return self.settings.get(setting, 0) or max(1, min(8, (os.cpu_count() or 2) - 1))
+
+    def update_library_index(self, full=False):
+        """Parse the library files that changed since the index was last brought up to date, in the background."""
+        if self.library_index_task is not None:
+            return
+        folders = self.library_folders()
+        if not os.path.isdir(folders[0]):
+            self.terminal.log(f"Library: include folder {folders[0]} not found, nothing to index", "INFO")
+            return
+        ruleset = LanguageRuleset.get(self.settings.get("language_file"), self.terminal.log)
+        task = LibraryIndexTask(self.library_index, folders, self.process_worker_count("library_index_workers"), full,
+                                ruleset.tokenizer if ruleset is not None else None)
+        task.signals.progress.connect(self.on_library_index_progress)
+        task.signals.finished.connect(self.on_library_index_finished)
+        task.signals.failed.connect(self.on_library_index_failed)
+        self.library_index_task = task
+        if full:
+            self.terminal.log(f"Library: rebuilding the index of {folders[0]}", "INFO")
+        QThreadPool.globalInstance().start(task)
+
+    def on_library_index_progress(self, parsed, total):
+        if show_file_info:
+            self.terminal.log(f"Library: parsed {parsed} of {total} files", "INFO")
+
+    def on_library_index_finished(self, parsed, removed):
+        self.library_index_task = None
+        if parsed or removed:
+            self.terminal.log(f"Library: indexed {parsed} new or changed files, dropped {removed} removed files", "INFO")
+
+    def on_library_index_failed(self, message):
+        self.library_index_task = None
+        self.terminal.log(f"Library: indexing failed: {message}", "ERROR")
+
+    def lookup_library_symbol(self, name):
+        try:
+            return self.library_index.lookup(name)
+        except sqlite3.Error as e:
+            self.terminal.log(f"Library: lookup of {name} failed: {str(e)}", "ERROR")
+            return []
+
+    def library_tooltip(self, name):
+        """Hover text for a library symbol: its declaration, the comment above it and the file it is in."""
+        if not self.settings["index_library"]:
+            return None
+        rows = self.lookup_library_symbol(name)
+        if not rows:
+            return None
+        _, kind, path, line_number, signature, doc = rows[0]
+        text = f"<b>{html.escape(signature)}</b>"
+        if doc:
+            text += "<br>" + html.escape(doc).replace("\n", "<br>")
+        text += f"<br><i>{html.escape(os.path.basename(path))}, line {line_number + 1}</i>"
+        if len(rows) > 1:
+            text += f"<i> ({len(rows) - 1} more)</i>"
+        return text
+
+    def goto_definition(self, text_edit=None, cursor=None):
+        """Jump to the declaration of the name under the cursor: in the same file if it is there, else in the library."""
+        text_edit = text_edit or self.current_text_edit()
+        if text_edit is None:
+            return
+        word = text_edit.word_at(cursor or text_edit.textCursor())
+        if word is None:
+            return
+        name = word[0].lower()
+        outline = text_edit.outline
+        for index, kind, names in outline.visible_entries():
+            if kind != "End" and name in names.lower().split(", "):
+                self.goto_text_line(text_edit, outline.entry_line(index))
+                return
+        rows = self.lookup_library_symbol(name) if self.settings["index_library"] else []
+        if not rows:
+            self.terminal.log(f"No definition found for {word[0]}", "INFO")
+            return
+        _, kind, path, line_number, _, _ = rows[0]
+        self.open_file_by_path(path, on_loaded=lambda tab: self.goto_line_in_tab(tab, line_number))
+
+    def goto_line_in_tab(self, tab, line_number):
+        if isinstance(tab, LargeFileView):
+            tab.goto_line(line_number)
+        elif isinstance(tab, CustomTextEdit):
+            self.goto_text_line(tab, line_number)
+
     def apply_theme(self):
         if self.settings["theme"] == "dark":
             fg_color = "#FFFFFF"
@@ -2898,17 +6294,22 @@ class IDE(QMainWindow):
             f"QMenuBar {{ background-color: {bg_color}; color: {fg_color}; padding: 2px; }}"
             f"QMenuBar::item {{ background-color: {bg_color}; color: {fg_color}; padding: 2px 8px; }}"
             f"QMenuBar::item:selected {{ background-color: {hover_color}; }}"
-            f"QMenu, QTextEdit QMenu {{ background-color: {bg_color}; color: {fg_color}; border: 1px solid {border_color}; }}"
-            f"QMenu::item, QTextEdit QMenu::item {{ padding: 2px 16px; }}"
-            f"QMenu::item:selected, QTextEdit QMenu::item:selected {{ background-color: {hover_color}; }}"
+            f"QMenu, QPlainTextEdit QMenu {{ background-color: {bg_color}; color: {fg_color}; border: 1px solid {border_color}; }}"
+            f"QMenu::item, QPlainTextEdit QMenu::item {{ padding: 2px 16px; }}"
+            f"QMenu::item:selected, QPlainTextEdit QMenu::item:selected {{ background-color: {hover_color}; }}"
         )
         for i in range(self.tabs.count()):
             text_edit = self.tabs.widget(i)
+            if isinstance(text_edit, LargeFileView):
+                text_edit.apply_text_settings()
+                continue
             text_edit.setStyleSheet(f"background: transparent; color: {fg_color};")
             text_edit.line_number_area.update()
             text_edit.highlighter.schedule_highlighting()
         self.terminal.setStyleSheet(f"background-color: {bg_color}; color: {fg_color};")
         self.dock.setStyleSheet(f"background-color: {bg_color}; color: {fg_color};")
+        self.outline_dock.setStyleSheet(f"background-color: {bg_color}; color: {fg_color};")
+        self.find_dock.setStyleSheet(f"background-color: {bg_color}; color: {fg_color};")
         if self.button_bar:
             for i in range(self.button_bar.layout().count()):
                 button = self.button_bar.layout().itemAt(i).widget()
@@ -2928,7 +6329,10 @@ class IDE(QMainWindow):
         return os.path.join(config_dir, "ide_settings.json")
 
     def save_settings(self):
-        # self.terminal.log("Calling save_settings", "INFO")
+        """Save the settings once the current burst of changes is over; see DeferredFile."""
+        self.settings_file.mark_dirty()
+
+    def settings_data(self):
         self.settings["window_size"] = [self.width(), self.height()]
         self.settings["window_position"] = [self.pos().x(), self.pos().y()]
         try:
@@ -2936,22 +6340,24 @@ class IDE(QMainWindow):
             self.settings["dock_state"] = dock_state
         except Exception as e:
             self.terminal.log(f"Error saving dock state: {str(e)}", "ERROR")
-        settings_path = self.get_settings_path()
         # Ensure editor_font is defined
         if "editor_font" not in self.settings or not isinstance(self.settings["editor_font"], str):
             self.settings["editor_font"] = "Consolas"
         # Ensure gcbasic_timeout is defined
         if "gcbasic_timeout" not in self.settings or not isinstance(self.settings["gcbasic_timeout"], int):
             self.settings["gcbasic_timeout"] = 30
-        try:
-            with open(settings_path, "w", encoding="utf-8") as f:
-                json.dump(self.settings, f, indent=4)
-            os.chmod(settings_path, 0o600)
-            if show_file_info:
-                self.terminal.log(f"Saved settings to {settings_path} with editor_font: {self.settings['editor_font']}", "INFO")
-        except Exception as e:
-            self.terminal.log(f"Error saving settings to {settings_path}: {str(e)}", "ERROR")
+        if show_file_info:
+            self.terminal.log(f"Saving settings to {self.settings_file.path} with editor_font: {self.settings['editor_font']}", "INFO")
+        return json.dumps(self.settings, indent=4).encode("utf-8")
+
+    def on_state_file_write_failed(self, path, message):
+        self.terminal.log(f"Error saving {path}: {message}", "ERROR")
 
+    def flush_state_files(self):
+        """Write the settings and recent files now, if they changed, and wait for the writes to finish."""
+        for state_file in (self.settings_file, self.recent_files_file):
+            state_file.flush()
+            state_file.wait()
 
     def load_settings(self):
         settings_path = self.get_settings_path()
@@ -3167,9 +6573,8 @@ class IDE(QMainWindow):
     def new_file(self):
         text_edit = CustomTextEdit(self)
         gcbasic_header = "/*\n    A GCBASIC source program\n*/\n\n#CHIP {specify your chip, removing the braces}\n#OPTION EXPLICIT\n\n  Do\n    PulseOut PORTB.5, 100 ms\n    Wait 100 ms\n  Loop\n"
-        text_edit.setDocument(QTextDocument(gcbasic_header))
+        text_edit.setDocument(plain_text_document(gcbasic_header))
         text_edit.file_path = f"untitled_{uuid.uuid4().hex[:8]}.gcb"
-        text_edit.textChanged.connect(lambda: self.record_history(text_edit))
         self.tabs.addTab(text_edit, "untitled.gcb")
         self.tabs.setCurrentWidget(text_edit)
         self.apply_text_settings(text_edit)
@@ -3184,6 +6589,8 @@ class IDE(QMainWindow):
         if self.settings["save_confirmation"]:
             for i in range(self.tabs.count()):
                 tab = self.tabs.widget(i)
+                if not isinstance(tab, CustomTextEdit):
+                    continue
                 if tab.document().isModified():
                     self.terminal.log(f"Prompting save for {tab.file_path} (modified: {tab.document().isModified()})", "INFO")
                     reply = QMessageBox.question(self, "Save File", f"Save {tab.file_path} before closing?",
@@ -3195,7 +6602,16 @@ class IDE(QMainWindow):
                         return
                 else:
                     self.terminal.log(f"No save prompt for {tab.file_path} (modified: {tab.document().isModified()})", "INFO")
+        for i in range(self.tabs.count()):
+            if isinstance(self.tabs.widget(i), CustomTextEdit):
+                self.tabs.widget(i).highlighter.stop_background_work()
+            elif isinstance(self.tabs.widget(i), LargeFileView):
+                self.tabs.widget(i).close_file()
+        if self.library_index_task is not None:
+            self.library_index_task.cancelled = True
+        self.stop_searches()
         self.save_settings()
+        self.flush_state_files()
         event.accept()
 
     def set_gcbasic_timeout(self):
@@ -3207,6 +6623,7 @@ class IDE(QMainWindow):
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # The library indexer's worker processes start from this script, frozen or not
     lock_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     try:
         lock_socket.bind(("127.0.0.1", 12345))
@@ -0,0 +1,319 @@
+import argparse
+import datetime
+import glob
+import importlib.util
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+RESULT_PREFIX = "BENCHMARK_RESULT "
+DEFAULT_SIZES = [1000, 10000, 50000, 200000]
+
+
+def synthetic_source(line_count, seed=1):
+    """Return a GCBASIC program of line_count lines mixing the constructs the highlighter handles.
+
+    Every line holds at least one highlighted token, so an uncoloured line is always a line still waiting for the
+    highlighter.
+    """
+    rng = random.Random(seed)
+    header = ["#chip 16F1937, 32", "#option explicit", "#define LED PORTB.0", "/* synthetic benchmark source", "   generated by benchmark_ide.py */"]
+    templates = [
+        "Dim counter_{n} As Byte ' counter_{n}",
+        "    counter_{n} = counter_{n} + {v} ' step_{n}",
+        "    If counter_{n} >= {v} Then reset_{n}",
+        "    Wait {v} ms ' delay_{n}",
+        "    Set LATB.{b} On ' led_{n}",
+        "    HSerPrint \"value {n}\" ' message_{n}",
+        "    Do While PORTA.{b} = On ' poll_{n}",
+        "    Loop ' poll_{n}",
+        "Sub Proc_{n} // helper_{n}",
+        "End Sub // helper_{n}",
+        "    For index_{n} = 1 To {v} ' loop_{n}",
+        "    Next ' loop_{n}",
+        "; block_{n} comment_{n}",
+    ]
+    lines = header[:line_count]
+    while len(lines) < line_count:
+        n = len(lines)
+        lines.append(rng.choice(templates).format(n=n, v=rng.randint(1, 250), b=rng.randint(0, 7)))
+    return "\n".join(lines) + "\n"
+
+
+def peak_rss_bytes():
+    """Peak resident memory of this process: psutil when installed, otherwise the resource module."""
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        peak = getattr(info, "peak_wset", None)  # Windows keeps the true peak
+        if peak is not None or resource is None:
+            return peak if peak is not None else info.rss
+    if resource is not None:
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if sys.platform == "darwin" else maxrss * 1024
+    return None
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def block_is_coloured(block):
+    """True when the highlighter has painted the block, through layout formats or (older builds) character formats."""
+    from PyQt5.QtGui import QTextFormat
+    layout = block.layout()
+    if layout is not None and layout.formats():
+        return True
+    it = block.begin()
+    while not it.atEnd():
+        fragment = it.fragment()
+        if fragment.isValid() and fragment.charFormat().hasProperty(QTextFormat.ForegroundBrush):
+            return True
+        it += 1
+    return False
+
+
+def visible_blocks(text_edit):
+    from PyQt5.QtCore import QPoint
+    viewport = text_edit.viewport()
+    block = text_edit.cursorForPosition(QPoint(0, 0)).block()
+    last = text_edit.cursorForPosition(QPoint(0, viewport.height() - 1)).block()
+    while block.isValid():
+        yield block
+        if block == last:
+            break
+        block = block.next()
+
+
+def wait_until(app, predicate, timeout):
+    """Process events until predicate() is true; return the elapsed seconds, or None on timeout."""
+    started = time.perf_counter()
+    while True:
+        app.processEvents()
+        if predicate():
+            return time.perf_counter() - started
+        if time.perf_counter() - started > timeout:
+            return None
+        time.sleep(0.0002)
+
+
+def run_worker(args):
+    """Measure one IDE build on one file inside this process and print the results as a single JSON line."""
+    os.environ["QT_QPA_PLATFORM"] = "offscreen"
+    from PyQt5.QtCore import Qt
+    from PyQt5.QtGui import QTextCharFormat
+    from PyQt5.QtWidgets import QApplication
+    from PyQt5.QtTest import QTest
+
+    app = QApplication([sys.argv[0]])
+    result = {"module": args.module, "file": args.file}
+    started = time.perf_counter()
+    sys.path.insert(0, os.path.dirname(os.path.abspath(args.module)))
+    spec = importlib.util.spec_from_file_location("benchmarked_ide", args.module)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    result["build"] = getattr(module, "BUILD_NUMBER", None)
+    result["import_ms"] = (time.perf_counter() - started) * 1000
+    if not hasattr(module.IDE, "open_file_by_path"):
+        result["error"] = "IDE has no open_file_by_path"
+        return result
+
+    ide = module.IDE()
+    ide.resize(1200, 900)
+    ide.show()
+    wait_until(app, lambda: False, 0.2)
+    page_visible = lambda: all(block_is_coloured(block) for block in visible_blocks(ide.tabs.currentWidget()))
+
+    started = time.perf_counter()
+    ide.open_file_by_path(args.file)
+    result["open_ms"] = (time.perf_counter() - started) * 1000
+    text_edit = ide.tabs.currentWidget()
+    if text_edit is None:
+        result["error"] = "file did not open"
+        return result
+    document = text_edit.document()
+    waited = wait_until(app, page_visible, args.timeout)
+    text_edit.viewport().repaint()
+    result["first_paint_ms"] = None if waited is None else (time.perf_counter() - started) * 1000
+
+    scroll_bar = text_edit.verticalScrollBar()
+    scroll_times = []
+    for _ in range(args.pages):
+        if scroll_bar.value() >= scroll_bar.maximum():
+            break
+        started = time.perf_counter()
+        scroll_bar.setValue(scroll_bar.value() + scroll_bar.pageStep())
+        waited = wait_until(app, page_visible, args.timeout)
+        text_edit.viewport().repaint()
+        if waited is not None:
+            scroll_times.append((time.perf_counter() - started) * 1000)
+    result["scroll_page_ms"] = {"mean": sum(scroll_times) / len(scroll_times) if scroll_times else None,
+                                "max": max(scroll_times, default=None), "pages": len(scroll_times)}
+
+    # Each sample opens a new line in the middle of the file and types a keyword into it; the latency is the time
+    # from the last key press until the new line is coloured.
+    rng = random.Random(2)
+    key_times = []
+    for _ in range(args.samples):
+        block = document.findBlockByNumber(rng.randint(document.blockCount() // 4, document.blockCount() * 3 // 4))
+        cursor = text_edit.textCursor()
+        cursor.setPosition(block.position() + block.length() - 1)
+        text_edit.setTextCursor(cursor)
+        text_edit.ensureCursorVisible()
+        QTest.keyClick(text_edit, Qt.Key_Return)
+        text_edit.setCurrentCharFormat(QTextCharFormat())  # Builds that colour with character formats must not lend the new text a colour
+        QTest.keyClicks(text_edit, "Di")
+        wait_until(app, lambda: False, 0.01)
+        started = time.perf_counter()
+        QTest.keyClick(text_edit, Qt.Key_M)
+        new_block = text_edit.textCursor().block()
+        waited = wait_until(app, lambda: block_is_coloured(new_block), args.timeout)
+        if waited is not None:
+            key_times.append((time.perf_counter() - started) * 1000)
+    result["keystroke_ms"] = {"p50": percentile(key_times, 0.5), "p99": percentile(key_times, 0.99),
+                              "max": max(key_times, default=None), "samples": len(key_times)}
+
+    highlighter = getattr(text_edit, "highlighter", None)
+    if highlighter is not None and hasattr(highlighter, "highlight_all_blocks"):
+        started = time.perf_counter()
+        highlighter.highlight_all_blocks()
+        result["highlight_all_ms"] = (time.perf_counter() - started) * 1000
+    rss = peak_rss_bytes()
+    result["peak_rss_mb"] = None if rss is None else rss / (1024 * 1024)
+    return result
+
+
+def run_one(module, file_path, args):
+    """Run a worker process for one build and one file.
+
+    Each run gets a fresh home folder holding only the language file, so every build starts from default settings
+    and highlights with the same rules.
+    """
+    home = tempfile.mkdtemp(prefix="superide_bench_")
+    os.makedirs(os.path.join(home, ".superide"))
+    shutil.copy(args.language, os.path.join(home, ".superide", "GCB.tmLanguage.json"))
+    env = dict(os.environ, HOME=home, USERPROFILE=home, GCBASIC_INSTALL_PATH=home, QT_QPA_PLATFORM="offscreen")
+    command = [sys.executable, os.path.abspath(__file__), "--worker", "--module", module, "--file", file_path,
+               "--samples", str(args.samples), "--pages", str(args.pages), "--timeout", str(args.timeout)]
+    try:
+        completed = subprocess.run(command, env=env, cwd=home, capture_output=True, text=True, timeout=args.run_timeout)
+    except subprocess.TimeoutExpired:
+        return {"module": module, "file": file_path, "error": f"timed out after {args.run_timeout}s"}
+    finally:
+        shutil.rmtree(home, ignore_errors=True)
+    for line in reversed(completed.stdout.splitlines()):
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX):])
+    error = (completed.stderr.strip().splitlines() or ["no result"])[-1]
+    return {"module": module, "file": file_path, "error": f"exit code {completed.returncode}: {error}"}
+
+
+def format_ms(value):
+    return "-" if value is None else f"{value:.1f}"
+
+
+def print_table(runs, baseline=None):
+    """Print one row per run; with a baseline, each timing is followed by its ratio to the matching baseline run."""
+    reference = {}
+    for run in (baseline or {}).get("runs", []):
+        reference[(os.path.basename(run["module"]), run.get("lines"))] = run
+    columns = [("open", lambda r: r.get("open_ms")), ("paint", lambda r: r.get("first_paint_ms")),
+               ("key p50", lambda r: (r.get("keystroke_ms") or {}).get("p50")),
+               ("key p99", lambda r: (r.get("keystroke_ms") or {}).get("p99")),
+               ("scroll", lambda r: (r.get("scroll_page_ms") or {}).get("mean")),
+               ("hl all", lambda r: r.get("highlight_all_ms")), ("rss MB", lambda r: r.get("peak_rss_mb"))]
+    print(f"{'module':<28} {'lines':>7} " + " ".join(f"{name:>16}" for name, _ in columns))
+    for run in runs:
+        name = os.path.basename(run["module"])
+        if run.get("error"):
+            print(f"{name:<28} {run.get('lines', '-'):>7} {run['error']}")
+            continue
+        base = reference.get((name, run.get("lines")))
+        cells = []
+        for _, get in columns:
+            value = get(run)
+            cell = format_ms(value)
+            if base is not None and value is not None and get(base):
+                cell += f" ({value / get(base):.2f}x)"
+            cells.append(f"{cell:>16}")
+        print(f"{name:<28} {run.get('lines', '-'):>7} " + " ".join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the editor offscreen on synthetic GCBASIC files and write the results as JSON.")
+    parser.add_argument("modules", nargs="*", help="IDE source files to benchmark, e.g. dev_versions/SuperIDEt.py (default: SuperIDEu.py)")
+    parser.add_argument("--sizes", default=",".join(str(size) for size in DEFAULT_SIZES), help="Comma separated line counts of the synthetic files")
+    parser.add_argument("--output", default="benchmark_ide.json", help="JSON file the results are written to")
+    parser.add_argument("--language", default=os.path.join(script_dir, "GCB.tmLanguage.json"), help="Language file every build highlights with")
+    parser.add_argument("--baseline", help="Earlier results file to compare against")
+    parser.add_argument("--samples", type=int, default=20, help="Keystroke latency samples per file")
+    parser.add_argument("--pages", type=int, default=20, help="Pages to scroll per file")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Seconds to wait for any one highlight to appear")
+    parser.add_argument("--run-timeout", type=float, default=900.0, help="Seconds before a whole run is abandoned")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--module", help=argparse.SUPPRESS)
+    parser.add_argument("--file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        try:
+            result = run_worker(args)
+        except Exception as e:
+            result = {"module": args.module, "file": args.file, "error": f"{type(e).__name__}: {e}"}
+        sys.stdout.write(RESULT_PREFIX + json.dumps(result) + "\n")
+        sys.stdout.flush()
+        os._exit(0)  # Skip the IDE's close handling, which would ask to save the edited file
+
+    modules = []
+    for pattern in args.modules or [os.path.join(script_dir, "SuperIDEu.py")]:
+        modules.extend(sorted(glob.glob(pattern)) or [pattern])
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    source_dir = tempfile.mkdtemp(prefix="superide_bench_src_")
+    runs = []
+    try:
+        for size in sizes:
+            file_path = os.path.join(source_dir, f"synthetic_{size}.gcb")
+            with open(file_path, "w", encoding="utf-8") as f:
+                f.write(synthetic_source(size))
+            for module in modules:
+                print(f"{os.path.basename(module)}: {size} lines...", flush=True)
+                run = run_one(os.path.abspath(module), file_path, args)
+                run["lines"] = size
+                runs.append(run)
+    finally:
+        shutil.rmtree(source_dir, ignore_errors=True)
+
+    results = {"created": datetime.datetime.now().isoformat(timespec="seconds"), "python": platform.python_version(),
+               "platform": platform.platform(), "psutil": psutil is not None, "runs": runs}
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print_table(runs, baseline)
+    print(f"Results written to {args.output}")
+    return 0 if all(not run.get("error") for run in runs) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
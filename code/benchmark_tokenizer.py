@@ -0,0 +1,138 @@
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+import time
+
+from SuperIDEu import RuleTokenizer
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_rules(language_file):
+    """Read the patterns and block comment delimiters from a tmLanguage JSON file."""
+    with open(language_file, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    rule_specs = [(rule["match"], rule.get("case_insensitive", False)) for rule in config.get("patterns", [])]
+    block_start = re.compile(config.get("block_comment_start", r'/\*'))
+    block_end = re.compile(config.get("block_comment_end", r'\*/'))
+    return rule_specs, block_start, block_end
+
+
+def legacy_tokenize(compiled_rules, block_start, block_end, lines):
+    """The per-pattern loop the highlighter used before the combined tokenizer: one finditer per rule, then a sort."""
+    in_block_comment = False
+    for text in lines:
+        block_length = len(text)
+        format_ranges = []
+        if in_block_comment:
+            end_match = block_end.search(text)
+            if end_match:
+                format_ranges.append((0, end_match.end(), 0))
+                in_block_comment = False
+            else:
+                format_ranges.append((0, block_length, 0))
+        else:
+            start_match = block_start.search(text)
+            if start_match:
+                end_match = block_end.search(text, start_match.start())
+                if end_match:
+                    format_ranges.append((start_match.start(), end_match.end(), 0))
+                else:
+                    format_ranges.append((start_match.start(), block_length, 0))
+                    in_block_comment = True
+        if not in_block_comment:
+            for index, pattern in enumerate(compiled_rules[1:], 1):
+                for match in pattern.finditer(text):
+                    format_ranges.append((match.start(), match.end(), index))
+        format_ranges.sort(key=lambda x: x[0])
+
+
+def combined_tokenize(tokenizer, lines):
+    in_block_comment = False
+    for text in lines:
+        tokens, in_block_comment = tokenizer.tokenize_line(text, in_block_comment)
+
+
+def check_tokens(tokenizer, lines):
+    """Return the number of lines whose token stream overlaps or runs past the end of the line."""
+    bad_lines = 0
+    in_block_comment = False
+    for text in lines:
+        tokens, in_block_comment = tokenizer.tokenize_line(text, in_block_comment)
+        position = 0
+        for start, end, rule in tokens:
+            if start < position or end > len(text) or start >= end:
+                bad_lines += 1
+                break
+            position = end
+    return bad_lines
+
+
+def time_passes(func, min_seconds):
+    """Run func until min_seconds have elapsed and return the best single pass time."""
+    best = None
+    started = time.perf_counter()
+    while True:
+        pass_start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - pass_start
+        best = elapsed if best is None else min(best, elapsed)
+        if time.perf_counter() - started >= min_seconds:
+            return best
+
+
+def collect_files(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "*.gcb"))))
+        else:
+            files.append(path)
+    return files
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the combined syntax tokenizer against the legacy per-pattern loop.")
+    parser.add_argument("paths", nargs="*", help="Source files or folders of *.gcb files (default: the bundled samples)")
+    parser.add_argument("--language", default=os.path.join(script_dir, "GCB.tmLanguage.json"), help="Language file to load the rules from")
+    parser.add_argument("--seconds", type=float, default=0.2, help="Minimum time to spend on each measurement")
+    args = parser.parse_args()
+
+    files = collect_files(args.paths or [script_dir])
+    if not files:
+        print("No source files found")
+        return 1
+
+    rule_specs, block_start, block_end = load_rules(args.language)
+    compiled_rules = [re.compile(pattern, re.IGNORECASE if case_insensitive else 0) for pattern, case_insensitive in rule_specs]
+    tokenizer = RuleTokenizer(rule_specs, block_start, block_end)
+    print(f"Language: {args.language} ({len(rule_specs)} rules, combined scanner: {tokenizer.combined})")
+
+    total_legacy = total_combined = 0.0
+    total_lines = 0
+    for path in files:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            lines = f.read().splitlines()
+        if not lines:
+            continue
+        legacy = time_passes(lambda: legacy_tokenize(compiled_rules, block_start, block_end, lines), args.seconds)
+        combined = time_passes(lambda: combined_tokenize(tokenizer, lines), args.seconds)
+        bad_lines = check_tokens(tokenizer, lines)
+        scale = 1000.0 / len(lines) * 1000.0
+        print(f"{os.path.basename(path)}: {len(lines)} lines, legacy {legacy * scale:.2f} ms/1k lines, "
+              f"combined {combined * scale:.2f} ms/1k lines, speedup {legacy / combined:.1f}x"
+              + (f", {bad_lines} lines with overlapping tokens" if bad_lines else ""))
+        total_legacy += legacy
+        total_combined += combined
+        total_lines += len(lines)
+
+    if total_lines and total_combined:
+        print(f"Total: {total_lines} lines, speedup {total_legacy / total_combined:.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())